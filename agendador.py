@@ -0,0 +1,159 @@
+# agendador.py
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from telegram.error import BadRequest, TelegramError
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Balde de tokens ----------------
+class BaldeTokens:
+    """Token bucket simples: `taxa` tokens por segundo, até `capacidade` acumulados."""
+
+    def __init__(self, taxa: float, capacidade: float = 1):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.atualizado = time.monotonic()
+        self.bloqueado_ate = 0.0
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def adiar(self, segundos: float):
+        # Telegram mandou esperar (RetryAfter): nada sai antes disso
+        self.bloqueado_ate = max(self.bloqueado_ate, time.monotonic() + segundos)
+        self.tokens = 0
+
+    def espera(self) -> float:
+        self._repor()
+        agora = time.monotonic()
+        if agora < self.bloqueado_ate:
+            return self.bloqueado_ate - agora
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.taxa
+
+    async def consumir(self):
+        while True:
+            t = self.espera()
+            if t <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(t)
+
+
+# ---------------- Agendador de edições ----------------
+class AgendadorEdicoes:
+    """
+    Junta as edições pendentes de cada mensagem numa só. Quem agenda não espera
+    a chamada à API; limite por chat, RetryAfter e novas tentativas ficam na camada
+    de saída (saida.py).
+    """
+
+    # conteúdo na tela esquecido depois disso (pior caso: uma edição repetida, "not modified")
+    MEMORIA_TTL = 3600.0
+
+    def __init__(self):
+        self.bot = None
+        self._pendentes: Dict[Tuple[int, int], dict] = {}
+        # (chat, mensagem) -> (hash do conteúdo na tela, quando); em ordem de atualização
+        self._ultimo_hash: Dict[Tuple[int, int], Tuple[int, float]] = {}
+        self._tarefas: Dict[Tuple[int, int], asyncio.Task] = {}
+
+    def iniciar(self, bot):
+        self.bot = bot
+
+    @staticmethod
+    def _hash(texto: str, reply_markup) -> int:
+        # só os campos dos botões: to_json() do teclado inteiro custa caro a cada clique
+        if reply_markup is None:
+            return hash((texto, None))
+        return hash((texto, tuple(
+            (b.text, b.callback_data, b.url)
+            for linha in reply_markup.inline_keyboard for b in linha
+        )))
+
+    def _na_tela(self, chave) -> Optional[int]:
+        registro = self._ultimo_hash.get(chave)
+        return registro[0] if registro else None
+
+    def _guardar_na_tela(self, chave, h: int):
+        agora = time.monotonic()
+        self._ultimo_hash.pop(chave, None)
+        self._ultimo_hash[chave] = (h, agora)
+        # a mais antiga fica na frente: tira as paradas há mais de MEMORIA_TTL
+        limite = agora - self.MEMORIA_TTL
+        while self._ultimo_hash:
+            antiga = next(iter(self._ultimo_hash))
+            if self._ultimo_hash[antiga][1] >= limite:
+                break
+            del self._ultimo_hash[antiga]
+
+    def agendar(self, chat_id: int, message_id: int, texto: str, reply_markup=None,
+                parse_mode: Optional[str] = "Markdown"):
+        chave = (chat_id, message_id)
+        h = self._hash(texto, reply_markup)
+
+        if h == self._na_tela(chave):
+            # Mesmo conteúdo já está na tela: descarta o que estava pendente
+            self._pendentes.pop(chave, None)
+            return
+
+        # Substitui qualquer edição pendente da mesma mensagem
+        self._pendentes[chave] = {
+            "texto": texto,
+            "reply_markup": reply_markup,
+            "parse_mode": parse_mode,
+            "hash": h,
+        }
+
+        tarefa = self._tarefas.get(chave)
+        if tarefa is None or tarefa.done():
+            self._tarefas[chave] = asyncio.create_task(self._trabalhar(chave))
+
+    async def _trabalhar(self, chave: Tuple[int, int]):
+        chat_id, message_id = chave
+
+        # uma edição por vez por mensagem: enquanto ela espera a vez na saída, as novas se juntam aqui
+        while chave in self._pendentes:
+            edicao = self._pendentes.pop(chave)
+            if edicao["hash"] == self._na_tela(chave):
+                continue
+
+            try:
+                await self.bot.edit_message_text(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    text=edicao["texto"],
+                    reply_markup=edicao["reply_markup"],
+                    parse_mode=edicao["parse_mode"],
+                )
+                self._guardar_na_tela(chave, edicao["hash"])
+
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    self._guardar_na_tela(chave, edicao["hash"])
+                else:
+                    logger.error(f"Erro ao editar mensagem {chave}: {e}")
+
+            except TelegramError as e:
+                # a saída já tentou de novo com backoff; a próxima edição da mensagem leva o conteúdo novo
+                logger.error(f"Falha ao editar mensagem {chave}: {e}")
+
+        self._tarefas.pop(chave, None)
+
+    async def parar(self, timeout: float = 10):
+        # Dá uma chance para as edições pendentes saírem antes de desligar
+        tarefas = [t for t in self._tarefas.values() if not t.done()]
+        if tarefas:
+            _, pendentes = await asyncio.wait(tarefas, timeout=timeout)
+            for t in pendentes:
+                t.cancel()
+        self._tarefas.clear()
@@ -0,0 +1,78 @@
+# apuracao.py
+# Pontuação das rodadas. Os palpites empacotados (palpites_codec) de todos os
+# apostadores viram um único inteiro grande, com uma "faixa" de 32 bits por
+# apostador; XOR, máscaras e popcount SWAR valem para todas as faixas de uma
+# vez, sem laço Python por linha.
+
+import re
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from palpites_codec import MASCARA_BAIXA, N_JOGOS
+
+BYTES_FAIXA = 4
+FAIXAS_PREMIADAS = (14, 13, 12)
+
+def _repetir(valor: int, n: int) -> int:
+    # `valor` em cada uma das n faixas de 32 bits
+    return int.from_bytes(valor.to_bytes(BYTES_FAIXA, "little") * n, "little")
+
+def pontuar(palpites: Sequence[int], resultado: int) -> array:
+    """Número de acertos de cada palpite empacotado contra o resultado."""
+    n = len(palpites)
+    if n == 0:
+        return array("I")
+
+    faixas = array("I", palpites)
+    if sys.byteorder != "little":
+        faixas.byteswap()
+    x = int.from_bytes(faixas.tobytes(), "little")
+
+    # 1 no bit baixo de cada jogo errado (par de bits diferente do resultado)
+    d = x ^ _repetir(resultado, n)
+    x = (d | (d >> 1)) & _repetir(MASCARA_BAIXA, n)
+
+    # popcount por faixa: pares -> nibbles -> bytes -> byte baixo da faixa
+    x = (x & _repetir(0x33333333, n)) + ((x >> 2) & _repetir(0x33333333, n))
+    x = (x + (x >> 4)) & _repetir(0x0F0F0F0F, n)
+    x = x + (x >> 8)
+    x = (x + (x >> 16)) & _repetir(0x3F, n)
+
+    # acertos = 14 - erros (sem empréstimo entre faixas, erros <= 14)
+    x = _repetir(N_JOGOS, n) - x
+
+    acertos = array("I")
+    acertos.frombytes(x.to_bytes(BYTES_FAIXA * n, "little"))
+    if sys.byteorder != "little":
+        acertos.byteswap()
+    return acertos
+
+def ler_resultado(texto: str) -> Optional[List[str]]:
+    # aceita "1 X 2 ...", "1,X,2,..." ou "1X2..."
+    simbolos = [s.upper() for s in re.findall(r"[12xX]", texto)]
+    if len(simbolos) != N_JOGOS:
+        return None
+    return simbolos
+
+def apurar(palpites_rodada: Sequence[Sequence], resultado: int) -> Dict:
+    """
+    Recebe as linhas de Database.obter_palpites_rodada e o resultado empacotado.
+    Devolve o ranking (maior número de acertos primeiro, empate pela ordem de envio),
+    a distribuição de acertos e os ganhadores de cada faixa premiada.
+    """
+    acertos = pontuar([p[5] or 0 for p in palpites_rodada], resultado)
+
+    # 15 baldes (0..14 acertos) no lugar de ordenar: O(n) e estável
+    baldes = [[] for _ in range(N_JOGOS + 1)]
+    for p, a in zip(palpites_rodada, acertos):
+        baldes[a].append(p)
+
+    ranking = [(p, a) for a in range(N_JOGOS, -1, -1) for p in baldes[a]]
+    faixas = {f: baldes[f] for f in FAIXAS_PREMIADAS}
+
+    return {
+        "ranking": ranking,
+        "distribuicao": {a: len(baldes[a]) for a in range(N_JOGOS + 1) if baldes[a]},
+        "faixas": faixas,
+    }
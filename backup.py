@@ -0,0 +1,87 @@
+# backup.py
+# Cópia online do SQLite para um caminho durável com VACUUM INTO: a cópia lê um
+# snapshot (transação de leitura no WAL), então as escritas seguem normalmente e
+# não a fazem recomeçar (a API de backup recomeça a cada escrita de outra conexão
+# e, com rascunhos gravados a cada 2s, podia nunca terminar). Roda periodicamente
+# e no desligamento; na subida, se o banco principal sumiu (ex.: /tmp limpo no
+# reboot), ele volta do backup.
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+def copiar(origem: str, destino: str) -> int:
+    """Copia `origem` para `destino` (via arquivo temporário + rename). Devolve o tamanho em bytes."""
+    temporario = destino + ".tmp"
+    pasta = os.path.dirname(os.path.abspath(destino))
+    os.makedirs(pasta, exist_ok=True)
+    if os.path.exists(temporario):
+        os.remove(temporario)  # sobra de uma cópia interrompida; VACUUM INTO exige arquivo novo
+
+    fonte = sqlite3.connect(origem, timeout=10)
+    try:
+        fonte.execute("VACUUM INTO ?", (temporario,))
+    finally:
+        fonte.close()
+
+    # VACUUM INTO não faz fsync do arquivo gerado
+    with open(temporario, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(temporario, destino)
+    return os.path.getsize(destino)
+
+def restaurar_se_preciso(db_path: str, backup_path: str) -> bool:
+    # só restaura quando o banco principal não existe: nunca sobrescreve dados
+    if not backup_path or os.path.exists(db_path) or not os.path.exists(backup_path):
+        return False
+    inicio = time.perf_counter()
+    tamanho = copiar(backup_path, db_path)
+    logger.warning(f"Banco {db_path} não encontrado: restaurado de {backup_path} "
+                   f"({tamanho / 1024:.0f} KiB em {time.perf_counter() - inicio:.2f}s)")
+    return True
+
+class BackupPeriodico:
+    """Backup do banco a cada `intervalo` segundos e uma última vez ao parar."""
+
+    def __init__(self, db_path: str, destino: str, intervalo: float = 600):
+        self.db_path = db_path
+        self.destino = destino
+        self.intervalo = intervalo
+        self._tarefa: Optional[asyncio.Task] = None
+        self._trava = asyncio.Lock()
+
+    async def executar(self):
+        # um backup por vez (o timer e o desligamento podem coincidir)
+        async with self._trava:
+            loop = asyncio.get_running_loop()
+            inicio = time.perf_counter()
+            try:
+                tamanho = await loop.run_in_executor(None, copiar, self.db_path, self.destino)
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Falha no backup de {self.db_path} para {self.destino}: {e}")
+                return
+            logger.info(f"Backup em {self.destino}: {tamanho / 1024:.0f} KiB em {time.perf_counter() - inicio:.2f}s")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            await self.executar()
+
+    def iniciar(self):
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await self.executar()
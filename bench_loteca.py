@@ -0,0 +1,1089 @@
+# bench_loteca.py
+# Microbenchmarks do bot. Uso: python bench_loteca.py [render] [envios] [rascunhos] [apuracao] [backup] [ranking] [callbacks] [webhook] [transmissao] [saida] [encerramento]
+# Tudo roda offline: o bench de callbacks usa um Bot falso (RequisicaoFalsa).
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import callback_codec as cb
+from planilha import TAMANHO_CACHE, CacheRenderizacao, PlanilhaRodada, renderizadas
+
+TIMES = [
+    "Flamengo", "Vasco", "São Paulo", "Corinthians", "Palmeiras", "Santos",
+    "Grêmio", "Internacional", "Atlético-MG", "Cruzeiro", "Botafogo", "Fluminense",
+    "Athletico-PR", "Coritiba", "Bahia", "Vitória", "Náutico", "Sport",
+    "Fortaleza", "Ceará", "Goiás", "Vila Nova", "Red Bull Bragantino", "Ponte Preta",
+    "Juventude", "Chapecoense", "Avaí", "Figueirense",
+]
+
+def jogos_sinteticos(rodada_id=1):
+    return [(i + 1, rodada_id, TIMES[2 * i], TIMES[2 * i + 1]) for i in range(14)]
+
+def palpites_sinteticos(n, seed=42):
+    rnd = random.Random(seed)
+    return [[rnd.choice(("1", "X", "2", None)) for _ in range(14)] for _ in range(n)]
+
+def _medir(fn, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        fn()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+# ------------------ REFERÊNCIA: PLANILHA ORIGINAL ------------------
+# Renderização original (remonta tudo a cada clique). O bench_render compara a
+# saída da PlanilhaRodada com ela e mede o ganho.
+def montar_planilha_interativa(jogos, nome_rodada, user_palpite=None, rodada_id=0):
+    linhas = []
+    linhas.append(f"📊 *{nome_rodada.upper()}*")
+    linhas.append("")
+    
+    if user_palpite:
+        # Mostra visualização dos palpites atuais
+        palpites_display = []
+        for i, pal in enumerate(user_palpite):
+            if pal == "1":
+                palpites_display.append(f"{i+1}:✅")
+            elif pal == "X":
+                palpites_display.append(f"{i+1}:✅") 
+            elif pal == "2":
+                palpites_display.append(f"{i+1}:✅")
+            else:
+                palpites_display.append(f"{i+1}:⚪")
+        
+        linhas.append("📝 *SEUS PALPITES ATUAIS:*")
+        linhas.append(" ".join(palpites_display))
+        linhas.append("")
+        
+        # Conta quantos faltam
+        faltando = user_palpite.count(None)
+        if faltando > 0:
+            linhas.append(f"⚠️ *Faltam {faltando} jogos*")
+        else:
+            linhas.append("✅ *Todos os jogos preenchidos!*")
+            
+        linhas.append("")
+    
+    linhas.append("Clique nos botões abaixo para fazer seus palpites!")
+    linhas.append("")
+
+    texto = "\n".join(linhas)
+
+    # Teclado com 4 colunas: Nº (inativo), Time1, X, Time2
+    kb = []
+    for i in range(14):
+        row = jogos[i]
+        if len(row) >= 4:
+            short_t1 = row[2][:12]
+            short_t2 = row[3][:12]
+        else:
+            short_t1 = row[0][:12]
+            short_t2 = row[1][:12]
+
+        # Destaca o botão selecionado
+        palpite_atual = user_palpite[i] if user_palpite else None
+        
+        btn_t1 = f"✅{short_t1}" if palpite_atual == "1" else short_t1
+        btn_x = "✅X" if palpite_atual == "X" else "X"
+        btn_t2 = f"{short_t2}✅" if palpite_atual == "2" else short_t2
+
+        kb.append([
+            InlineKeyboardButton(str(i+1), callback_data=cb.codificar(rodada_id, cb.NOOP, i)),
+            InlineKeyboardButton(btn_t1, callback_data=cb.codificar(rodada_id, cb.TIME1, i)),
+            InlineKeyboardButton(btn_x, callback_data=cb.codificar(rodada_id, cb.EMPATE, i)),
+            InlineKeyboardButton(btn_t2, callback_data=cb.codificar(rodada_id, cb.TIME2, i))
+        ])
+
+    kb.append([InlineKeyboardButton("🚀 ENVIAR PALPITES", callback_data=cb.codificar(rodada_id, cb.ENVIAR))])
+    kb.append([InlineKeyboardButton("📊 VER MEUS PALPITES", callback_data=cb.codificar(rodada_id, cb.MEUS_PALPITES))])
+
+    return texto, InlineKeyboardMarkup(kb)
+
+def montar_planilha_final(display, jogos, user_name, nome_rodada):
+    linhas = []
+    linhas.append(f"📊 *{nome_rodada.upper()}*")
+    linhas.append(f"✅ *PALPITES DE {user_name.upper()}*")
+    linhas.append("")
+    linhas.append("| JG | 1 | MANDANTE | X | VISITANTE | 2 |")
+    linhas.append("|----|---|----------|---|-----------|---|")
+    
+    for i in range(14):
+        n = i + 1
+        row = jogos[i]
+        if len(row) >= 4:
+            t1 = row[2]
+            t2 = row[3]
+        else:
+            t1 = row[0]
+            t2 = row[1]
+
+        pal = display[i]
+        
+        # Formata os times para caber na tabela
+        t1_short = t1[:10] if len(t1) > 10 else t1.ljust(10)
+        t2_short = t2[:10] if len(t2) > 10 else t2.ljust(10)
+        
+        # Define os emojis baseados na seleção
+        emoji_1 = "✅" if pal == "1" else "□"
+        emoji_x = "✅" if pal == "X" else "□" 
+        emoji_2 = "✅" if pal == "2" else "□"
+        
+        linhas.append(f"| {n:2d} | {emoji_1} | {t1_short} | {emoji_x} | {t2_short} | {emoji_2} |")
+
+    linhas.append("")
+    linhas.append("🎉 *Palpites enviados com sucesso!*")
+
+    texto = "\n".join(linhas)
+    return texto, None
+
+# ------------------ RENDER ------------------
+def bench_render(repeticoes=2000):
+    jogos = jogos_sinteticos()
+    nome = "Concurso Loteca 1234"
+    estados = palpites_sinteticos(200)
+
+    # Saída idêntica à implementação original
+    planilha = PlanilhaRodada(1, nome, jogos)
+    for pal in estados[:50]:
+        assert planilha.interativa(pal)[0] == montar_planilha_interativa(jogos, nome, pal)[0]
+        assert planilha.interativa(pal)[1] == montar_planilha_interativa(jogos, nome, pal, rodada_id=1)[1]
+        completo = [p or "1" for p in pal]
+        assert planilha.final(completo, "Fulano") == montar_planilha_final(completo, jogos, "Fulano", nome)
+
+    it = iter(range(10 ** 9))
+    antes = _medir(lambda: montar_planilha_interativa(jogos, nome, estados[next(it) % len(estados)]), repeticoes)
+
+    sem_cache = PlanilhaRodada(1, nome, jogos, cache=CacheRenderizacao(0))
+    it = iter(range(10 ** 9))
+    frio = _medir(lambda: sem_cache.interativa(estados[next(it) % len(estados)]), repeticoes)
+
+    quente = PlanilhaRodada(1, nome, jogos)
+    for pal in estados:
+        quente.interativa(pal)
+    it = iter(range(10 ** 9))
+    cache = _medir(lambda: quente.interativa(estados[next(it) % len(estados)]), repeticoes)
+
+    montagem = _medir(lambda: PlanilhaRodada(1, nome, jogos), 200)
+
+    # um LRU só para todas as rodadas: dezenas de rodadas abertas não passam do limite
+    for rodada_id in range(2, 40):
+        outra = PlanilhaRodada(rodada_id, nome, jogos_sinteticos(rodada_id))
+        for pal in estados:
+            outra.interativa(pal)
+    assert len(renderizadas) <= TAMANHO_CACHE
+
+    print("render por clique (µs):")
+    print(f"  original (montar_planilha_interativa) : {antes:8.1f}")
+    print(f"  PlanilhaRodada, cache miss            : {frio:8.1f}")
+    print(f"  PlanilhaRodada, cache hit             : {cache:8.1f}")
+    print(f"  montagem da PlanilhaRodada (1x/rodada): {montagem:8.1f}")
+
+# ------------------ ENVIOS (GROUP COMMIT) ------------------
+def bench_envios(n=2000):
+    from database import Database
+    from database_async import DatabaseAsync
+    from grupo_commit import GrupoCommit
+
+    palpites = [[p or "1" for p in pal] for pal in palpites_sinteticos(n)]
+
+    async def rajada(salvar, rodada_id):
+        # todos os usuários apertam ENVIAR ao mesmo tempo (+ 10% de cliques repetidos)
+        usuarios = list(range(n)) + list(range(0, n, 10))
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*[
+            salvar(rodada_id, u, f"Usuário {u}", "", palpites[u]) for u in usuarios
+        ])
+        dt = time.perf_counter() - inicio
+        assert sum(resultados) == n
+        return len(usuarios) / dt
+
+    async def rodar(agrupado):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseAsync(Database(os.path.join(tmp, "bench.db")))
+            rodada_id = await db.criar_nova_rodada("bench")
+            await db.inserir_jogos([(t1, t2) for _, _, t1, t2 in jogos_sinteticos(rodada_id)], rodada_id)
+            salvar = GrupoCommit(db).salvar if agrupado else db.salvar_palpite
+            taxa = await rajada(salvar, rodada_id)
+            stats = await db.obter_estatisticas_rodada(rodada_id)
+            assert stats["total_palpitadores"] == n
+            db.fechar()
+            return taxa
+
+    antes = asyncio.run(rodar(False))
+    depois = asyncio.run(rodar(True))
+    print(f"envios por segundo ({n} usuários + repetidos):")
+    print(f"  um commit por envio (salvar_palpite): {antes:10.0f}")
+    print(f"  group commit (GrupoCommit)          : {depois:10.0f}")
+
+# ------------------ RASCUNHOS NO REINÍCIO ------------------
+def bench_rascunhos(usuarios=50_000, maximo=1000, ttl=3601.0):
+    from database import Database
+    from database_async import DatabaseAsync
+    from rascunhos import RascunhoStore
+
+    def preparar(caminho):
+        base = Database(caminho)
+        rodada_id = base.criar_nova_rodada("bench", -100)
+        base.salvar_rascunhos(rodada_id, [(u, u & 0xFFFFFFF) for u in range(usuarios)], [])
+        # o usuário u mexeu no rascunho há 2u segundos
+        with base.conn:
+            base.conn.execute("UPDATE rascunhos SET updated_at = datetime('now', '-' || (2 * user_id) || ' seconds')")
+        base.conn.close()
+        return rodada_id
+
+    async def rodar(tmp):
+        caminho = os.path.join(tmp, "bench.db")
+        rodada_id = preparar(caminho)
+        db = DatabaseAsync(Database(caminho))
+
+        tempos = {}
+        for nome, limite in (("sem limite", None), ("com maximo/ttl", maximo)):
+            store = RascunhoStore(db, ttl=ttl if limite else float("inf"), maximo=limite or 0)
+            inicio = time.perf_counter()
+            await store.carregar([rodada_id])
+            tempos[nome] = (time.perf_counter() - inicio, len(store))
+
+        # só os `maximo` mais recentes, com a idade do banco (o mais antigo é o primeiro a expirar)
+        assert len(store) == maximo
+        assert all((rodada_id, u) in store for u in range(maximo))
+        assert store.get((rodada_id, 0)).tocado > store.get((rodada_id, maximo - 1)).tocado
+        assert store.expirar() == 0
+        # quem ficou no banco volta no acesso; quem nunca palpitou continua sem rascunho
+        volta = await store.recuperar((rodada_id, usuarios - 1))
+        assert volta is not None and volta.bits == (usuarios - 1) & 0xFFFFFFF
+        assert await store.recuperar((rodada_id, usuarios + 1)) is None
+
+        so_ttl = RascunhoStore(db, ttl=ttl)
+        await so_ttl.carregar([rodada_id])
+        assert len(so_ttl) == int(ttl) // 2 + 1, len(so_ttl)
+        db.fechar()
+        return tempos
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tempos = asyncio.run(rodar(tmp))
+    print(f"rascunhos carregados no reinício ({usuarios} no banco):")
+    for nome, (dt, n) in tempos.items():
+        print(f"  {nome:16s}: {n:6d} em memória, {dt * 1000:7.1f}ms")
+
+# ------------------ BACKUP (VACUUM INTO) ------------------
+def bench_backup(apostadores=50_000, copias=3):
+    import sqlite3
+    import threading
+    from backup import copiar
+    from database import Database
+
+    tmp = tempfile.mkdtemp()
+    db = Database(os.path.join(tmp, "bench.db"))
+    rodada_id = db.criar_nova_rodada("bench", -1)
+    db.inserir_jogos([(t1, t2) for _, _, t1, t2 in jogos_sinteticos(rodada_id)], rodada_id)
+    palpites = [[p or "1" for p in pal] for pal in palpites_sinteticos(apostadores)]
+    db.salvar_palpites_lote([(rodada_id, u, f"Usuário {u}", "", palpites[u]) for u in range(apostadores)])
+
+    # escritor contínuo (flush de rascunhos, um commit por vez) medindo cada escrita
+    fase = ["sem backup"]
+    latencias = {"sem backup": [], "durante o backup": []}
+    parar = threading.Event()
+
+    def escritor():
+        u = 0
+        while not parar.is_set():
+            u += 1
+            inicio = time.perf_counter()
+            db.salvar_rascunhos(rodada_id, [(u, u & 0xFFFFFFF)], [])
+            latencias[fase[0]].append(time.perf_counter() - inicio)
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=escritor)
+    thread.start()
+    time.sleep(1.0)
+    fase[0] = "durante o backup"
+    destino = os.path.join(tmp, "copia", "backup.db")
+    inicio = time.perf_counter()
+    for _ in range(copias):
+        tamanho = copiar(db.db_path, destino)
+    duracao = (time.perf_counter() - inicio) / copias
+    parar.set()
+    thread.join()
+    db.conn.close()
+
+    copia = sqlite3.connect(destino)
+    assert copia.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert copia.execute("SELECT COUNT(*) FROM palpites").fetchone()[0] == apostadores
+    copia.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"backup (VACUUM INTO) de {tamanho / 1024:.0f} KiB, {apostadores} palpites: {duracao * 1000:.0f}ms por cópia")
+    print("  commits do escritor concorrente, p50/p99/máx (ms):")
+    for nome, amostras in latencias.items():
+        p50, _, p99 = _percentis(amostras)
+        print(f"    {nome:16s}: {p50 * 1000:6.2f} / {p99 * 1000:6.2f} / {max(amostras) * 1000:6.2f}  ({len(amostras)} commits)")
+
+# ------------------ APURAÇÃO ------------------
+def bench_apuracao(rodadas=100, apostadores=5000):
+    from apuracao import apurar, pontuar
+    from palpites_codec import codificar
+
+    rnd = random.Random(7)
+    resultados = [[rnd.choice(("1", "X", "2")) for _ in range(14)] for _ in range(rodadas)]
+    base = [[rnd.choice(("1", "X", "2")) for _ in range(14)] for _ in range(apostadores)]
+    linhas_json = [(i, 1, i, f"u{i}", "", json.dumps(p), "") for i, p in enumerate(base)]
+    linhas_bin = [(i, 1, i, f"u{i}", "", codificar(p), "") for i, p in enumerate(base)]
+
+    # laço Python por linha, como o bot fazia com os palpites em JSON
+    inicio = time.perf_counter()
+    ingenuo = []
+    for res in resultados:
+        ingenuo.append([sum(a == b for a, b in zip(json.loads(l[5]), res)) for l in linhas_json])
+    antes = time.perf_counter() - inicio
+
+    bits = [codificar(r) for r in resultados]
+    inicio = time.perf_counter()
+    vetor = [pontuar([l[5] for l in linhas_bin], b) for b in bits]
+    so_pontos = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for b in bits:
+        apurar(linhas_bin, b)
+    completo = time.perf_counter() - inicio
+
+    assert [list(v) for v in vetor] == ingenuo
+    print(f"apuração de {rodadas} rodadas x {apostadores} apostadores (ms):")
+    print(f"  laço por linha (json.loads + zip): {antes * 1000:8.1f}")
+    print(f"  pontuar (SWAR, inteiro único)    : {so_pontos * 1000:8.1f}")
+    print(f"  apurar (pontos + ranking + faixas): {completo * 1000:7.1f}")
+
+# ------------------ RANKING GERAL ------------------
+def bench_ranking(usuarios=20_000, rodadas=5):
+    from apuracao import apurar
+    from database import Database
+    from palpites_codec import acertos, codificar
+
+    tmp = tempfile.mkdtemp()
+    db = Database(os.path.join(tmp, "bench.db"))
+    rnd = random.Random(11)
+    oficiais = {}
+    for r in range(rodadas):
+        rodada_id = db.criar_nova_rodada(f"Rodada {r + 1}", -1)
+        jogadores = rnd.sample(range(usuarios), usuarios * 3 // 4)
+        db.salvar_palpites_lote([(rodada_id, u, f"u{u}", "", [rnd.choice("1X2") for _ in range(14)]) for u in jogadores])
+        oficiais[rodada_id] = [rnd.choice("1X2") for _ in range(14)]
+
+    def registrar(rodada_id):
+        # como o /resultado: apurar e gravar as pontuações junto com o resultado
+        apur = apurar(db.obter_palpites_rodada(rodada_id), codificar(oficiais[rodada_id]))
+        db.registrar_resultado(rodada_id, oficiais[rodada_id], [(p[2], p[3], a) for p, a in apur["ranking"]])
+
+    for rodada_id in oficiais:
+        registrar(rodada_id)
+    # correção de uma rodada já apurada: a contribuição antiga sai antes de entrar a nova
+    corrigida = list(oficiais)[1]
+    oficiais[corrigida] = [rnd.choice("1X2") for _ in range(14)]
+    registrar(corrigida)
+
+    def tabelas():
+        return (db.conn.execute('SELECT * FROM ranking_usuarios ORDER BY user_id').fetchall(),
+                db.conn.execute('SELECT * FROM ranking_placar ORDER BY total_acertos, melhor').fetchall())
+
+    incremental = tabelas()
+
+    # referência 1: reconstrução do zero a partir de resultados + palpites
+    with db.conn:
+        db.conn.execute('DELETE FROM pontuacoes')
+        db.conn.execute('DELETE FROM ranking_usuarios')
+    assert db.conn.execute('SELECT COUNT(*) FROM ranking_placar').fetchone()[0] == 0
+    db.reconstruir_ranking()
+    assert tabelas() == incremental, "ranking incremental difere da reconstrução completa"
+
+    # referência 2: laço Python sobre todos os palpites
+    esperado = {}
+    for rodada_id, res in oficiais.items():
+        bits = codificar(res)
+        for p in db.obter_palpites_rodada(rodada_id):
+            total, jogadas, melhor = esperado.get(p[2], (0, 0, 0))
+            a = acertos(p[5], bits)
+            esperado[p[2]] = (total + a, jogadas + 1, max(melhor, a))
+    assert {u: (t, j, m) for u, _, t, j, m in incremental[0]} == esperado
+    amostra = rnd.sample(sorted(esperado), 200)
+    for u in amostra:
+        t, _, m = esperado[u]
+        posicao = 1 + sum(1 for t2, _, m2 in esperado.values() if t2 > t or (t2 == t and m2 > m))
+        assert db.obter_posicao_ranking(u)[0] == posicao
+
+    def contar(u):
+        # consulta anterior: COUNT(*) sobre os apostadores à frente
+        _, _, t, _, m = db.conn.execute('SELECT * FROM ranking_usuarios WHERE user_id = ?', (u,)).fetchone()
+        return db.conn.execute('''
+            SELECT COUNT(*) FROM ranking_usuarios
+            WHERE total_acertos > ? OR (total_acertos = ? AND (melhor > ? OR (melhor = ? AND user_id < ?)))
+        ''', (t, t, m, m, u)).fetchone()[0]
+
+    it = iter(range(10 ** 9))
+    antes = _medir(lambda: contar(amostra[next(it) % len(amostra)]), 500)
+    it = iter(range(10 ** 9))
+    depois = _medir(lambda: db.obter_posicao_ranking(amostra[next(it) % len(amostra)]), 500)
+    placares = len(incremental[1])
+    db.conn.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"ranking: {rodadas} rodadas (1 corrigida), {len(esperado)} apostadores, {placares} placares distintos")
+    print("  incremental == reconstrução do zero == laço sobre os palpites")
+    print("  posição de um usuário (µs):")
+    print(f"    COUNT(*) em ranking_usuarios : {antes:8.1f}")
+    print(f"    soma em ranking_placar       : {depois:8.1f}")
+
+# ------------------ DESDOBRAMENTO ------------------
+def bench_desdobramento():
+    from desdobramento import combinacoes, cobertura, escrever_desdobramento, expandir, ler_mascaras
+
+    rnd = random.Random(3)
+    estatisticas = [{o: rnd.randint(0, 50) for o in ("1", "X", "2")} for _ in range(14)]
+    volantes = {
+        "2 duplos": "1 X2 1 2 1X 1 2 X 1 1 2 1 X 2",
+        "5 triplos + 4 duplos": "T T T T T 1X X2 12 1X 1 2 X 1 2",
+        "14 triplos (3^14)": " ".join(["T"] * 14),
+    }
+    print("desdobramento (ms):")
+    for nome, texto in volantes.items():
+        mascaras = ler_mascaras(texto.split())
+        inicio = time.perf_counter()
+        n = combinacoes(mascaras)
+        melhor, esperadas = cobertura(mascaras, estatisticas)
+        resumo = time.perf_counter() - inicio
+        assert abs(sum(esperadas) - n) < 1e-6 * n and abs(sum(melhor) - 1) < 1e-9
+
+        inicio = time.perf_counter()
+        contadas = sum(1 for _ in expandir(mascaras))
+        expansao = time.perf_counter() - inicio
+        assert contadas == n
+        print(f"  {nome:22s}: {n:>9d} apostas | resumo {resumo * 1000:6.2f} | expandir (gerador) {expansao * 1000:8.1f}")
+
+    mascaras = ler_mascaras(volantes["5 triplos + 4 duplos"].split())
+    arquivo = escrever_desdobramento(mascaras)
+    assert sum(1 for _ in arquivo) == combinacoes(mascaras)
+    arquivo.close()
+
+# ------------------ CALLBACKS (HARNESS OFFLINE) ------------------
+class RequisicaoFalsa:
+    """
+    Camada HTTP falsa para o Bot do python-telegram-bot: registra cada método
+    chamado, simula latência da API e responde RetryAfter numa fração das edições.
+    """
+
+    BOT = {"id": 1, "is_bot": True, "first_name": "Loteca", "username": "loteca_bench_bot"}
+
+    def __init__(self, latencia=0.03, retry_after=0.02, seed=1):
+        from telegram.request import BaseRequest
+
+        self.latencia = latencia
+        self.retry_after = retry_after
+        self.rnd = random.Random(seed)
+        self.chamadas = Counter()
+        self._mensagens = 1000
+
+        # modo polling: updates esperando o próximo getUpdates
+        self._fila_updates = []
+        self._chegou_update = asyncio.Event()
+        # quando cada callback foi respondido e o que foi enviado por sendMessage
+        self.respondidos = {}
+        self.respostas = {}  # callback → texto do answerCallbackQuery
+        self.enviadas = []
+        self.ultima_mensagem = {}  # chat → message_id da última mensagem enviada (a planilha no grupo)
+
+        falsa = self
+
+        class _Req(BaseRequest):
+            async def initialize(self):
+                pass
+
+            async def shutdown(self):
+                pass
+
+            async def do_request(self, url, method, request_data=None, **kwargs):
+                return await falsa.responder(url.rsplit("/", 1)[-1], request_data.parameters if request_data else {})
+
+        self.request = _Req()
+
+    def _mensagem(self, params, message_id=None):
+        if message_id is None:
+            self._mensagens += 1
+            message_id = self._mensagens
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"},
+            "text": params.get("text", ""),
+        }
+
+    def entregar(self, update: dict):
+        self._fila_updates.append(update)
+        self._chegou_update.set()
+
+    async def _get_updates(self, params):
+        # long polling: ida até o servidor, espera update (ou timeout), volta
+        await asyncio.sleep(self.latencia / 2)
+        offset = int(params.get("offset") or 0)
+        self._fila_updates = [u for u in self._fila_updates if u["update_id"] >= offset]
+        if not self._fila_updates:
+            self._chegou_update.clear()
+            try:
+                await asyncio.wait_for(self._chegou_update.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        updates = list(self._fila_updates)
+        await asyncio.sleep(self.latencia / 2)
+        return 200, json.dumps({"ok": True, "result": updates}).encode()
+
+    async def responder(self, metodo, params):
+        self.chamadas[metodo] += 1
+        if metodo == "getUpdates":
+            return await self._get_updates(params)
+        if metodo == "answerCallbackQuery":
+            self.respondidos.setdefault(str(params.get("callback_query_id")), time.perf_counter())
+            self.respostas.setdefault(str(params.get("callback_query_id")), params.get("text"))
+        elif metodo == "sendMessage":
+            self.enviadas.append((int(params.get("chat_id", 0)), params.get("text", "")))
+        if metodo != "getMe":
+            await asyncio.sleep(self.latencia * (0.5 + self.rnd.random()))
+
+        if metodo == "editMessageText" and self.rnd.random() < self.retry_after:
+            self.chamadas["retry_after"] += 1
+            corpo = {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                     "parameters": {"retry_after": 1}}
+            return 429, json.dumps(corpo).encode()
+
+        if metodo == "getMe":
+            resultado = self.BOT
+        elif metodo in ("sendMessage", "sendDocument"):
+            resultado = self._mensagem(params)
+            self.ultima_mensagem[resultado["chat"]["id"]] = resultado["message_id"]
+        elif metodo == "editMessageText":
+            resultado = self._mensagem(params, int(params.get("message_id", 0)))
+        else:
+            resultado = True
+        return 200, json.dumps({"ok": True, "result": resultado}).encode()
+
+class GeradorUpdates:
+    """Monta o JSON de updates como o Telegram manda (mensagens e cliques na planilha)."""
+
+    def __init__(self):
+        from config import ADMIN_ID, GRUPO_ID
+
+        self.admin = {"id": int(ADMIN_ID), "is_bot": False, "first_name": "Admin"}
+        self.grupo = int(str(GRUPO_ID).strip("\"'"))
+        self._seq = iter(range(1, 10 ** 9))
+
+    def usuario(self, uid):
+        return {"id": 10_000 + uid, "is_bot": False, "first_name": f"Apostador {uid}"}
+
+    def mensagem(self, usuario, texto):
+        msg = {"message_id": next(self._seq), "date": int(time.time()), "from": usuario,
+               "chat": {"id": usuario["id"], "type": "private"}, "text": texto}
+        if texto.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(texto.split()[0])}]
+        return {"update_id": next(self._seq), "message": msg}
+
+    def clique(self, usuario, dados, message_id):
+        sheet = {"message_id": message_id or 1, "date": int(time.time()),
+                 "chat": {"id": self.grupo, "type": "supergroup"}, "text": "planilha"}
+        cq = {"id": str(next(self._seq)), "from": usuario, "chat_instance": "bench", "data": dados, "message": sheet}
+        return {"update_id": next(self._seq), "callback_query": cq}
+
+    def criar_rodada(self):
+        # fluxo real do admin: /nova_rodada, nome, 14 jogos
+        return [
+            self.mensagem(self.admin, "/nova_rodada"),
+            self.mensagem(self.admin, "Concurso Bench"),
+            self.mensagem(self.admin, ", ".join(f"{a} x {b}" for _, _, a, b in jogos_sinteticos())),
+        ]
+
+    def apostas(self, uid, message_id, rodada_id):
+        rnd = random.Random(uid)
+        usuario = self.usuario(uid)
+        acoes = (cb.TIME1, cb.EMPATE, cb.TIME2)
+        cliques = [self.clique(usuario, cb.codificar(rodada_id, rnd.choice(acoes), i), message_id) for i in range(14)]
+        cliques.append(self.clique(usuario, cb.codificar(rodada_id, cb.ENVIAR), message_id))
+        return cliques
+
+def _app_falsa(falsa):
+    from telegram.ext import Application
+    import bot_loteca_v7_7 as bot
+
+    builder = Application.builder().token("123:bench").get_updates_request(falsa.request)
+    return bot, bot.montar_aplicacao(builder, request=falsa.request)
+
+def _percentis(amostras):
+    if len(amostras) < 2:
+        return (amostras[0],) * 3 if amostras else (0.0,) * 3
+    q = statistics.quantiles(amostras, n=100)
+    return q[49], q[94], q[98]
+
+def bench_callbacks(usuarios=200, latencia=0.03, retry_after=0.02):
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+
+    from telegram import Update
+    from metricas import metricas
+
+    falsa = RequisicaoFalsa(latencia, retry_after)
+    bot, app = _app_falsa(falsa)
+    gerador = GeradorUpdates()
+    latencias = []
+
+    async def processar(update):
+        # passa pelo update processor, como os updates vindos do polling/webhook
+        update = Update.de_json(update, app.bot)
+        inicio = time.perf_counter()
+        await app.update_processor.process_update(update, app.process_update(update))
+        latencias.append(time.perf_counter() - inicio)
+
+    async def apostador(uid, rodada_id):
+        for update in gerador.apostas(uid, falsa.ultima_mensagem[gerador.grupo], rodada_id):
+            await processar(update)
+
+    async def rodar():
+        await app.initialize()
+        await app.post_init(app)
+
+        for update in gerador.criar_rodada():
+            await processar(update)
+        rodada = await bot.db.obter_rodada_ativa(gerador.grupo)
+
+        latencias.clear()
+        metricas.banco.clear()
+        falsa.chamadas.clear()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*[apostador(u, rodada[0]) for u in range(usuarios)])
+        total = time.perf_counter() - inicio
+
+        await app.post_stop(app)
+        await app.shutdown()
+        await app.post_shutdown(app)
+        return total
+
+    total = asyncio.run(rodar())
+    shutil.rmtree(tmp, ignore_errors=True)
+    acoes = usuarios * 15
+    p50, p95, p99 = _percentis(latencias)
+    print(f"callbacks: {usuarios} usuários x (14 cliques + enviar), latência simulada {latencia * 1000:.0f}ms")
+    print(f"  ações/s                 : {acoes / total:10.0f}")
+    print(f"  latência handler p50/p95/p99 (ms): {p50 * 1000:.1f} / {p95 * 1000:.1f} / {p99 * 1000:.1f}")
+    tempo_db = sum(h.soma for h in metricas.banco.values())
+    chamadas_db = sum(h.total for h in metricas.banco.values())
+    print(f"  tempo no banco          : {tempo_db * 1000:.1f}ms em {chamadas_db} chamadas")
+    print("  chamadas à API por ação:")
+    for metodo, n in sorted(falsa.chamadas.items()):
+        print(f"    {metodo:22s}: {n / acoes:6.3f}  ({n})")
+
+# ------------------ WEBHOOK x POLLING ------------------
+def _entrega(modo, usuarios, latencia, intervalo, rajada):
+    # roda num processo próprio (o bot guarda estado em variáveis de módulo)
+    import hashlib
+    import httpx
+    from telegram import Update
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    falsa = RequisicaoFalsa(latencia, retry_after=0)
+    bot, app = _app_falsa(falsa)
+    gerador = GeradorUpdates()
+    porta, segredo = 18443, "segredo-bench"
+
+    async def rodar():
+        await app.initialize()
+        await app.post_init(app)
+        for update in gerador.criar_rodada():
+            await app.process_update(Update.de_json(update, app.bot))
+
+        # mesmos updates gravados nos dois modos, intercalados entre usuários
+        rodada = await bot.db.obter_rodada_ativa(gerador.grupo)
+        por_usuario = [gerador.apostas(u, falsa.ultima_mensagem[gerador.grupo], rodada[0]) for u in range(usuarios)]
+        gravados = [u for rodada in zip(*por_usuario) for u in rodada]
+        chegada = {}
+
+        if modo == "webhook":
+            await app.updater.start_webhook(listen="127.0.0.1", port=porta, url_path="loteca", secret_token=segredo)
+            cliente = httpx.AsyncClient()
+            url = f"http://127.0.0.1:{porta}/loteca"
+            negado = await cliente.post(url, json=gravados[0], headers={"X-Telegram-Bot-Api-Secret-Token": "errado"})
+            assert negado.status_code == 403, negado.status_code
+
+            async def postar(update):
+                await asyncio.sleep(latencia / 2)  # ida Telegram -> nosso servidor
+                r = await cliente.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": segredo})
+                assert r.status_code == 200, r.status_code
+
+            entregar = lambda u: tarefas.append(asyncio.create_task(postar(u)))
+        else:
+            await app.updater.start_polling(poll_interval=0, timeout=10)
+            entregar = falsa.entregar
+
+        await app.start()
+        tarefas = []
+        # cliques chegam em rajadas (vários apostadores ao mesmo tempo), 10ms entre um e outro
+        for n, update in enumerate(gravados, 1):
+            chegada[update["callback_query"]["id"]] = time.perf_counter()
+            entregar(update)
+            await asyncio.sleep(intervalo if n % rajada == 0 else 0.01)
+        await asyncio.gather(*tarefas)
+
+        limite = time.perf_counter() + 60
+        while len(set(chegada) & set(falsa.respondidos)) < len(chegada) and time.perf_counter() < limite:
+            await asyncio.sleep(0.01)
+
+        await app.updater.stop()
+        await app.stop()
+        await app.post_stop(app)
+        stats = await bot.db.obter_estatisticas_rodada(rodada[0])
+        await app.shutdown()
+        await app.post_shutdown(app)
+        if modo == "webhook":
+            await cliente.aclose()
+
+        latencias = [falsa.respondidos[i] - t for i, t in chegada.items() if i in falsa.respondidos]
+        enviadas = sorted(falsa.enviadas)
+        return {
+            "latencias": _percentis(latencias),
+            "respondidos": len(latencias),
+            "resultado": {
+                "total_palpitadores": stats["total_palpitadores"],
+                "estatisticas": stats["estatisticas"],
+                "mensagens": hashlib.sha256(repr(enviadas).encode()).hexdigest(),
+            },
+        }
+
+    saida = asyncio.run(rodar())
+    shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(saida))
+
+def bench_webhook(usuarios=10, latencia=0.1, intervalo=0.3, rajada=5):
+    # intervalo entre rajadas maior que o tempo dos handlers: mede a entrega, não a fila.
+    # No polling, o update que chega logo depois de um getUpdates voltar espera a ida e a volta
+    # do próximo; no webhook cada update sai na hora. latencia = ida e volta até o Telegram.
+    import subprocess
+
+    resultados = {}
+    for modo in ("polling", "webhook"):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_entrega", modo, str(usuarios), str(latencia), str(intervalo),
+             str(rajada)],
+            capture_output=True, text=True, timeout=300,
+        )
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:])
+            raise SystemExit(f"modo {modo} falhou")
+        resultados[modo] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    polling, webhook = resultados["polling"], resultados["webhook"]
+    assert polling["resultado"] == webhook["resultado"], "webhook e polling divergiram"
+    print(f"entrega de {usuarios * 15} updates gravados ({usuarios} usuários, rajadas de {rajada}), ida e volta simulada {latencia * 1000:.0f}ms")
+    print("  chegada -> resposta do callback, p50/p95/p99 (ms):")
+    for modo, r in resultados.items():
+        p50, p95, p99 = r["latencias"]
+        print(f"    {modo:8s}: {p50 * 1000:7.1f} / {p95 * 1000:7.1f} / {p99 * 1000:7.1f}  ({r['respondidos']} respondidos)")
+    print("  resultado final idêntico nos dois modos (palpites, contadores e mensagens enviadas)")
+    # rajadas: metade ou mais dos updates do polling pega a volta de um getUpdates (ida e volta a mais)
+    ganho = polling["latencias"][0] - webhook["latencias"][0]
+    assert ganho > 0, f"webhook não ficou mais rápido que o polling (p50 {ganho * 1000:.1f}ms)"
+    print(f"  webhook {ganho * 1000:.1f}ms mais rápido no p50")
+
+# ------------------ TRANSMISSÃO (PARADA E RETOMADA) ------------------
+def bench_transmissao(usuarios=120, por_segundo=40.0):
+    from telegram import Bot
+    from database import Database
+    from database_async import DatabaseAsync
+    from saida import RequisicaoPriorizada
+    from transmissao import FilaTransmissao
+
+    import logging
+    logging.getLogger("saida").setLevel(logging.ERROR)  # os 429 abaixo são de propósito
+
+    tmp = tempfile.mkdtemp()
+    db = DatabaseAsync(Database(os.path.join(tmp, "bench.db")))
+    falsa = RequisicaoFalsa(latencia=0.01, retry_after=0)
+    # 1 em 10 bloqueou o bot (403); 1 em 7 leva um 429 no primeiro envio (a saída repete sozinha)
+    bloqueados = {10_000 + u for u in range(usuarios) if u % 10 == 3}
+    limitados = {10_000 + u for u in range(usuarios) if u % 7 == 5}
+    responder = falsa.responder
+
+    async def responder_com_erros(metodo, params):
+        chat = int(params.get("chat_id", 0))
+        if metodo == "sendMessage" and chat in bloqueados:
+            falsa.chamadas["bloqueado"] += 1
+            corpo = {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+            return 403, json.dumps(corpo).encode()
+        if metodo == "sendMessage" and chat in limitados:
+            limitados.discard(chat)
+            falsa.chamadas["retry_after"] += 1
+            corpo = {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                     "parameters": {"retry_after": 1}}
+            return 429, json.dumps(corpo).encode()
+        return await responder(metodo, params)
+
+    falsa.responder = responder_com_erros
+
+    async def pendentes():
+        return len(await db.obter_envios_pendentes(10 ** 6))
+
+    async def rodar():
+        bot = Bot("123:bench", request=RequisicaoPriorizada(falsa.request, por_segundo=100),
+                  get_updates_request=falsa.request)
+        await bot.initialize()
+        rodada_id = await db.criar_nova_rodada("anterior", -1)
+        await db.salvar_palpites_lote([(rodada_id, 10_000 + u, f"u{u}", "", ["1"] * 14) for u in range(usuarios)])
+
+        fila = FilaTransmissao(db, por_segundo)
+        assert await fila.enfileirar("abertura:2", "Rodada nova aberta!", -1) == usuarios
+        inicio = time.perf_counter()
+        fila.iniciar(bot)
+        while len(falsa.enviadas) < usuarios // 3:
+            await asyncio.sleep(0.01)
+        # desligamento no meio: o que já saiu sai da fila, o resto fica no banco
+        await fila.parar()
+        na_parada = len(falsa.enviadas), await pendentes()
+
+        # "reinício": outra fila sobre o mesmo banco continua de onde parou
+        fila = FilaTransmissao(db, por_segundo)
+        fila.iniciar(bot)
+        limite = time.perf_counter() + 60
+        while await pendentes() and time.perf_counter() < limite:
+            await asyncio.sleep(0.05)
+        total = time.perf_counter() - inicio
+        await fila.parar()
+        await bot.shutdown()
+        marcados = await db.executar(lambda d: {u for (u,) in d._leitura().execute('SELECT user_id FROM usuarios_bloqueados')})
+        return na_parada, total, marcados
+
+    (enviadas_parada, pendentes_parada), total, marcados = asyncio.run(rodar())
+    db.fechar()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    entregues = Counter(chat for chat, _ in falsa.enviadas)
+    esperados = {10_000 + u for u in range(usuarios)} - bloqueados
+    repetidos = sum(n - 1 for n in entregues.values())
+    assert set(entregues) == esperados, "aviso perdido ou entregue a quem bloqueou o bot"
+    assert marcados == bloqueados
+    assert 0 < pendentes_parada < usuarios
+    # a parada espera os envios em voo: nada sai duas vezes depois do reinício
+    assert repetidos == 0, f"{repetidos} avisos repetidos"
+    taxa = sum(entregues.values()) / total
+    assert taxa <= por_segundo * 1.1, f"{taxa:.1f} msgs/s acima do limite de {por_segundo}"
+
+    print(f"transmissão para {usuarios} usuários ({len(bloqueados)} bloquearam o bot), limite {por_segundo:.0f} msgs/s:")
+    print(f"  parada no meio: {enviadas_parada} entregues, {pendentes_parada} ficaram no banco")
+    print(f"  após o reinício: {len(entregues)}/{len(esperados)} entregues, {repetidos} repetidos, "
+          f"{len(marcados)} marcados como bloqueados")
+    print(f"  429 absorvidos pela saída: {falsa.chamadas['retry_after']} | taxa média {taxa:.1f} msgs/s em {total:.1f}s")
+
+# ------------------ CAMADA DE SAÍDA ------------------
+def bench_saida(latencia=0.005, retry_after=0.5):
+    import logging
+    from telegram import Bot
+    from telegram.error import TelegramError
+    from agendador import AgendadorEdicoes
+    from saida import RequisicaoPriorizada
+
+    # os 429/502 abaixo são de propósito
+    logging.getLogger("saida").setLevel(logging.CRITICAL)
+    logging.getLogger("agendador").setLevel(logging.CRITICAL)
+
+    falsa = RequisicaoFalsa(latencia=latencia, retry_after=0)
+    responder = falsa.responder
+    inicio = time.monotonic()
+    chamadas = []  # (instante, método, chat, texto) de cada pedido que chegou à "API"
+    falhas = {}    # (método, chat) -> [status, quantas vezes]
+
+    async def responder_com_erros(metodo, params):
+        chat = int(params.get("chat_id", 0))
+        chamadas.append((time.monotonic() - inicio, metodo, chat, params.get("text")))
+        falha = falhas.get((metodo, chat))
+        if falha and falha[1]:
+            falha[1] -= 1
+            corpo = {"ok": False, "error_code": falha[0], "description": "falha simulada"}
+            if falha[0] == 429:
+                corpo["parameters"] = {"retry_after": retry_after}
+            return falha[0], json.dumps(corpo).encode()
+        return await responder(metodo, params)
+
+    falsa.responder = responder_com_erros
+
+    def da_api(metodo, chat=None):
+        return [c for c in chamadas if c[1] == metodo and (chat is None or c[2] == chat)]
+
+    async def rodar():
+        # uma edição por 0,5s em grupo, sem rajada: a segunda espera na fila e junta as seguintes
+        saida = RequisicaoPriorizada(falsa.request, edicoes_por_minuto=120, rajada=1)
+        saida.BACKOFF_BASE = 0.01
+        bot = Bot("123:bench", request=saida, get_updates_request=falsa.request)
+        await bot.initialize()
+        r = {}
+
+        # edições da mesma mensagem: a que está na fila sai uma vez só, com o texto mais novo
+        await bot.edit_message_text("v0", chat_id=-100, message_id=7)
+        editadas = await asyncio.gather(*[bot.edit_message_text(f"v{i}", chat_id=-100, message_id=7)
+                                          for i in range(1, 6)])
+        r["edicoes"] = [c[3] for c in da_api("editMessageText", -100)]
+        r["edicoes_resposta"] = [m.text for m in editadas]
+
+        # a mesma callback query respondida duas vezes
+        r["respostas"] = await asyncio.gather(bot.answer_callback_query("q1"), bot.answer_callback_query("q1"))
+        r["respostas_api"] = len(da_api("answerCallbackQuery"))
+
+        # 429 no chat 101: ele (e o que vier para ele) espera retry_after; o chat 102 não
+        falhas[("sendMessage", 101)] = [429, 1]
+        a = asyncio.create_task(bot.send_message(101, "a1"))
+        await asyncio.sleep(0.05)
+        depois = asyncio.gather(bot.send_message(101, "a2"), bot.send_message(102, "b1"))
+        await a
+        await depois
+        r["chat_101"] = [c[0] for c in da_api("sendMessage", 101)]
+        r["chat_102"] = [c[0] for c in da_api("sendMessage", 102)]
+
+        # 502: sendMessage pode ter saído, não repete; editMessageText repete
+        falhas[("sendMessage", 103)] = [502, 1]
+        falhas[("editMessageText", 104)] = [502, 1]
+        envio, edicao = await asyncio.gather(bot.send_message(103, "c1"),
+                                             bot.edit_message_text("d1", chat_id=104, message_id=1),
+                                             return_exceptions=True)
+        r["502_envio"] = (envio, len(da_api("sendMessage", 103)))
+        r["502_edicao"] = (edicao, len(da_api("editMessageText", 104)))
+
+        # edição que nunca passa: só as tentativas da saída, o agendador não reenfileira
+        falhas[("editMessageText", 105)] = [502, 10 ** 6]
+        agendador = AgendadorEdicoes()
+        agendador.iniciar(bot)
+        agendador.agendar(105, 1, "sempre 502")
+        await agendador.parar()
+        r["desistiu"] = len(da_api("editMessageText", 105))
+
+        await bot.shutdown()
+        return r
+
+    r = asyncio.run(rodar())
+
+    assert r["edicoes"] == ["v0", "v5"], r["edicoes"]
+    assert r["edicoes_resposta"] == ["v5"] * 5, r["edicoes_resposta"]
+    assert r["respostas"] == [True, True] and r["respostas_api"] == 1, r
+    (t429, t_a1, t_a2), (t_b1,) = r["chat_101"], r["chat_102"]
+    assert min(t_a1, t_a2) - t429 >= retry_after * 0.95, r["chat_101"]
+    assert t_b1 - t429 < retry_after / 2, (t429, t_b1)
+    envio, n_envio = r["502_envio"]
+    assert isinstance(envio, TelegramError) and n_envio == 1, r["502_envio"]
+    edicao, n_edicao = r["502_edicao"]
+    assert edicao.text == "d1" and n_edicao == 2, r["502_edicao"]
+    assert r["desistiu"] == RequisicaoPriorizada.MAX_TENTATIVAS, r["desistiu"]
+
+    print("saída:")
+    print(f"  6 edições da mesma mensagem -> {len(r['edicoes'])} chamadas ({', '.join(r['edicoes'])})")
+    print(f"  answerCallbackQuery repetido -> {r['respostas_api']} chamada")
+    print(f"  429 (retry_after {retry_after}s) no chat 101: novas tentativas +{t_a1 - t429:.2f}s/+{t_a2 - t429:.2f}s; "
+          f"chat 102 saiu em +{t_b1 - t429:.2f}s")
+    print(f"  502: sendMessage {n_envio} chamada ({type(envio).__name__}), editMessageText {n_edicao} chamadas")
+    print(f"  edição sempre recusada: {r['desistiu']} chamadas à API no total")
+
+# ------------------ RESULTADO ENCERRA A RODADA ------------------
+def _encerramento():
+    # roda num processo próprio, como o _entrega
+    from telegram import Update
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    falsa = RequisicaoFalsa(latencia=0.001, retry_after=0)
+    bot, app = _app_falsa(falsa)
+    gerador = GeradorUpdates()
+
+    async def processar(update):
+        await app.process_update(Update.de_json(update, app.bot))
+
+    async def rodar():
+        await app.initialize()
+        await app.post_init(app)
+        for update in gerador.criar_rodada():
+            await processar(update)
+        rodada = await bot.db.obter_rodada_ativa(gerador.grupo)
+        planilha = falsa.ultima_mensagem[gerador.grupo]
+
+        # apostador 0 envia; apostador 1 preenche tudo e deixa o ENVIAR para depois do resultado
+        for update in gerador.apostas(0, planilha, rodada[0]):
+            await processar(update)
+        atrasado = gerador.apostas(1, planilha, rodada[0])
+        for update in atrasado[:-1]:
+            await processar(update)
+
+        oficial = " ".join(random.Random(5).choice(("1", "X", "2")) for _ in range(14))
+        await processar(gerador.mensagem(gerador.admin, f"/resultado #{rodada[0]} {oficial}"))
+
+        await processar(atrasado[-1])
+        recusa = falsa.respostas.get(atrasado[-1]["callback_query"]["id"])
+        clique = gerador.apostas(2, planilha, rodada[0])[0]
+        await processar(clique)
+        recusa_clique = falsa.respostas.get(clique["callback_query"]["id"])
+        # ENVIAR que já tinha passado pela checagem quando o resultado saiu
+        corrida = await bot.db.salvar_palpite(rodada[0], 99, "Corrida", "", ["1"] * 14)
+
+        saida = {
+            "recusa": recusa,
+            "recusa_clique": recusa_clique,
+            "corrida": corrida,
+            "ativa": (await bot.db.obter_rodada(rodada[0]))[2],
+            "palpites": await bot.db.contar_palpites(rodada[0]),
+            "ranking": len(await bot.db.obter_ranking()),
+        }
+        await app.post_stop(app)
+        await app.shutdown()
+        await app.post_shutdown(app)
+        return saida
+
+    saida = asyncio.run(rodar())
+    shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(saida))
+
+def bench_encerramento():
+    import subprocess
+
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "_encerramento"],
+                          capture_output=True, text=True, timeout=300)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise SystemExit("cenário de encerramento falhou")
+    r = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert r["ativa"] == 0, r
+    assert "encerrada" in (r["recusa"] or "") and "encerrada" in (r["recusa_clique"] or ""), r
+    assert r["corrida"] is None and r["palpites"] == 1 and r["ranking"] == 1, r
+    print("resultado encerra a rodada: ENVIAR e cliques depois do /resultado recusados, ranking só com quem enviou antes")
+
+BENCHES = {
+    "render": bench_render,
+    "envios": bench_envios,
+    "rascunhos": bench_rascunhos,
+    "apuracao": bench_apuracao,
+    "backup": bench_backup,
+    "ranking": bench_ranking,
+    "desdobramento": bench_desdobramento,
+    "callbacks": bench_callbacks,
+    "webhook": bench_webhook,
+    "transmissao": bench_transmissao,
+    "saida": bench_saida,
+    "encerramento": bench_encerramento,
+}
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["_entrega"]:
+        _entrega(sys.argv[2], int(sys.argv[3]), float(sys.argv[4]), float(sys.argv[5]), int(sys.argv[6]))
+        sys.exit(0)
+    if sys.argv[1:2] == ["_encerramento"]:
+        _encerramento()
+        sys.exit(0)
+    nomes = sys.argv[1:] or list(BENCHES)
+    for nome in nomes:
+        BENCHES[nome]()
@@ -1,15 +1,46 @@
 # bot_loteca_v7_7.py
 
+import asyncio
+import importlib.util
 import logging
-import json
+import secrets
 from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
+from telegram.helpers import create_deep_linked_url, escape_markdown
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler,
     MessageHandler, ContextTypes, filters
 )
+from telegram.error import Forbidden, TelegramError
+from telegram.request import HTTPXRequest
 from database import Database
-from config import BOT_TOKEN, ADMIN_ID, GRUPO_ID
+from database_async import DatabaseAsync
+from agendador import AgendadorEdicoes
+from planilha import PlanilhaRodada
+from rascunhos import RascunhoStore
+from grupo_commit import GrupoCommit
+from palpites_codec import codificar, formatar
+from apuracao import apurar, ler_resultado, FAIXAS_PREMIADAS
+from metricas import metricas
+from processamento import ProcessadorPorUsuario
+from paginacao import montar_pagina
+from exportacao import enviar_arquivo, escrever_exportacao, FORMATOS
+from registro import RegistroChats
+import callback_codec as cb
+from backup import BackupPeriodico, restaurar_se_preciso
+from importacao import ler_jogos, ler_importacao
+from transmissao import FilaTransmissao
+from saida import RequisicaoPriorizada
+from desdobramento import (
+    LIMITE_ARQUIVO, combinacoes, cobertura, duplos_triplos, escrever_desdobramento, ler_mascaras,
+    marcados, milhar, reais,
+)
+from config import (
+    BOT_TOKEN, ADMIN_ID, GRUPO_ID, DB_PATH, BACKUP_PATH, BACKUP_INTERVALO,
+    EDICOES_POR_MINUTO, EDICOES_POR_MINUTO_PRIVADO, SAIDA_POR_SEGUNDO, MODO_PLANILHA, METRICS_PORT,
+    TRANSMISSAO_POR_SEGUNDO, LEMBRETE_MINUTOS, RASCUNHO_TTL, RASCUNHOS_MAXIMO, PRECO_APOSTA,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+)
 
 # ---------------- logging ----------------
 logging.basicConfig(
@@ -23,25 +54,84 @@ print(f"📋 Token: {BOT_TOKEN[:10]}...")
 print(f"👤 Admin ID: {ADMIN_ID}")
 print(f"🏠 Grupo ID: {GRUPO_ID}")
 
-db = Database()
+# Banco principal sumiu (ex.: /tmp limpo no reboot)? Volta do último backup
+restaurar_se_preciso(DB_PATH, BACKUP_PATH)
+
+# Acesso ao banco fora do event loop (thread de escrita + pool de leitura)
+db = DatabaseAsync(metricas.instrumentar_banco(Database(DB_PATH)))
+
+# Cópia online periódica para BACKUP_PATH (e uma última ao desligar)
+backup = BackupPeriodico(DB_PATH, BACKUP_PATH, BACKUP_INTERVALO) if BACKUP_PATH else None
+
+# Envios de palpites gravados em lote (um commit por rajada)
+submissoes = GrupoCommit(db)
+
+# Edições das planilhas saem por aqui (agrupadas e limitadas por chat)
+agendador = AgendadorEdicoes()
+
+# Avisos por DM para quem já palpitou (fila no banco, limite global de mensagens)
+transmissoes = FilaTransmissao(db, TRANSMISSAO_POR_SEGUNDO)
 
 # ---------------- Estados em memória ----------------
-# Cada usuário → [14 palpites]
-user_palpites = {}
+# (rodada, usuário) → [14 palpites] (rascunhos; salvos em lote no banco)
+user_palpites = RascunhoStore(db, ttl=RASCUNHO_TTL, maximo=RASCUNHOS_MAXIMO)
+metricas.medidor("rascunhos_em_memoria", lambda: len(user_palpites))
+
+# Rodada ativa de cada chat e rodada de cada planilha postada (persistido no banco)
+registro = RegistroChats(db)
+
+# Planilhas pré-montadas das rodadas abertas (partes fixas; o LRU das renderizadas é um só, em planilha.py)
+planilhas = {}
 
-# Dados da última planilha enviada ao grupo
-last_msg = {"chat_id": None, "message_id": None, "rodada_id": None, "nome_rodada": None}
+# Resposta pronta do /estatisticas por rodada (invalidada a cada palpite salvo)
+cache_estatisticas = {}
+# Versão dos contadores por rodada: leitura que cruzou um envio não volta para o cache
+versao_estatisticas = {}
+
+# Lembretes de "rodada fechando" agendados por rodada (refeitos no post_init)
+lembretes = {}
+# callbacks já respondidos pelo handler (handle_callback responde os demais)
+respondidas = set()
 
 # ---------------- Util ----------------
+async def obter_planilha(rodada_id, nome_rodada=None):
+    planilha = planilhas.get(rodada_id)
+    if planilha is None:
+        if nome_rodada is None:
+            rodada = await db.obter_rodada(rodada_id)
+            nome_rodada = rodada[1] if rodada else ""
+        planilha = planilhas[rodada_id] = PlanilhaRodada(rodada_id, nome_rodada, await db.obter_jogos(rodada_id))
+    return planilha
+
 def safe_group_id():
     try:
         return int(GRUPO_ID)
     except:
         return int(str(GRUPO_ID).replace('"', "").replace("'", ""))
 
+async def rodada_do_comando(update: Update):
+    # no grupo: a rodada daquele chat; no privado: a rodada ativa mais recente
+    chat = update.effective_chat
+    if chat.type in ["group", "supergroup"]:
+        rodada_id = await registro.rodada_ativa(chat.id)
+        return await db.obter_rodada(rodada_id) if rodada_id else None
+    return await db.obter_rodada_ativa()
+
+def link_planilha(bot, rodada_id):
+    # /start r<id> no privado abre a planilha pessoal da rodada
+    return create_deep_linked_url(bot.username, f"r{rodada_id}")
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
 
+    if chat.type == "private":
+        # voltou a falar com o bot: volta a receber os avisos por DM
+        await db.desbloquear_usuario(update.effective_user.id)
+
+    if chat.type == "private" and context.args and context.args[0][:1] == "r" and context.args[0][1:].isdigit():
+        await abrir_planilha_privada(update, int(context.args[0][1:]))
+        return
+
     if chat.type in ["group", "supergroup"]:
         await update.message.reply_text(
             "🤖 Bot da Loteca — v5\n\n"
@@ -54,7 +144,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "/nova_rodada (admin)\n"
             "/estatisticas\n"
             "/ver_palpites\n"
-            "/meus_palpites\n\n"
+            "/meus_palpites\n"
+            "/desdobramento (duplos e triplos)\n"
+            "/ranking\n"
+            "/resultado (admin)\n"
+            "/exportar (admin)\n"
+            "/importar (admin)\n"
+            "/abrir_rodada (admin)\n"
+            "/metrics (admin)\n\n"
             "A planilha aparece no grupo, não aqui."
         )
         
@@ -64,8 +161,11 @@ async def nova_rodada(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Apenas o administrador pode usar /nova_rodada.")
         return
 
+    # no grupo a rodada é daquele chat; no privado vai para o GRUPO_ID configurado
+    chat = update.effective_chat
     context.user_data["criando"] = True
     context.user_data["etapa"] = "nome"
+    context.user_data["chat_destino"] = chat.id if chat.type in ["group", "supergroup"] else safe_group_id()
 
     await update.message.reply_text(
         "🆕 *Criar nova rodada*\n\n"
@@ -105,36 +205,25 @@ async def processar_mensagens_rodada(update: Update, context: ContextTypes.DEFAU
 
     # ---- etapa 2: jogos ----
     if etapa == "jogos":
-        partes = [p.strip() for p in texto.split(",") if p.strip() != ""]
-        if len(partes) != 14:
+        jogos, invalidos = ler_jogos(texto)
+        if invalidos:
+            await update.message.reply_text(f"❌ Formato inválido em: {', '.join(invalidos)}. Use Time1 x Time2.")
+            return
+        if len(jogos) != 14:
             await update.message.reply_text("❌ Envie exatamente 14 jogos separados por vírgula.")
             return
 
-        jogos = []
-        for p in partes:
-            if " x " in p:
-                t1, t2 = p.split(" x ", 1)
-            elif "x" in p:
-                t1, t2 = p.split("x", 1)
-            else:
-                await update.message.reply_text("❌ Formato inválido. Use Time1 x Time2.")
-                return
-            jogos.append((t1.strip(), t2.strip()))
-
         nome = context.user_data["nome"]
+        chat_destino = context.user_data.get("chat_destino", safe_group_id())
 
         try:
-            rodada_id = db.criar_nova_rodada(nome)
-            db.inserir_jogos(jogos, rodada_id)
-
-            # Reset global state
-            global user_palpites, last_msg
-            user_palpites = {}
-            last_msg = {"chat_id": None, "message_id": None, "rodada_id": rodada_id, "nome_rodada": nome}
+            anterior = await registro.rodada_ativa(chat_destino)
+            rodada_id = await db.criar_nova_rodada(nome, chat_destino)
+            await db.inserir_jogos(jogos, rodada_id)
 
             await update.message.reply_text(f"🎉 Rodada *{nome}* criada com sucesso!", parse_mode="Markdown")
 
-            await postar_planilha_no_grupo(context, rodada_id, nome)
+            await abrir_no_chat(context, rodada_id, nome, chat_destino, anterior)
 
             context.user_data.clear()
 
@@ -142,343 +231,376 @@ async def processar_mensagens_rodada(update: Update, context: ContextTypes.DEFAU
             await update.message.reply_text(f"❌ Erro ao criar rodada: {e}")
             logger.exception(e)
 
-# ------------------ CONSTRUIR PLANILHA INTERATIVA ------------------
-def montar_planilha_interativa(jogos, nome_rodada, user_palpite=None):
-    linhas = []
-    linhas.append(f"📊 *{nome_rodada.upper()}*")
-    linhas.append("")
-    
-    if user_palpite:
-        # Mostra visualização dos palpites atuais
-        palpites_display = []
-        for i, pal in enumerate(user_palpite):
-            if pal == "1":
-                palpites_display.append(f"{i+1}:✅")
-            elif pal == "X":
-                palpites_display.append(f"{i+1}:✅") 
-            elif pal == "2":
-                palpites_display.append(f"{i+1}:✅")
-            else:
-                palpites_display.append(f"{i+1}:⚪")
-        
-        linhas.append("📝 *SEUS PALPITES ATUAIS:*")
-        linhas.append(" ".join(palpites_display))
-        linhas.append("")
-        
-        # Conta quantos faltam
-        faltando = user_palpite.count(None)
-        if faltando > 0:
-            linhas.append(f"⚠️ *Faltam {faltando} jogos*")
-        else:
-            linhas.append("✅ *Todos os jogos preenchidos!*")
-            
-        linhas.append("")
-    
-    linhas.append("Clique nos botões abaixo para fazer seus palpites!")
-    linhas.append("")
+def encerrar_rodada(rodada_id):
+    # estado em memória de uma rodada que o banco acabou de encerrar
+    registro.encerrar(rodada_id)
+    user_palpites.encerrar_rodada(rodada_id)
+    planilhas.pop(rodada_id, None)
+    tarefa = lembretes.pop(rodada_id, None)
+    if tarefa is not None:
+        tarefa.cancel()
+
+async def abrir_no_chat(context, rodada_id, nome, chat_id, anterior, fecha_em=None):
+    # A rodada anterior deste chat foi encerrada; as de outros chats seguem
+    if anterior is not None and anterior != rodada_id:
+        encerrar_rodada(anterior)
+    registro.nova_rodada(chat_id, rodada_id, fecha_em)
+
+    await postar_planilha_no_grupo(context, rodada_id, nome, chat_id)
+    await avisar_abertura(context.bot, rodada_id, nome, chat_id)
+    agendar_lembrete(context.bot, rodada_id, nome, chat_id, fecha_em)
+
+# ------------------ AVISOS POR DM ------------------
+async def avisar_abertura(bot, rodada_id, nome, chat_id):
+    if MODO_PLANILHA == "privado":
+        onde = f"Preencha sua planilha: {escape_markdown(link_planilha(bot, rodada_id))}"
+    else:
+        onde = "Os palpites são feitos na planilha do grupo."
+    texto = f"🆕 *Rodada {escape_markdown(nome)} aberta!*\n\n{onde}"
+    await transmissoes.enfileirar(f"abertura:{rodada_id}", texto, chat_id)
 
-    texto = "\n".join(linhas)
+def agendar_lembrete(bot, rodada_id, nome, chat_id, fecha_em):
+    if not fecha_em:
+        return
+    fim = datetime.fromisoformat(fecha_em)
+    if fim <= datetime.now():
+        return
+    espera = (fim - datetime.now()).total_seconds() - LEMBRETE_MINUTOS * 60
 
-    # Teclado com 4 colunas: Nº (inativo), Time1, X, Time2
-    kb = []
-    for i in range(14):
-        row = jogos[i]
-        if len(row) >= 4:
-            short_t1 = row[2][:12]
-            short_t2 = row[3][:12]
-        else:
-            short_t1 = row[0][:12]
-            short_t2 = row[1][:12]
+    async def lembrar():
+        await asyncio.sleep(max(espera, 0))
+        if not await registro.rodada_aberta(rodada_id):
+            return
+        minutos = max(int((fim - datetime.now()).total_seconds() // 60), 1)
+        texto = f"⏰ *{escape_markdown(nome)}* fecha em {minutos} min e você ainda não enviou seus palpites!"
+        # só quem ainda não palpitou nesta rodada
+        await transmissoes.enfileirar(f"lembrete:{rodada_id}", texto, chat_id, exceto_rodada=rodada_id)
 
-        # Destaca o botão selecionado
-        palpite_atual = user_palpite[i] if user_palpite else None
-        
-        btn_t1 = f"✅{short_t1}" if palpite_atual == "1" else short_t1
-        btn_x = "✅X" if palpite_atual == "X" else "X"
-        btn_t2 = f"{short_t2}✅" if palpite_atual == "2" else short_t2
-
-        kb.append([
-            InlineKeyboardButton(str(i+1), callback_data=f"noop_{i}"),
-            InlineKeyboardButton(btn_t1, callback_data=f"t1_{i}"),
-            InlineKeyboardButton(btn_x, callback_data=f"x_{i}"),
-            InlineKeyboardButton(btn_t2, callback_data=f"t2_{i}")
-        ])
-
-    kb.append([InlineKeyboardButton("🚀 ENVIAR PALPITES", callback_data="enviar")])
-    kb.append([InlineKeyboardButton("📊 VER MEUS PALPITES", callback_data="meus_palpites")])
-
-    return texto, InlineKeyboardMarkup(kb)
-
-# ------------------ CONSTRUIR PLANILHA FINAL ------------------
-def montar_planilha_final(display, jogos, user_name, nome_rodada):
-    linhas = []
-    linhas.append(f"📊 *{nome_rodada.upper()}*")
-    linhas.append(f"✅ *PALPITES DE {user_name.upper()}*")
-    linhas.append("")
-    linhas.append("| JG | 1 | MANDANTE | X | VISITANTE | 2 |")
-    linhas.append("|----|---|----------|---|-----------|---|")
-    
-    for i in range(14):
-        n = i + 1
-        row = jogos[i]
-        if len(row) >= 4:
-            t1 = row[2]
-            t2 = row[3]
-        else:
-            t1 = row[0]
-            t2 = row[1]
+    anterior = lembretes.pop(rodada_id, None)
+    if anterior is not None:
+        anterior.cancel()
+    lembretes[rodada_id] = asyncio.create_task(lembrar())
 
-        pal = display[i]
-        
-        # Formata os times para caber na tabela
-        t1_short = t1[:10] if len(t1) > 10 else t1.ljust(10)
-        t2_short = t2[:10] if len(t2) > 10 else t2.ljust(10)
-        
-        # Define os emojis baseados na seleção
-        emoji_1 = "✅" if pal == "1" else "□"
-        emoji_x = "✅" if pal == "X" else "□" 
-        emoji_2 = "✅" if pal == "2" else "□"
-        
-        linhas.append(f"| {n:2d} | {emoji_1} | {t1_short} | {emoji_x} | {t2_short} | {emoji_2} |")
+# ------------------ IMPORTAR RODADAS (ADMIN) ------------------
+TAMANHO_MAX_IMPORTACAO = 1024 * 1024
+
+async def importar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != ADMIN_ID:
+        await update.message.reply_text("❌ Apenas o admin pode usar.")
+        return
+
+    context.user_data["importando"] = True
+    await update.message.reply_text(
+        "📥 Envie um arquivo .csv ou .json com as rodadas.\n\n"
+        "CSV (uma linha por jogo): rodada,time1,time2,fecha_em\n"
+        "JSON: [{\"nome\": ..., \"jogos\": [\"A x B\", ...], \"fecha_em\": \"2026-10-20 18:00\"}]\n\n"
+        "fecha_em é opcional. As rodadas entram fechadas: abra com /abrir_rodada <id>."
+    )
+
+async def receber_importacao(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != ADMIN_ID:
+        return
+    legenda = (update.message.caption or "").strip()
+    if not context.user_data.pop("importando", False) and not legenda.startswith("/importar"):
+        return
+
+    documento = update.message.document
+    if documento.file_size and documento.file_size > TAMANHO_MAX_IMPORTACAO:
+        await update.message.reply_text("❌ Arquivo grande demais (máx. 1 MB).")
+        return
+
+    arquivo = await documento.get_file()
+    conteudo = bytes(await arquivo.download_as_bytearray())
+    rodadas, erros = ler_importacao(documento.file_name or "", conteudo)
+    if erros:
+        # valida tudo antes: com qualquer erro nada é gravado
+        mais = f"\n... e mais {len(erros) - 20} erros" if len(erros) > 20 else ""
+        await update.message.reply_text("❌ Nada importado:\n" + "\n".join(erros[:20]) + mais)
+        return
+
+    ids = await db.importar_rodadas(rodadas)
+    linhas = [f"#{i} {nome}" + (f" (fecha {fecha_em})" if fecha_em else "") for i, (nome, _, fecha_em) in zip(ids, rodadas)]
+    await update.message.reply_text(
+        f"✅ {len(ids)} rodadas importadas:\n" + "\n".join(linhas) + "\n\nAbra com /abrir_rodada <id>."
+    )
 
-    linhas.append("")
-    linhas.append("🎉 *Palpites enviados com sucesso!*")
+async def abrir_rodada(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != ADMIN_ID:
+        await update.message.reply_text("❌ Apenas o admin pode usar.")
+        return
+
+    if not context.args or not context.args[0].lstrip("#").isdigit():
+        await update.message.reply_text("❌ Use /abrir_rodada <id>")
+        return
+
+    rodada = await db.obter_rodada(int(context.args[0].lstrip("#")))
+    if not rodada:
+        await update.message.reply_text("❌ Rodada não encontrada.")
+        return
+
+    # no grupo abre naquele chat; no privado, no GRUPO_ID configurado
+    chat = update.effective_chat
+    chat_destino = chat.id if chat.type in ["group", "supergroup"] else safe_group_id()
 
-    texto = "\n".join(linhas)
-    return texto, None
+    anterior = await registro.rodada_ativa(chat_destino)
+    await db.ativar_rodada(rodada[0], chat_destino)
+    await abrir_no_chat(context, rodada[0], rodada[1], chat_destino, anterior, rodada[4])
+    if chat.type == "private":
+        await update.message.reply_text(f"🎉 Rodada *{escape_markdown(rodada[1])}* aberta no grupo!", parse_mode="Markdown")
 
 # ------------------ POSTAR PLANILHA NO GRUPO ------------------
-async def postar_planilha_no_grupo(context, rodada_id, nome_rodada):
-    gid = safe_group_id()
-    jogos = db.obter_jogos(rodada_id)
+async def postar_planilha_no_grupo(context, rodada_id, nome_rodada, chat_id=None):
+    gid = chat_id if chat_id is not None else safe_group_id()
+    planilha = await obter_planilha(rodada_id, nome_rodada)
 
-    texto, reply = montar_planilha_interativa(jogos, nome_rodada)
+    if MODO_PLANILHA == "privado":
+        # no grupo só o resumo; cada um preenche a sua planilha no privado
+        texto, reply = planilha.resumo(0, link_planilha(context.bot, rodada_id))
+    else:
+        texto, reply = planilha.interativa()
 
     msg = await context.bot.send_message(
         gid, texto, reply_markup=reply, parse_mode="Markdown"
     )
 
-    last_msg["chat_id"] = msg.chat_id
-    last_msg["message_id"] = msg.message_id
-    last_msg["rodada_id"] = rodada_id
-    last_msg["nome_rodada"] = nome_rodada
+    await registro.registrar(msg.chat_id, msg.message_id, rodada_id, principal=True)
+
+# ------------------ PLANILHA PESSOAL (MODO PRIVADO) ------------------
+async def abrir_planilha_privada(update: Update, rodada_id):
+    user = update.effective_user
+
+    if not await registro.rodada_aberta(rodada_id):
+        await update.message.reply_text("⌛ Esta rodada já foi encerrada.")
+        return
+    if await db.usuario_ja_enviou_rodada(user.id, rodada_id):
+        await update.message.reply_text("⚠️ Você já enviou seus palpites para esta rodada. Veja com /meus_palpites.")
+        return
+
+    planilha = await obter_planilha(rodada_id)
+    rascunho = await user_palpites.recuperar((rodada_id, user.id))
+    texto, reply = planilha.interativa(rascunho.palpites() if rascunho else None)
+    msg = await update.message.reply_text(texto, reply_markup=reply, parse_mode="Markdown")
+
+    # cliques nesta mensagem editam só ela (limite do chat privado, não o do grupo)
+    await registro.registrar(msg.chat_id, msg.message_id, rodada_id)
+
+async def atualizar_resumo_grupo(context, rodada_id):
+    principal = await registro.planilha_principal(rodada_id)
+    if principal is None:
+        return
+    planilha = await obter_planilha(rodada_id)
+    total = await db.contar_palpites(rodada_id)
+    texto, reply = planilha.resumo(total, link_planilha(context.bot, rodada_id))
+    # vários envios seguidos viram uma edição só (agendador junta por mensagem)
+    agendador.agendar(principal[0], principal[1], texto, reply)
 
 # ------------------ ATUALIZAR PLANILHA NO GRUPO ------------------
-async def atualizar_planilha_grupo(context, user_id, rodada_id, user_name=None, enviado=False):
-    jogos = db.obter_jogos(rodada_id)
-    nome_rodada = last_msg["nome_rodada"]
+async def atualizar_planilha_grupo(context, chat_id, message_id, user_id, rodada_id, user_name=None, enviado=False):
+    planilha = await obter_planilha(rodada_id)
+    rascunho = user_palpites.get((rodada_id, user_id))
+    user_palpite = rascunho.palpites() if rascunho else [None] * 14
     
     if enviado and user_name:
         # Mostra a planilha final no estilo da imagem
-        user_palpite = user_palpites.get(user_id, [None] * 14)
-        texto, reply = montar_planilha_final(user_palpite, jogos, user_name, nome_rodada)
+        texto, reply = planilha.final(user_palpite, user_name)
     else:
         # Mostra a planilha interativa com visualização do usuário
-        user_palpite = user_palpites.get(user_id, [None] * 14)
-        texto, reply = montar_planilha_interativa(jogos, nome_rodada, user_palpite)
+        texto, reply = planilha.interativa(user_palpite)
 
-    try:
-        if reply:
-            await context.bot.edit_message_text(
-                chat_id=last_msg["chat_id"],
-                message_id=last_msg["message_id"],
-                text=texto,
-                reply_markup=reply,
-                parse_mode="Markdown"
-            )
-        else:
-            await context.bot.edit_message_text(
-                chat_id=last_msg["chat_id"],
-                message_id=last_msg["message_id"],
-                text=texto,
-                parse_mode="Markdown"
-            )
-        return True
-    except Exception as e:
-        logger.error(f"Erro ao atualizar planilha: {e}")
-        return False
+    # Não espera a API: o agendador junta cliques e respeita o limite do chat
+    agendador.agendar(chat_id, message_id, texto, reply)
+    return True
 
 # ------------------ CALLBACK ------------------
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    user = query.from_user
-    data = query.data
+    msg = query.message
 
-    await query.answer()
+    try:
+        # um decode só: rodada, ação e jogo vêm no próprio botão
+        dados = cb.decodificar(query.data)
+        if dados is None:
+            legado = cb.decodificar_legado(query.data)
+            if legado is None or msg is None:
+                return
+            # botões antigos (texto) não trazem a rodada: vale o registro da mensagem
+            rodada_id = await registro.rodada_da_mensagem(msg.chat_id, msg.message_id)
+            if rodada_id is None:
+                rodada_id = await registro.rodada_ativa(msg.chat_id)
+            if rodada_id is None:
+                await responder(query, "⌛ Esta planilha é de uma rodada encerrada.", show_alert=True)
+                return
+            dados = (rodada_id, *legado)
+
+        rodada_id, acao, arg = dados
+        tratar = ACOES_CALLBACK.get(acao)
+        if tratar is not None:
+            await tratar(context, query, rodada_id, acao, arg)
+    finally:
+        # todo clique é respondido exatamente uma vez (sem texto se o handler não respondeu)
+        if query.id in respondidas:
+            respondidas.discard(query.id)
+        else:
+            await query.answer()
 
-    # ---- garantir rodada do user ----
-    if "rodada_id" not in context.user_data:
-        context.user_data["rodada_id"] = last_msg["rodada_id"]
+async def responder(query, texto=None, show_alert=False):
+    # só a primeira resposta vale (o Telegram recusa a segunda); sai antes das edições
+    if query.id in respondidas:
+        return
+    respondidas.add(query.id)
+    await query.answer(texto, show_alert=show_alert)
 
-    rodada_id = context.user_data["rodada_id"]
+async def rodada_encerrada(query, rodada_id) -> bool:
+    # estado em memória (RegistroChats): planilha velha não chega a tocar nos rascunhos
+    if await registro.rodada_aberta(rodada_id):
+        return False
+    await responder(query, "⌛ Esta planilha é de uma rodada encerrada.", show_alert=True)
+    return True
 
-    # ---- NOOP ----
-    if data.startswith("noop_"):
-        return
+async def clique_noop(context, query, rodada_id, acao, arg):
+    return
 
-    # ---- MEUS PALPITES ----
-    if data == "meus_palpites":
-        await mostrar_meus_palpites(user, rodada_id, query)
-        return
+async def clique_meus_palpites(context, query, rodada_id, acao, arg):
+    await mostrar_meus_palpites(query.from_user, rodada_id, query)
 
-    # ---- garantir rascunho por usuário ----
-    if user.id not in user_palpites:
-        user_palpites[user.id] = [None] * 14
+MARCACOES = {
+    cb.TIME1: ("1", "Time 1"),
+    cb.EMPATE: ("X", "Empate"),
+    cb.TIME2: ("2", "Time 2"),
+}
 
-    # ---- Clique Time1/X/Time2 ----
-    if data.startswith(("t1_", "x_", "t2_")):
-        tipo, idx = data.split("_")
-        idx = int(idx)
+async def clique_jogo(context, query, rodada_id, acao, idx):
+    if idx >= 14 or query.message is None or await rodada_encerrada(query, rodada_id):
+        return
+    user = query.from_user
+    msg = query.message
+    valor, rotulo = MARCACOES[acao]
 
-        # Atualiza apenas o palpite do usuário atual
-        if tipo == "t1":
-            user_palpites[user.id][idx] = "1"
-            await query.answer(f"✅ Jogo {idx+1}: Time 1", show_alert=False)
-        elif tipo == "x":
-            user_palpites[user.id][idx] = "X"
-            await query.answer(f"✅ Jogo {idx+1}: Empate", show_alert=False)
-        elif tipo == "t2":
-            user_palpites[user.id][idx] = "2"
-            await query.answer(f"✅ Jogo {idx+1}: Time 2", show_alert=False)
+    # Atualiza apenas o palpite do usuário atual
+    await user_palpites.marcar((rodada_id, user.id), idx, valor)
+    await responder(query, f"✅ Jogo {idx+1}: {rotulo}", show_alert=False)
 
-        # Atualiza a planilha no grupo com visualização do usuário
-        await atualizar_planilha_grupo(context, user.id, rodada_id)
+    # Atualiza a planilha clicada com visualização do usuário
+    await atualizar_planilha_grupo(context, msg.chat_id, msg.message_id, user.id, rodada_id)
 
+async def clique_enviar(context, query, rodada_id, acao, arg):
+    if query.message is None or await rodada_encerrada(query, rodada_id):
         return
+    user = query.from_user
+    msg = query.message
+    chave = (rodada_id, user.id)
 
-    # ---- ENVIAR PALPITES ----
-    if data == "enviar":
-        pal = user_palpites.get(user.id, [None] * 14)
+    rascunho = await user_palpites.recuperar(chave)
 
-        # Verifica se todos os palpites estão preenchidos
-        if None in pal:
-            jogos_faltando = [i+1 for i, p in enumerate(pal) if p is None]
-            await query.answer(f"⚠️ Complete os jogos: {', '.join(map(str, jogos_faltando))}", show_alert=True)
-            return
+    # Verifica se todos os palpites estão preenchidos (máscara de bits, sem varrer lista)
+    if rascunho is None or not rascunho.completo():
+        jogos_faltando = rascunho.faltando() if rascunho else range(14)
+        await responder(query, f"⚠️ Complete os jogos: {', '.join(str(i + 1) for i in jogos_faltando)}", show_alert=True)
+        return
+    pal = rascunho.palpites()
 
-        # verifica duplicata
-        if db.usuario_ja_enviou_rodada(user.id, rodada_id):
-            await query.answer("⚠️ Você já enviou seus palpites para esta rodada.", show_alert=True)
-            return
+    try:
+        success = await submissoes.salvar(
+            rodada_id,
+            user.id,
+            user.full_name,
+            user.username or "",
+            pal
+        )
+        
+        if success is None:
+            # o resultado saiu entre o clique e a gravação
+            await responder(query, "⌛ Esta rodada já foi encerrada.", show_alert=True)
+        elif success:
+            versao_estatisticas[rodada_id] = versao_estatisticas.get(rodada_id, 0) + 1
+            cache_estatisticas.pop(rodada_id, None)
+            await responder(query, "🎉 Palpites enviados com sucesso!", show_alert=True)
+            
+            # FECHA A PLANILHA NO GRUPO (mostra planilha final no estilo da imagem)
+            await atualizar_planilha_grupo(context, msg.chat_id, msg.message_id, user.id, rodada_id, user.full_name, enviado=True)
 
-        try:
-            success = db.salvar_palpite(
-                rodada_id,
-                user.id,
-                user.full_name,
-                user.username or "",
-                pal
-            )
+            # planilha pessoal: o resumo do grupo acompanha os envios
+            if (msg.chat_id, msg.message_id) != await registro.planilha_principal(rodada_id):
+                await atualizar_resumo_grupo(context, rodada_id)
             
-            if success:
-                await query.answer("🎉 Palpites enviados com sucesso!", show_alert=True)
+            # Remove os palpites temporários do usuário
+            user_palpites.remover(chave)
                 
-                # FECHA A PLANILHA NO GRUPO (mostra planilha final no estilo da imagem)
-                await atualizar_planilha_grupo(context, user.id, rodada_id, user.full_name, enviado=True)
+            # Confirmação por mensagem privada: sai pela fila de saída (com retry) sem segurar o clique
+            context.application.create_task(confirmar_envio(context.bot, user.id, pal))
                 
-                # Remove os palpites temporários do usuário
-                if user.id in user_palpites:
-                    del user_palpites[user.id]
-                    
-                # Envia confirmação por mensagem privada
-                try:
-                    palpites_str = " ".join(pal)
-                    await context.bot.send_message(
-                        user.id,
-                        f"✅ *Palpites enviados com sucesso!*\n\n"
-                        f"📋 Seus palpites para a rodada:\n"
-                        f"`{palpites_str}`\n\n"
-                        f"Boa sorte! 🍀",
-                        parse_mode="Markdown"
-                    )
-                except Exception as e:
-                    logger.warning(f" Não foi possível enviar mensagem privada para {user.id}: {e}")
-                    
-            else:
-                await query.answer("❌ Erro ao salvar palpites.", show_alert=True)
+        else:
+            # insert-if-absent não inseriu: já existia palpite desta rodada
+            await responder(query, "⚠️ Você já enviou seus palpites para esta rodada.", show_alert=True)
 
-        except Exception as e:
-            logger.exception(f"Erro ao salvar palpite: {e}")
-            await query.answer("❌ Erro interno ao salvar.", show_alert=True)
+    except Exception as e:
+        logger.exception(f"Erro ao salvar palpite: {e}")
+        await responder(query, "❌ Erro interno ao salvar.", show_alert=True)
 
-        return
+async def confirmar_envio(bot, user_id, pal):
+    try:
+        palpites_str = " ".join(pal)
+        await bot.send_message(
+            user_id,
+            f"✅ *Palpites enviados com sucesso!*\n\n"
+            f"📋 Seus palpites para a rodada:\n"
+            f"`{palpites_str}`\n\n"
+            f"Boa sorte! 🍀",
+            parse_mode="Markdown"
+        )
+    except Forbidden:
+        # nunca abriu o privado com o bot (ou bloqueou): não há o que repetir
+        logger.info(f"Usuário {user_id} não recebe mensagens privadas do bot")
+    except TelegramError as e:
+        logger.warning(f"Não foi possível enviar mensagem privada para {user_id} após as tentativas: {e}")
 
 # ------------------ MOSTRAR MEUS PALPITES ------------------
-async def mostrar_meus_palpites(user, rodada_id, query):
-    rodada = db.obter_rodada_ativa()
-    if not rodada:
-        await query.answer("❌ Nenhuma rodada ativa.", show_alert=True)
-        return
+def exibir_rascunho(rascunho) -> str:
+    vazios = set(rascunho.faltando())
+    return " ".join(f"{i+1}:⚪" if i in vazios else f"{i+1}:✅" for i in range(14))
 
+async def mostrar_meus_palpites(user, rodada_id, query):
     # Verifica se já enviou palpites
-    if db.usuario_ja_enviou_rodada(user.id, rodada_id):
-        palpites = db.obter_palpites_rodada(rodada_id)
-        meus_palpites = next((p for p in palpites if p[2] == user.id), None)
-        if meus_palpites:
-            arr = json.loads(meus_palpites[5])
-            palpites_str = " ".join(arr)
-            await query.answer(f"📋 SEUS PALPITES ENVIADOS:\n{palpites_str}", show_alert=True)
+    meus_palpites = await db.obter_palpite_usuario(rodada_id, user.id)
+    if meus_palpites:
+        palpites_str = formatar(meus_palpites[5])
+        await responder(query, f"📋 SEUS PALPITES ENVIADOS:\n{palpites_str}", show_alert=True)
         return
 
     # Mostra rascunho atual
-    if user.id in user_palpites:
-        pal = user_palpites[user.id]
-        palpites_display = []
-        for i, p in enumerate(pal):
-            if p == "1":
-                palpites_display.append(f"{i+1}:✅")
-            elif p == "X":
-                palpites_display.append(f"{i+1}:✅")
-            elif p == "2":
-                palpites_display.append(f"{i+1}:✅")
-            else:
-                palpites_display.append(f"{i+1}:⚪")
-        
-        palpites_str = " ".join(palpites_display)
-        completos = all(p is not None for p in pal)
+    rascunho = await user_palpites.recuperar((rodada_id, user.id))
+    if rascunho is not None:
+        palpites_str = exibir_rascunho(rascunho)
+        completos = rascunho.completo()
         status = "✅ PRONTO PARA ENVIAR" if completos else "⚠️ INCOMPLETO"
-        await query.answer(f"📝 SEUS RASCUNHOS ({status}):\n{palpites_str}\n\n{'🚀 Clique em ENVIAR para confirmar!' if completos else '⚠️ Complete todos os jogos!'}", show_alert=True)
+        await responder(query, f"📝 SEUS RASCUNHOS ({status}):\n{palpites_str}\n\n{'🚀 Clique em ENVIAR para confirmar!' if completos else '⚠️ Complete todos os jogos!'}", show_alert=True)
     else:
-        await query.answer("📝 Você ainda não começou a preencher seus palpites.", show_alert=True)
+        await responder(query, "📝 Você ainda não começou a preencher seus palpites.", show_alert=True)
 
 # ------------------ MEUS PALPITES (COMANDO) ------------------
 async def meus_palpites(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    rodada = db.obter_rodada_ativa()
+    rodada = await rodada_do_comando(update)
     
     if not rodada:
         await update.message.reply_text("❌ Nenhuma rodada ativa no momento.")
         return
 
     # Verifica se já enviou palpites
-    if db.usuario_ja_enviou_rodada(user.id, rodada[0]):
-        palpites = db.obter_palpites_rodada(rodada[0])
-        meus_palpites = next((p for p in palpites if p[2] == user.id), None)
-        if meus_palpites:
-            arr = json.loads(meus_palpites[5])
-            texto = f"📋 *SEUS PALPITES - {rodada[1]}*\n\n"
-            texto += f"`{' '.join(arr)}`"
-            texto += f"\n\n⏰ Enviado em: {meus_palpites[6]}"
-            await update.message.reply_text(texto, parse_mode="Markdown")
+    meus_palpites = await db.obter_palpite_usuario(rodada[0], user.id)
+    if meus_palpites:
+        texto = f"📋 *SEUS PALPITES - {rodada[1]}*\n\n"
+        texto += f"`{formatar(meus_palpites[5])}`"
+        texto += f"\n\n⏰ Enviado em: {meus_palpites[6]}"
+        await update.message.reply_text(texto, parse_mode="Markdown")
         return
 
     # Mostra rascunho atual
-    if user.id in user_palpites:
-        pal = user_palpites[user.id]
+    rascunho = await user_palpites.recuperar((rodada[0], user.id))
+    if rascunho is not None:
         texto = f"📋 *RASCUNHO ATUAL - {rodada[1]}*\n\n"
-        palpites_display = []
-        for i, p in enumerate(pal):
-            if p == "1":
-                palpites_display.append(f"{i+1}:✅")
-            elif p == "X":
-                palpites_display.append(f"{i+1}:✅")
-            elif p == "2":
-                palpites_display.append(f"{i+1}:✅")
-            else:
-                palpites_display.append(f"{i+1}:⚪")
-        
-        texto += " ".join(palpites_display)
-        completos = all(p is not None for p in pal)
+        texto += exibir_rascunho(rascunho)
+        completos = rascunho.completo()
         status = "✅ PRONTO PARA ENVIAR" if completos else "⚠️ INCOMPLETO"
         texto += f"\n\n*Status:* {status}"
         texto += "\n\n⚠️ *Atenção:* Estes são apenas rascunhos. Clique em 'ENVIAR PALPITES' na planilha do grupo para confirmar."
@@ -488,16 +610,26 @@ async def meus_palpites(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ------------------ ESTATÍSTICAS ------------------
 async def estatisticas(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    rodada = db.obter_rodada_ativa()
+    rodada = await rodada_do_comando(update)
     if not rodada:
         await update.message.reply_text("❌ Nenhuma rodada ativa.")
         return
 
-    stats = db.obter_estatisticas_rodada(rodada[0])
-    if not stats:
-        await update.message.reply_text("📊 Nenhum palpite ainda.")
-        return
+    texto = cache_estatisticas.get(rodada[0])
+    if texto is None:
+        versao = versao_estatisticas.get(rodada[0], 0)
+        stats = await db.obter_estatisticas_rodada(rodada[0])
+        if not stats:
+            await update.message.reply_text("📊 Nenhum palpite ainda.")
+            return
+        texto = formatar_estatisticas(rodada, stats)
+        # um ENVIAR concorrente pode ter gravado depois desta leitura: aí o texto já nasce velho
+        if versao_estatisticas.get(rodada[0], 0) == versao:
+            cache_estatisticas[rodada[0]] = texto
 
+    await update.message.reply_text(texto, parse_mode="Markdown")
+
+def formatar_estatisticas(rodada, stats):
     texto = f"📊 *ESTATÍSTICAS - {rodada[1]}*\n\n"
     texto += f"👥 Total de palpitadores: {stats['total_palpitadores']}\n\n"
 
@@ -523,59 +655,343 @@ async def estatisticas(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"2: {est[i]['2']} ({est[i]['2']/total*100:.1f}%)\n\n"
         )
 
+    return texto
+
+# ------------------ DESDOBRAMENTO (DUPLOS/TRIPLOS) ------------------
+async def desdobramento(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.type != "private":
+        await update.message.reply_text("📩 Use /desdobramento no privado do bot.")
+        return
+
+    mascaras = ler_mascaras(context.args)
+    if mascaras is None:
+        await update.message.reply_text(
+            "🎯 *DESDOBRAMENTO*\n\n"
+            "Envie as 14 marcações na ordem dos jogos:\n"
+            "`1`, `X` ou `2` = simples; `1X`, `X2`, `12` = duplo; `1X2` ou `T` = triplo\n\n"
+            "Ex.: `/desdobramento 1 X2 T 1 2 1X 1 2 X 1 T 2 1 X`",
+            parse_mode="Markdown"
+        )
+        return
+
+    rodada = await rodada_do_comando(update)
+    jogos = await db.obter_jogos(rodada[0]) if rodada else []
+    n = combinacoes(mascaras)
+    duplos, triplos = duplos_triplos(mascaras)
+
+    texto = f"🎯 *DESDOBRAMENTO{' - ' + escape_markdown(rodada[1]) if rodada else ''}*\n\n"
+    for i, m in enumerate(mascaras):
+        confronto = f" {escape_markdown(jogos[i][2])} x {escape_markdown(jogos[i][3])}" if i < len(jogos) else ""
+        texto += f"{i+1}.{confronto}: {' '.join(marcados(m))}\n"
+    texto += (
+        f"\n🔁 Duplos: {duplos} | Triplos: {triplos}\n"
+        f"🎫 Apostas simples: {milhar(n)}\n"
+        f"💰 Custo: {reais(n * PRECO_APOSTA)}\n"
+    )
+
+    # cobertura contra a distribuição dos palpites do grupo (mesmos números do /estatisticas)
+    stats = await db.obter_estatisticas_rodada(rodada[0]) if rodada else None
+    if stats:
+        melhor, esperadas = cobertura(mascaras, stats["estatisticas"])
+        texto += (
+            f"\n📊 *Contra os palpites do grupo* ({stats['total_palpitadores']} palpitadores):\n"
+            f"14 acertos: {melhor[14] * 100:.2f}%\n"
+            f"13 ou mais: {(melhor[13] + melhor[14]) * 100:.2f}%\n"
+            f"Apostas esperadas com 14 / 13: {esperadas[14]:.3f} / {esperadas[13]:.3f}\n"
+        )
+    else:
+        texto += "\n📊 Cobertura aparece quando a rodada tiver palpites.\n"
+
     await update.message.reply_text(texto, parse_mode="Markdown")
 
+    # a lista de apostas só vai em arquivo enquanto for de um tamanho útil
+    if n <= LIMITE_ARQUIVO:
+        loop = asyncio.get_running_loop()
+        arquivo = await loop.run_in_executor(None, escrever_desdobramento, mascaras)
+        await enviar_arquivo(update.message, arquivo, "desdobramento.txt", f"🎫 {milhar(n)} apostas simples")
+
 # ------------------ VER PALPITES ADMIN ------------------
 async def ver_palpites(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if str(update.effective_user.id) != ADMIN_ID:
         await update.message.reply_text("❌ Apenas o admin pode usar.")
         return
 
-    rodada = db.obter_rodada_ativa()
+    rodada = await rodada_do_comando(update)
     if not rodada:
         await update.message.reply_text("❌ Nenhuma rodada ativa.")
         return
 
-    lista = db.obter_palpites_rodada(rodada[0])
-    if not lista:
+    # uma página por vez; ◀/▶ buscam a vizinha pelo id (keyset), sem carregar a rodada toda
+    total = await db.contar_palpites(rodada[0])
+    texto, teclado = await montar_pagina(db, rodada, total)
+    if texto is None:
         await update.message.reply_text("❌ Nenhum palpite enviado.")
         return
 
-    txt = f"📋 *Palpites — {rodada[1]}*\n\n"
-    txt += f"👥 Total: {len(lista)} palpitadores\n\n"
+    await update.message.reply_text(texto, reply_markup=teclado, parse_mode="Markdown")
 
-    for p in lista:
-        arr = json.loads(p[5])
-        username = f"@{p[4]}" if p[4] else "(sem username)"
-        txt += f"👤 {p[3]} ({username})\n"
-        txt += f"📋 {' '.join(arr)}\n"
-        txt += f"⏰ {p[6]}\n"
-        txt += "─" * 30 + "\n"
+async def navegar_palpites(context, query, rodada_id, acao, ref):
+    if str(query.from_user.id) != ADMIN_ID:
+        return
+
+    rodada = await db.obter_rodada(rodada_id)
+    if not rodada:
+        return
 
-    # Divide em partes se for muito longo
-    if len(txt) > 4000:
-        parts = [txt[i:i+4000] for i in range(0, len(txt), 4000)]
-        for part in parts:
-            await update.message.reply_text(part, parse_mode="Markdown")
+    total = await db.contar_palpites(rodada[0])
+    if acao == cb.PAGINA_ANTERIOR:
+        texto, teclado = await montar_pagina(db, rodada, total, antes_id=ref)
     else:
-        await update.message.reply_text(txt, parse_mode="Markdown")
+        texto, teclado = await montar_pagina(db, rodada, total, apos_id=ref)
+    if texto is None:
+        return
+
+    await query.edit_message_text(texto, reply_markup=teclado, parse_mode="Markdown")
+
+# tabela de despacho do handle_callback (ação do callback_codec → handler)
+ACOES_CALLBACK = {
+    cb.NOOP: clique_noop,
+    cb.TIME1: clique_jogo,
+    cb.EMPATE: clique_jogo,
+    cb.TIME2: clique_jogo,
+    cb.ENVIAR: clique_enviar,
+    cb.MEUS_PALPITES: clique_meus_palpites,
+    cb.PAGINA_ANTERIOR: navegar_palpites,
+    cb.PAGINA_PROXIMA: navegar_palpites,
+}
+
+# ------------------ EXPORTAR (ADMIN) ------------------
+async def exportar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != ADMIN_ID:
+        await update.message.reply_text("❌ Apenas o admin pode usar.")
+        return
+
+    # /exportar [csv|json] [#rodada] [jogos]
+    formato, rodada_id, com_jogos = "csv", None, False
+    for arg in context.args:
+        a = arg.lower()
+        if a in FORMATOS:
+            formato = a
+        elif a.startswith("#") and a[1:].isdigit():
+            rodada_id = int(a[1:])
+        elif a == "jogos":
+            com_jogos = True
+
+    rodada = await db.obter_rodada(rodada_id) if rodada_id else await rodada_do_comando(update)
+    if not rodada:
+        await update.message.reply_text("❌ Rodada não encontrada.")
+        return
+
+    arquivo = await db.executar(escrever_exportacao, rodada[0], formato, com_jogos)
+    extensao = "csv" if formato == "csv" else "jsonl"
+    await enviar_arquivo(update.message, arquivo, f"palpites_rodada_{rodada[0]}.{extensao}",
+                         f"📦 Palpites — {rodada[1]}")
+
+# ------------------ CICLO DE VIDA ------------------
+async def post_init(app: Application):
+    agendador.iniciar(app.bot)
+
+    # avisos pendentes continuam de onde pararam
+    transmissoes.iniciar(app.bot)
+
+    # Recupera os rascunhos das rodadas ativas (deploy/crash não apaga nada) e os lembretes
+    ativas = await db.obter_rodadas_ativas()
+    await user_palpites.carregar([rodada[0] for rodada in ativas])
+    for rodada in ativas:
+        agendar_lembrete(app.bot, rodada[0], rodada[1], rodada[5], rodada[4])
+    user_palpites.iniciar()
+    if backup is not None:
+        backup.iniciar()
+
+    if METRICS_PORT:
+        app.bot_data["servidor_metricas"] = await metricas.servir(METRICS_PORT)
+
+async def post_stop(app: Application):
+    servidor = app.bot_data.pop("servidor_metricas", None)
+    if servidor is not None:
+        servidor.close()
+    for tarefa in lembretes.values():
+        tarefa.cancel()
+    lembretes.clear()
+    await transmissoes.parar()
+    await agendador.parar()
+    await submissoes.parar()
+    await user_palpites.parar()
+    # por último: o backup final já leva os rascunhos e envios descarregados acima
+    if backup is not None:
+        await backup.parar()
+
+async def post_shutdown(app: Application):
+    db.fechar()
+
+# ------------------ RESULTADO / APURAÇÃO (ADMIN) ------------------
+RANKING_TOPO = 20
+GANHADORES_LISTADOS = 30
+
+async def resultado(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != ADMIN_ID:
+        await update.message.reply_text("❌ Apenas o admin pode usar.")
+        return
+
+    # /resultado [#rodada] 1 X 2 ... (14 resultados)
+    args = list(context.args)
+    if args and args[0].startswith("#") and args[0][1:].isdigit():
+        rodada = await db.obter_rodada(int(args.pop(0)[1:]))
+    else:
+        rodada = await rodada_do_comando(update)
+    if not rodada:
+        # rodada apurada já está encerrada: a correção vai pelo id
+        await update.message.reply_text("❌ Rodada não encontrada. Para corrigir uma rodada apurada: /resultado #id 1 X 2 ...")
+        return
+
+    simbolos = ler_resultado(" ".join(args))
+    if simbolos is None:
+        await update.message.reply_text(
+            "❌ Envie os 14 resultados oficiais (1, X ou 2).\n\n"
+            "Ex.: /resultado 1 X 2 1 1 X 2 2 1 X 1 2 X 1\n"
+            "Outra rodada: /resultado #123 1 X 2 ..."
+        )
+        return
+
+    lista = await db.obter_palpites_rodada(rodada[0])
+    apur = apurar(lista, codificar(simbolos))
+
+    # pontuações da rodada entram no ranking geral junto com o resultado (corrigir = registrar de novo)
+    pontuacoes = [(p[2], p[3], acertos) for p, acertos in apur["ranking"]]
+    await db.registrar_resultado(rodada[0], simbolos, pontuacoes)
+    # a rodada fecha junto com o resultado (corrigir depois: /resultado #id ...)
+    encerrar_rodada(rodada[0])
+    if not lista:
+        await update.message.reply_text("✅ Resultado registrado. Nenhum palpite enviado nesta rodada.")
+        return
+
+    await update.message.reply_text(formatar_apuracao(rodada, simbolos, apur), parse_mode="Markdown")
+
+def formatar_apuracao(rodada, simbolos, apur):
+    txt = f"🏁 *RESULTADO - {escape_markdown(rodada[1])}*\n"
+    txt += f"`{' '.join(simbolos)}`\n\n"
+
+    for faixa in FAIXAS_PREMIADAS:
+        ganhadores = apur["faixas"][faixa]
+        if ganhadores:
+            nomes = ", ".join(escape_markdown(p[3]) for p in ganhadores[:GANHADORES_LISTADOS])
+            if len(ganhadores) > GANHADORES_LISTADOS:
+                nomes += f" e mais {len(ganhadores) - GANHADORES_LISTADOS}"
+            txt += f"🏆 *{faixa} acertos* ({len(ganhadores)}): {nomes}\n"
+        else:
+            txt += f"🏆 *{faixa} acertos*: ninguém\n"
+
+    txt += f"\n📊 *Ranking* ({len(apur['ranking'])} palpitadores)\n"
+    for pos, (p, acertos) in enumerate(apur["ranking"][:RANKING_TOPO], 1):
+        txt += f"{pos}. {escape_markdown(p[3])} — {acertos}\n"
+    if len(apur["ranking"]) > RANKING_TOPO:
+        txt += f"... e mais {len(apur['ranking']) - RANKING_TOPO}\n"
+
+    return txt
+
+# ------------------ RANKING GERAL ------------------
+async def ranking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # lê só as tabelas agregadas (atualizadas no /resultado), não o histórico de palpites
+    topo = await db.obter_ranking(RANKING_TOPO)
+    if not topo:
+        await update.message.reply_text("🏆 Nenhuma rodada apurada ainda.")
+        return
+
+    apostadores, rodadas = await db.contar_ranking()
+    txt = f"🏆 *RANKING GERAL*\n{apostadores} apostadores, {rodadas} rodadas apuradas\n\n"
+    pos = 0
+    for i, (_, nome, total, jogadas, melhor) in enumerate(topo):
+        # empatados (mesmo total e mesmo melhor) dividem a posição, como em obter_posicao_ranking
+        if i == 0 or (total, melhor) != (topo[i - 1][2], topo[i - 1][4]):
+            pos = i + 1
+        txt += f"{pos}. {escape_markdown(nome)} — {total} acertos em {jogadas} rodadas (melhor: {melhor})\n"
+
+    minha = await db.obter_posicao_ranking(update.effective_user.id)
+    if minha and minha[1] not in {linha[0] for linha in topo}:
+        txt += f"\n📍 Você: {minha[0]}º — {minha[3]} acertos em {minha[4]} rodadas (melhor: {minha[5]})\n"
+
+    await update.message.reply_text(txt, parse_mode="Markdown")
+
+# ------------------ MÉTRICAS (ADMIN) ------------------
+async def metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != ADMIN_ID:
+        await update.message.reply_text("❌ Apenas o admin pode usar.")
+        return
+
+    await update.message.reply_text(metricas.resumo())
 
 # ------------------ MAIN ------------------
-def main():
-    app = Application.builder().token(BOT_TOKEN).build()
+def montar_aplicacao(builder=None, request=None) -> Application:
+    # builder/request prontos permitem trocar a camada HTTP (ex.: bench_loteca.py usa um Bot falso)
+    if builder is None:
+        builder = Application.builder().token(BOT_TOKEN)
+    if request is None:
+        request = HTTPXRequest(connection_pool_size=256)
+
+    app = (
+        builder
+        # toda chamada passa pela fila de saída (prioridade, limites, retry); as métricas contam as reais
+        .request(RequisicaoPriorizada(
+            metricas.requisicao(request), SAIDA_POR_SEGUNDO,
+            EDICOES_POR_MINUTO, EDICOES_POR_MINUTO_PRIVADO,
+        ))
+        # updates em paralelo entre usuários, em ordem para o mesmo usuário
+        .concurrent_updates(ProcessadorPorUsuario(256))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("nova_rodada", nova_rodada))
     app.add_handler(CommandHandler("estatisticas", estatisticas))
     app.add_handler(CommandHandler("ver_palpites", ver_palpites))
     app.add_handler(CommandHandler("meus_palpites", meus_palpites))
+    app.add_handler(CommandHandler("desdobramento", desdobramento))
+    app.add_handler(CommandHandler("resultado", resultado))
+    app.add_handler(CommandHandler("ranking", ranking))
+    app.add_handler(CommandHandler("exportar", exportar))
+    app.add_handler(CommandHandler("importar", importar))
+    app.add_handler(CommandHandler("abrir_rodada", abrir_rodada))
+    app.add_handler(MessageHandler(filters.Document.ALL, receber_importacao))
 
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, processar_mensagens_rodada))
+    app.add_handler(CommandHandler("metrics", metrics))
     app.add_handler(CallbackQueryHandler(handle_callback))
 
+    # latência e falhas de todos os handlers registrados acima
+    metricas.instrumentar_aplicacao(app)
+
+    return app
+
+def webhook_disponivel() -> bool:
+    if not WEBHOOK_URL:
+        return False
+    if importlib.util.find_spec("tornado") is None:  # extra python-telegram-bot[webhooks]
+        logger.error("WEBHOOK_URL definido, mas o extra [webhooks] não está instalado; usando polling")
+        return False
+    return True
+
+def main():
+    app = montar_aplicacao()
+
+    if webhook_disponivel():
+        # Telegram manda cada update direto para cá; o segredo barra POSTs de terceiros
+        segredo = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        print(f"🤖 Bot v5 iniciado (webhook em :{WEBHOOK_PORT}/{WEBHOOK_PATH})!")
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=segredo,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+        )
+        return
+
+    # run_polling apaga um webhook antigo antes de começar, então voltar é só tirar WEBHOOK_URL
     print("🤖 Bot v5 iniciado!")
     app.run_polling()
 
 if __name__ == "__main__":
     main()
-
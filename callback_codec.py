@@ -0,0 +1,52 @@
+# callback_codec.py
+# callback_data dos botões: (versão, rodada_id, ação, argumento) empacotados em
+# 10 bytes e base64 url-safe (14 caracteres, bem abaixo do limite de 64 bytes).
+# A rodada vai no próprio botão: o clique não depende de estado do usuário nem do banco.
+
+import base64
+import binascii
+import struct
+from typing import Optional, Tuple
+
+VERSAO = 1
+_FORMATO = struct.Struct(">BIBI")  # versão u8, rodada u32, ação u8, argumento u32
+
+# ações
+NOOP = 0
+TIME1 = 1
+EMPATE = 2
+TIME2 = 3
+ENVIAR = 4
+MEUS_PALPITES = 5
+PAGINA_ANTERIOR = 6
+PAGINA_PROXIMA = 7
+
+# botões do formato antigo ("t1_3", "enviar", ...) em planilhas postadas antes do codec
+_LEGADO = {"t1": TIME1, "x": EMPATE, "t2": TIME2, "noop": NOOP}
+
+def codificar(rodada_id: int, acao: int, arg: int = 0) -> str:
+    bruto = _FORMATO.pack(VERSAO, rodada_id, acao, arg)
+    return base64.urlsafe_b64encode(bruto).rstrip(b"=").decode("ascii")
+
+def decodificar(data: str) -> Optional[Tuple[int, int, int]]:
+    """(rodada_id, ação, argumento), ou None se não é um callback desta versão."""
+    if len(data) != 14:
+        return None
+    try:
+        versao, rodada_id, acao, arg = _FORMATO.unpack(base64.urlsafe_b64decode(data + "=="))
+    except (binascii.Error, struct.error, ValueError):
+        return None
+    if versao != VERSAO:
+        return None
+    return rodada_id, acao, arg
+
+def decodificar_legado(data: str) -> Optional[Tuple[int, int]]:
+    """(ação, argumento) dos botões antigos; a rodada vem do registro da mensagem."""
+    if data == "enviar":
+        return ENVIAR, 0
+    if data == "meus_palpites":
+        return MEUS_PALPITES, 0
+    tipo, _, idx = data.partition("_")
+    if tipo in _LEGADO and idx.isdigit():
+        return _LEGADO[tipo], int(idx)
+    return None
@@ -8,3 +8,27 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = os.getenv("ADMIN_ID")  # keep as string
 GRUPO_ID = os.getenv("GRUPO_ID")
 DB_PATH = os.getenv("DB_PATH", "/tmp/palpites.db")
+# cópia durável do banco (vazio = sem backup); restaurada na subida se DB_PATH sumir
+BACKUP_PATH = os.getenv("BACKUP_PATH", "")
+BACKUP_INTERVALO = float(os.getenv("BACKUP_INTERVALO", "600"))  # segundos
+EDICOES_POR_MINUTO = float(os.getenv("EDICOES_POR_MINUTO", "20"))
+EDICOES_POR_MINUTO_PRIVADO = float(os.getenv("EDICOES_POR_MINUTO_PRIVADO", "60"))
+SAIDA_POR_SEGUNDO = float(os.getenv("SAIDA_POR_SEGUNDO", "30"))  # todas as chamadas com chat (saida.py)
+# "grupo": todos clicam na planilha do grupo; "privado": o grupo mostra um resumo com
+# link e cada usuário preenche a própria planilha no privado (edições espalhadas por chat)
+MODO_PLANILHA = os.getenv("MODO_PLANILHA", "grupo").lower()
+# rascunho parado sai da memória (fica no banco); 0 em RASCUNHOS_MAXIMO = sem limite de quantidade
+RASCUNHO_TTL = float(os.getenv("RASCUNHO_TTL", "3600"))  # segundos
+RASCUNHOS_MAXIMO = int(os.getenv("RASCUNHOS_MAXIMO", "0"))
+# avisos por DM a quem já palpitou (rodada aberta / fechando)
+TRANSMISSAO_POR_SEGUNDO = float(os.getenv("TRANSMISSAO_POR_SEGUNDO", "25"))  # limite global do Telegram ~30/s
+PRECO_APOSTA = float(os.getenv("PRECO_APOSTA", "3.00"))  # aposta simples, para o /desdobramento
+LEMBRETE_MINUTOS = float(os.getenv("LEMBRETE_MINUTOS", "60"))  # antes do fecha_em
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sem endpoint Prometheus
+# webhook: com WEBHOOK_URL (URL pública, ex. https://bot.exemplo.com) o bot sobe um
+# listener HTTP local no lugar do run_polling; sem ela, continua em polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "loteca")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
@@ -1,8 +1,17 @@
 # database.py
 import sqlite3
 import json
+import threading
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Sequence
+
+from palpites_codec import codificar, votos, N_JOGOS
+from apuracao import pontuar
+
+def escrita(metodo):
+    # marca métodos que usam a conexão de escrita (DatabaseAsync manda para a thread de escrita)
+    metodo.escrita = True
+    return metodo
 
 class Database:
     def __init__(self, path: str = None):
@@ -11,8 +20,22 @@ class Database:
             self.db_path = path
         else:
             self.db_path = "/tmp/palpites.db"
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # uma conexão de escrita; leituras usam uma conexão por thread (WAL permite ler durante a escrita)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self._local = threading.local()
         self.create_tables()
+        self.migrar_palpites_empacotados()
+        self.reconstruir_contagens(apenas_faltando=True)
+        self.reconstruir_ranking(apenas_faltando=True)
+
+    def _leitura(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA query_only = ON')
+        return conn
 
     def create_tables(self):
         cur = self.conn.cursor()
@@ -47,66 +70,598 @@ class Database:
                 UNIQUE(rodada_id, user_id)
             )
         ''')
+        # contadores mantidos por salvar_palpite (estatísticas em O(14))
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS contagem_votos (
+                rodada_id INTEGER NOT NULL,
+                jogo INTEGER NOT NULL,
+                votos_1 INTEGER NOT NULL DEFAULT 0,
+                votos_x INTEGER NOT NULL DEFAULT 0,
+                votos_2 INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (rodada_id, jogo)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS contagem_rodada (
+                rodada_id INTEGER PRIMARY KEY,
+                total_palpitadores INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # rascunhos persistidos pelo RascunhoStore (write-behind)
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS rascunhos (
+                rodada_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                palpites_bin INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (rodada_id, user_id)
+            )
+        ''')
+        # resultado oficial da rodada (empacotado como os palpites)
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS resultados (
+                rodada_id INTEGER PRIMARY KEY,
+                resultado_bin INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (rodada_id) REFERENCES rodadas(id)
+            )
+        ''')
+        # acertos de cada apostador por rodada apurada e o acumulado por usuário (/ranking);
+        # mantidos por registrar_resultado, sem reler o histórico de palpites
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS pontuacoes (
+                rodada_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                acertos INTEGER NOT NULL,
+                PRIMARY KEY (rodada_id, user_id)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS ranking_usuarios (
+                user_id INTEGER PRIMARY KEY,
+                user_name TEXT NOT NULL,
+                total_acertos INTEGER NOT NULL DEFAULT 0,
+                rodadas INTEGER NOT NULL DEFAULT 0,
+                melhor INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_pontuacoes_user ON pontuacoes(user_id, acertos)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_ranking_total ON ranking_usuarios(total_acertos DESC, melhor DESC, user_id)')
+        # quantos apostadores há em cada placar (total, melhor): a posição de um usuário soma os
+        # placares à frente, sem contar usuários. Os gatilhos mantêm a tabela junto com ranking_usuarios
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS ranking_placar (
+                total_acertos INTEGER NOT NULL,
+                melhor INTEGER NOT NULL,
+                usuarios INTEGER NOT NULL,
+                PRIMARY KEY (total_acertos, melhor)
+            )
+        ''')
+        cur.execute('SELECT 1 FROM ranking_placar LIMIT 1')
+        if cur.fetchone() is None:
+            cur.execute('''
+                INSERT INTO ranking_placar (total_acertos, melhor, usuarios)
+                SELECT total_acertos, melhor, COUNT(*) FROM ranking_usuarios GROUP BY total_acertos, melhor
+            ''')
+        entra = '''
+            INSERT INTO ranking_placar (total_acertos, melhor, usuarios) VALUES (new.total_acertos, new.melhor, 1)
+            ON CONFLICT(total_acertos, melhor) DO UPDATE SET usuarios = usuarios + 1;'''
+        sai = '''
+            UPDATE ranking_placar SET usuarios = usuarios - 1 WHERE total_acertos = old.total_acertos AND melhor = old.melhor;
+            DELETE FROM ranking_placar WHERE total_acertos = old.total_acertos AND melhor = old.melhor AND usuarios <= 0;'''
+        cur.execute(f'CREATE TRIGGER IF NOT EXISTS ranking_placar_insert AFTER INSERT ON ranking_usuarios BEGIN {entra} END')
+        cur.execute(f'CREATE TRIGGER IF NOT EXISTS ranking_placar_delete AFTER DELETE ON ranking_usuarios BEGIN {sai} END')
+        cur.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS ranking_placar_update AFTER UPDATE OF total_acertos, melhor ON ranking_usuarios
+            WHEN old.total_acertos != new.total_acertos OR old.melhor != new.melhor BEGIN {sai} {entra} END
+        ''')
+        # avisos por DM (FilaTransmissao): a fila sobrevive a reinícios; a chave evita repetir o mesmo aviso
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS transmissoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chave TEXT UNIQUE,
+                texto TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS transmissao_envios (
+                transmissao_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (transmissao_id, user_id)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS usuarios_bloqueados (
+                user_id INTEGER PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # mensagens de planilha de cada chat (RegistroChats): clique → rodada por (chat, mensagem)
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS planilhas_chat (
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                rodada_id INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (chat_id, message_id),
+                FOREIGN KEY (rodada_id) REFERENCES rodadas(id)
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_palpites_rodada_created ON palpites(rodada_id, created_at)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_palpites_rodada_id ON palpites(rodada_id, id)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_jogos_rodada ON jogos(rodada_id, id)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_rodadas_ativa ON rodadas(ativa)')
+        # palpites empacotados (2 bits por jogo, ver palpites_codec)
+        cur.execute('PRAGMA table_info(palpites)')
+        if "palpites_bin" not in [c[1] for c in cur.fetchall()]:
+            cur.execute('ALTER TABLE palpites ADD COLUMN palpites_bin INTEGER')
+        # chat dono da rodada (rodadas antigas ficam com NULL = chat único de antes)
+        cur.execute('PRAGMA table_info(rodadas)')
+        if "chat_id" not in [c[1] for c in cur.fetchall()]:
+            cur.execute('ALTER TABLE rodadas ADD COLUMN chat_id INTEGER')
+        # horário de fechamento opcional (rodadas importadas por /importar)
+        cur.execute('PRAGMA table_info(rodadas)')
+        if "fecha_em" not in [c[1] for c in cur.fetchall()]:
+            cur.execute('ALTER TABLE rodadas ADD COLUMN fecha_em TIMESTAMP')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_rodadas_chat_ativa ON rodadas(chat_id, ativa)')
         self.conn.commit()
 
-    # criar nova rodada (desativa outras)
-    def criar_nova_rodada(self, nome: str = "Rodada Atual") -> int:
+    @escrita
+    def migrar_palpites_empacotados(self, lote: int = 500) -> int:
+        # converte as linhas antigas (JSON) em lotes curtos, uma transação por lote
+        migradas = 0
         cur = self.conn.cursor()
-        cur.execute('UPDATE rodadas SET ativa = 0')
-        cur.execute('INSERT INTO rodadas (nome, ativa) VALUES (?, ?)', (nome, 1))
+        while True:
+            cur.execute('SELECT id, palpites FROM palpites WHERE palpites_bin IS NULL LIMIT ?', (lote,))
+            linhas = cur.fetchall()
+            if not linhas:
+                return migradas
+            convertidas = []
+            for pid, texto in linhas:
+                try:
+                    convertidas.append((codificar(json.loads(texto)), "", pid))
+                except (ValueError, TypeError):
+                    # texto ilegível fica como está, marcado como vazio
+                    convertidas.append((0, texto, pid))
+            with self.conn:
+                self.conn.executemany('UPDATE palpites SET palpites_bin = ?, palpites = ? WHERE id = ?', convertidas)
+            migradas += len(convertidas)
+
+    def _encerrar_rodadas(self, cur, onde: str, params: tuple):
+        # rodadas encerradas não têm mais rascunho: a limpeza sai aqui, uma vez, e não a cada flush
+        cur.execute(f'DELETE FROM rascunhos WHERE rodada_id IN (SELECT id FROM rodadas WHERE ativa = 1 AND {onde})', params)
+        cur.execute(f'UPDATE rodadas SET ativa = 0 WHERE ativa = 1 AND {onde}', params)
+
+    # criar nova rodada (desativa as outras do mesmo chat)
+    @escrita
+    def criar_nova_rodada(self, nome: str = "Rodada Atual", chat_id: Optional[int] = None) -> int:
+        cur = self.conn.cursor()
+        self._encerrar_rodadas(cur, '(chat_id = ? OR chat_id IS NULL)', (chat_id,))
+        cur.execute('INSERT INTO rodadas (nome, ativa, chat_id) VALUES (?, ?, ?)', (nome, 1, chat_id))
         self.conn.commit()
         return cur.lastrowid
 
-    def obter_rodada_ativa(self) -> Optional[Tuple]:
-        cur = self.conn.cursor()
-        cur.execute('SELECT id, nome, ativa, created_at FROM rodadas WHERE ativa = 1 ORDER BY id DESC LIMIT 1')
+    def obter_rodada_ativa(self, chat_id: Optional[int] = None) -> Optional[Tuple]:
+        # sem chat: a rodada ativa mais recente de qualquer chat (comandos no privado)
+        cur = self._leitura().cursor()
+        if chat_id is None:
+            cur.execute('SELECT id, nome, ativa, created_at FROM rodadas WHERE ativa = 1 ORDER BY id DESC LIMIT 1')
+        else:
+            cur.execute('''
+                SELECT id, nome, ativa, created_at FROM rodadas
+                WHERE ativa = 1 AND (chat_id = ? OR chat_id IS NULL)
+                ORDER BY chat_id IS NULL, id DESC LIMIT 1
+            ''', (chat_id,))
         return cur.fetchone()
 
+    def obter_rodadas_ativas(self) -> List[Tuple]:
+        cur = self._leitura().cursor()
+        cur.execute('SELECT id, nome, ativa, created_at, fecha_em, chat_id FROM rodadas WHERE ativa = 1 ORDER BY id')
+        return cur.fetchall()
+
+    @escrita
+    def registrar_planilha(self, chat_id: int, message_id: int, rodada_id: int):
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO planilhas_chat (chat_id, message_id, rodada_id) VALUES (?, ?, ?)
+                ON CONFLICT(chat_id, message_id) DO UPDATE SET rodada_id = excluded.rodada_id
+            ''', (chat_id, message_id, rodada_id))
+
+    def obter_planilha_principal(self, rodada_id: int) -> Optional[Tuple[int, int]]:
+        # a mensagem postada no próprio chat da rodada (as demais são planilhas no privado)
+        cur = self._leitura().cursor()
+        cur.execute('''
+            SELECT p.chat_id, p.message_id FROM planilhas_chat p
+            JOIN rodadas r ON r.id = p.rodada_id AND p.chat_id = r.chat_id
+            WHERE p.rodada_id = ? ORDER BY p.created_at DESC, p.message_id DESC LIMIT 1
+        ''', (rodada_id,))
+        return cur.fetchone()
+
+    def obter_rodada_da_mensagem(self, chat_id: int, message_id: int) -> Optional[int]:
+        cur = self._leitura().cursor()
+        cur.execute('SELECT rodada_id FROM planilhas_chat WHERE chat_id = ? AND message_id = ?', (chat_id, message_id))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def obter_rodada(self, rodada_id: int) -> Optional[Tuple]:
+        cur = self._leitura().cursor()
+        cur.execute('SELECT id, nome, ativa, created_at, fecha_em FROM rodadas WHERE id = ?', (rodada_id,))
+        return cur.fetchone()
+
+    @escrita
+    def ativar_rodada(self, rodada_id: int, chat_id: int) -> bool:
+        # rodada importada vai para o chat: as outras ativas do chat são encerradas
+        with self.conn:
+            cur = self.conn.execute('SELECT 1 FROM rodadas WHERE id = ?', (rodada_id,))
+            if cur.fetchone() is None:
+                return False
+            self._encerrar_rodadas(self.conn.cursor(), 'id != ? AND (chat_id = ? OR chat_id IS NULL)', (rodada_id, chat_id))
+            self.conn.execute('UPDATE rodadas SET ativa = 1, chat_id = ? WHERE id = ?', (chat_id, rodada_id))
+        return True
+
+    @escrita
+    def importar_rodadas(self, rodadas: List[Tuple[str, List[Tuple[str, str]], Optional[str]]]) -> List[int]:
+        # tudo numa transação: ou entram todas as rodadas, ou nenhuma. Ficam inativas até /abrir_rodada
+        ids = []
+        with self.conn:
+            for nome, _, fecha_em in rodadas:
+                cur = self.conn.execute('INSERT INTO rodadas (nome, ativa, fecha_em) VALUES (?, 0, ?)', (nome, fecha_em))
+                ids.append(cur.lastrowid)
+            self.conn.executemany(
+                'INSERT INTO jogos (rodada_id, time1, time2) VALUES (?, ?, ?)',
+                [(rodada_id, t1, t2) for rodada_id, (_, jogos, _) in zip(ids, rodadas) for t1, t2 in jogos]
+            )
+        return ids
+
+    @escrita
     def inserir_jogos(self, jogos: List[Tuple[str, str]], rodada_id: int):
-        cur = self.conn.cursor()
-        # remove jogos existentes para a rodada
-        cur.execute('DELETE FROM jogos WHERE rodada_id = ?', (rodada_id,))
-        for t1, t2 in jogos:
-            cur.execute('INSERT INTO jogos (rodada_id, time1, time2) VALUES (?, ?, ?)', (rodada_id, t1, t2))
-        self.conn.commit()
+        with self.conn:
+            # remove jogos existentes para a rodada
+            self.conn.execute('DELETE FROM jogos WHERE rodada_id = ?', (rodada_id,))
+            self.conn.executemany('INSERT INTO jogos (rodada_id, time1, time2) VALUES (?, ?, ?)',
+                                  [(rodada_id, t1, t2) for t1, t2 in jogos])
 
     def obter_jogos(self, rodada_id: int):
-        cur = self.conn.cursor()
+        cur = self._leitura().cursor()
         cur.execute('SELECT id, rodada_id, time1, time2 FROM jogos WHERE rodada_id = ? ORDER BY id', (rodada_id,))
         return cur.fetchall()
 
     def usuario_ja_enviou_rodada(self, user_id: int, rodada_id: int) -> bool:
-        cur = self.conn.cursor()
+        cur = self._leitura().cursor()
         cur.execute('SELECT id FROM palpites WHERE rodada_id = ? AND user_id = ?', (rodada_id, user_id))
         return cur.fetchone() is not None
 
-    def salvar_palpite(self, rodada_id: int, user_id: int, user_name: str, user_phone: str, palpites):
-        cur = self.conn.cursor()
-        cur.execute('INSERT OR REPLACE INTO palpites (rodada_id, user_id, user_name, user_phone, palpites) VALUES (?, ?, ?, ?, ?)',
-                    (rodada_id, user_id, user_name, user_phone, json.dumps(palpites)))
-        self.conn.commit()
-        return True
+    @staticmethod
+    def _deltas_votos(rodada_id: int, bits: int, sinal: int):
+        m1, mx, m2 = votos(bits, 1), votos(bits, 2), votos(bits, 3)
+        deltas = []
+        for i in range(N_JOGOS):
+            b = 1 << (2 * i)
+            d1 = sinal if m1 & b else 0
+            dx = sinal if mx & b else 0
+            d2 = sinal if m2 & b else 0
+            deltas.append((rodada_id, i, d1, dx, d2, d1, dx, d2))
+        return deltas
+
+    def _aplicar_votos(self, cur, rodada_id: int, bits: int, sinal: int = 1):
+        cur.executemany('''
+            INSERT INTO contagem_votos (rodada_id, jogo, votos_1, votos_x, votos_2) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(rodada_id, jogo) DO UPDATE SET
+                votos_1 = votos_1 + ?, votos_x = votos_x + ?, votos_2 = votos_2 + ?
+        ''', self._deltas_votos(rodada_id, bits, sinal))
+        cur.execute('''
+            INSERT INTO contagem_rodada (rodada_id, total_palpitadores) VALUES (?, ?)
+            ON CONFLICT(rodada_id) DO UPDATE SET total_palpitadores = total_palpitadores + ?
+        ''', (rodada_id, sinal, sinal))
+
+    @escrita
+    def salvar_palpite(self, rodada_id: int, user_id: int, user_name: str, user_phone: str, palpites) -> bool:
+        # insere só se ainda não existir; False = já tinha enviado nesta rodada
+        return self.salvar_palpites_lote([(rodada_id, user_id, user_name, user_phone, palpites)])[0]
+
+    @escrita
+    def salvar_palpites_lote(self, itens: List[Tuple]) -> List[Optional[bool]]:
+        # vários envios numa transação só (um commit); resultado por item, na mesma ordem
+        # (None = a rodada já tem resultado: envio atrasado não entra depois da apuração)
+        resultados = []
+        apuradas = {}
+        with self.conn:
+            cur = self.conn.cursor()
+            for rodada_id, user_id, user_name, user_phone, palpites in itens:
+                if rodada_id not in apuradas:
+                    cur.execute('SELECT 1 FROM resultados WHERE rodada_id = ?', (rodada_id,))
+                    apuradas[rodada_id] = cur.fetchone() is not None
+                if apuradas[rodada_id]:
+                    resultados.append(None)
+                    continue
+                bits = codificar(palpites)
+                cur.execute('''
+                    INSERT INTO palpites (rodada_id, user_id, user_name, user_phone, palpites, palpites_bin)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(rodada_id, user_id) DO NOTHING
+                ''', (rodada_id, user_id, user_name, user_phone, "", bits))
+                inserido = cur.rowcount == 1
+                if inserido:
+                    # contadores na mesma transação
+                    self._aplicar_votos(cur, rodada_id, bits)
+                resultados.append(inserido)
+        return resultados
+
+    def obter_palpite_usuario(self, rodada_id: int, user_id: int) -> Optional[Tuple]:
+        # mesmas colunas de obter_palpites_rodada, via índice UNIQUE(rodada_id, user_id)
+        cur = self._leitura().cursor()
+        cur.execute('SELECT id, rodada_id, user_id, user_name, user_phone, palpites_bin, created_at FROM palpites WHERE rodada_id = ? AND user_id = ?', (rodada_id, user_id))
+        return cur.fetchone()
 
     def obter_palpites_rodada(self, rodada_id: int):
+        cur = self._leitura().cursor()
+        # palpites vem empacotado na coluna 5 (use palpites_codec.decodificar)
+        cur.execute('SELECT id, rodada_id, user_id, user_name, user_phone, palpites_bin, created_at FROM palpites WHERE rodada_id = ? ORDER BY created_at', (rodada_id,))
+        return cur.fetchall()
+
+    @escrita
+    def registrar_resultado(self, rodada_id: int, resultado, pontuacoes: Sequence[Tuple[int, str, int]] = ()) -> int:
+        # resultado e pontuações (user_id, user_name, acertos) da rodada na mesma transação,
+        # que também encerra a rodada: depois do resultado não entra mais palpite
+        bits = codificar(resultado)
+        with self.conn:
+            self._encerrar_rodadas(self.conn.cursor(), 'id = ?', (rodada_id,))
+            self.conn.execute('''
+                INSERT INTO resultados (rodada_id, resultado_bin) VALUES (?, ?)
+                ON CONFLICT(rodada_id) DO UPDATE SET resultado_bin = excluded.resultado_bin, created_at = CURRENT_TIMESTAMP
+            ''', (rodada_id, bits))
+            self._aplicar_pontuacoes(rodada_id, pontuacoes)
+        return bits
+
+    def _aplicar_pontuacoes(self, rodada_id: int, pontuacoes: Sequence[Tuple[int, str, int]]):
+        # resultado registrado de novo (correção): tira a contribuição anterior antes de somar a nova
+        cur = self.conn.execute('SELECT user_id, acertos FROM pontuacoes WHERE rodada_id = ?', (rodada_id,))
+        anteriores = cur.fetchall()
+        self.conn.executemany(
+            'UPDATE ranking_usuarios SET total_acertos = total_acertos - ?, rodadas = rodadas - 1 WHERE user_id = ?',
+            [(acertos, user_id) for user_id, acertos in anteriores]
+        )
+        self.conn.execute('DELETE FROM pontuacoes WHERE rodada_id = ?', (rodada_id,))
+
+        self.conn.executemany('INSERT INTO pontuacoes (rodada_id, user_id, acertos) VALUES (?, ?, ?)',
+                              [(rodada_id, user_id, acertos) for user_id, _, acertos in pontuacoes])
+        self.conn.executemany('''
+            INSERT INTO ranking_usuarios (user_id, user_name, total_acertos, rodadas, melhor) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                user_name = excluded.user_name,
+                total_acertos = total_acertos + excluded.total_acertos,
+                rodadas = rodadas + 1,
+                melhor = MAX(melhor, excluded.melhor)
+        ''', [(user_id, nome, acertos, acertos) for user_id, nome, acertos in pontuacoes])
+
+        if anteriores:
+            # o melhor não dá para "desfazer": relê de pontuacoes só para quem foi afetado
+            self.conn.executemany('''
+                UPDATE ranking_usuarios SET melhor = COALESCE(
+                    (SELECT MAX(acertos) FROM pontuacoes WHERE user_id = ranking_usuarios.user_id), 0)
+                WHERE user_id = ?
+            ''', [(user_id,) for user_id, _ in anteriores])
+            self.conn.execute('DELETE FROM ranking_usuarios WHERE rodadas <= 0')
+
+    @escrita
+    def reconstruir_ranking(self, apenas_faltando: bool = False):
+        # pontua rodadas com resultado e sem pontuações (bancos de antes do /ranking)
         cur = self.conn.cursor()
-        cur.execute('SELECT * FROM palpites WHERE rodada_id = ? ORDER BY created_at', (rodada_id,))
+        if apenas_faltando:
+            cur.execute('''
+                SELECT r.rodada_id, r.resultado_bin FROM resultados r
+                WHERE NOT EXISTS (SELECT 1 FROM pontuacoes p WHERE p.rodada_id = r.rodada_id)
+                ORDER BY r.rodada_id
+            ''')
+        else:
+            cur.execute('SELECT rodada_id, resultado_bin FROM resultados ORDER BY rodada_id')
+        for rodada_id, bits in cur.fetchall():
+            linhas = self.conn.execute(
+                'SELECT user_id, user_name, palpites_bin FROM palpites WHERE rodada_id = ?', (rodada_id,)
+            ).fetchall()
+            acertos = pontuar([p[2] or 0 for p in linhas], bits)
+            with self.conn:
+                self._aplicar_pontuacoes(rodada_id, [(p[0], p[1], a) for p, a in zip(linhas, acertos)])
+
+    @escrita
+    def enfileirar_transmissao(self, chave: str, texto: str, chat_id: Optional[int] = None,
+                               exceto_rodada: Optional[int] = None) -> int:
+        # destinatários: quem já palpitou em rodadas do chat, menos bloqueados (e quem já enviou `exceto_rodada`)
+        with self.conn:
+            cur = self.conn.execute('INSERT OR IGNORE INTO transmissoes (chave, texto) VALUES (?, ?)', (chave, texto))
+            if cur.rowcount == 0:
+                return 0
+            transmissao_id = cur.lastrowid
+            cur = self.conn.execute('''
+                INSERT OR IGNORE INTO transmissao_envios (transmissao_id, user_id)
+                SELECT DISTINCT ?, p.user_id FROM palpites p JOIN rodadas r ON r.id = p.rodada_id
+                WHERE (? IS NULL OR r.chat_id = ? OR r.chat_id IS NULL)
+                  AND p.user_id NOT IN (SELECT user_id FROM usuarios_bloqueados)
+                  AND p.user_id NOT IN (SELECT user_id FROM palpites WHERE rodada_id = ?)
+            ''', (transmissao_id, chat_id, chat_id, exceto_rodada if exceto_rodada is not None else -1))
+            return cur.rowcount
+
+    @escrita
+    def desbloquear_usuario(self, user_id: int):
+        with self.conn:
+            self.conn.execute('DELETE FROM usuarios_bloqueados WHERE user_id = ?', (user_id,))
+
+    def obter_envios_pendentes(self, limite: int = 200) -> List[Tuple[int, int, str]]:
+        cur = self._leitura().cursor()
+        cur.execute('''
+            SELECT e.transmissao_id, e.user_id, t.texto FROM transmissao_envios e
+            JOIN transmissoes t ON t.id = e.transmissao_id
+            ORDER BY e.transmissao_id, e.user_id LIMIT ?
+        ''', (limite,))
         return cur.fetchall()
 
-    def obter_estatisticas_rodada(self, rodada_id: int):
-        palpites = self.obter_palpites_rodada(rodada_id)
-        jogos = self.obter_jogos(rodada_id)
-        if not palpites:
+    @escrita
+    def concluir_envios(self, itens: List[Tuple[int, int]], bloqueados: List[int] = ()):
+        # enviados (ou desistidos) saem da fila; quem bloqueou o bot não recebe mais nada
+        with self.conn:
+            self.conn.executemany('DELETE FROM transmissao_envios WHERE transmissao_id = ? AND user_id = ?', itens)
+            self.conn.executemany('INSERT OR IGNORE INTO usuarios_bloqueados (user_id) VALUES (?)',
+                                  [(u,) for u in bloqueados])
+            self.conn.executemany('DELETE FROM transmissao_envios WHERE user_id = ?', [(u,) for u in bloqueados])
+
+    def obter_ranking(self, limite: int = 20) -> List[Tuple]:
+        cur = self._leitura().cursor()
+        cur.execute('''
+            SELECT user_id, user_name, total_acertos, rodadas, melhor FROM ranking_usuarios
+            ORDER BY total_acertos DESC, melhor DESC, user_id LIMIT ?
+        ''', (limite,))
+        return cur.fetchall()
+
+    def obter_posicao_ranking(self, user_id: int) -> Optional[Tuple]:
+        # (posição, user_id, user_name, total_acertos, rodadas, melhor); empatados dividem a posição.
+        # Soma os placares à frente em ranking_placar: custa o número de placares distintos
+        # (no máximo 15 por total de acertos), não o número de apostadores
+        cur = self._leitura().cursor()
+        cur.execute('SELECT user_id, user_name, total_acertos, rodadas, melhor FROM ranking_usuarios WHERE user_id = ?', (user_id,))
+        linha = cur.fetchone()
+        if linha is None:
             return None
-        estatisticas = [{"1":0,"X":0,"2":0} for _ in range(len(jogos))]
-        for p in palpites:
-            try:
-                arr = json.loads(p[5])
-            except:
-                arr = []
-            for i, choice in enumerate(arr):
-                if choice in estatisticas[i]:
-                    estatisticas[i][choice] += 1
-        return {"total_palpitadores": len(palpites), "estatisticas": estatisticas, "jogos": jogos}
+        cur.execute('''
+            SELECT (SELECT COALESCE(SUM(usuarios), 0) FROM ranking_placar WHERE total_acertos > ?)
+                 + (SELECT COALESCE(SUM(usuarios), 0) FROM ranking_placar WHERE total_acertos = ? AND melhor > ?)
+        ''', (linha[2], linha[2], linha[4]))
+        return (cur.fetchone()[0] + 1,) + tuple(linha)
+
+    def contar_ranking(self) -> Tuple[int, int]:
+        # (apostadores no ranking, rodadas apuradas)
+        cur = self._leitura().cursor()
+        cur.execute('SELECT (SELECT COUNT(*) FROM ranking_usuarios), (SELECT COUNT(*) FROM resultados)')
+        return cur.fetchone()
+
+    def obter_resultado(self, rodada_id: int) -> Optional[int]:
+        cur = self._leitura().cursor()
+        cur.execute('SELECT resultado_bin FROM resultados WHERE rodada_id = ?', (rodada_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    @escrita
+    def salvar_rascunhos(self, rodada_id: int, itens: List[Tuple[int, int]], removidos: List[int]):
+        # um lote do RascunhoStore (upserts e remoções) numa transação
+        with self.conn:
+            ativa = self.conn.execute('SELECT ativa FROM rodadas WHERE id = ?', (rodada_id,)).fetchone()
+            if not ativa or not ativa[0]:
+                # lote atrasado de uma rodada já encerrada: não volta a gravar o que a limpeza apagou
+                return
+            self.conn.executemany('''
+                INSERT INTO rascunhos (rodada_id, user_id, palpites_bin) VALUES (?, ?, ?)
+                ON CONFLICT(rodada_id, user_id) DO UPDATE SET
+                    palpites_bin = excluded.palpites_bin, updated_at = CURRENT_TIMESTAMP
+            ''', [(rodada_id, u, bits) for u, bits in itens])
+            self.conn.executemany('DELETE FROM rascunhos WHERE rodada_id = ? AND user_id = ?',
+                                  [(rodada_id, u) for u in removidos])
 
+    def obter_rascunhos(self, rodadas: Sequence[int], limite: int = 0,
+                        idade_maxima: Optional[float] = None) -> List[Tuple[int, int, int, float]]:
+        # (rodada_id, user_id, palpites_bin, idade em segundos), os mais recentes primeiro;
+        # com LIMIT o SQLite ordena guardando só `limite` linhas
+        marcas = ','.join('?' * len(rodadas))
+        cur = self._leitura().cursor()
+        cur.execute(f'''
+            SELECT rodada_id, user_id, palpites_bin, idade FROM (
+                SELECT rodada_id, user_id, palpites_bin, updated_at,
+                       (julianday('now') - julianday(updated_at)) * 86400 AS idade
+                FROM rascunhos WHERE rodada_id IN ({marcas})
+            ) WHERE ? IS NULL OR idade <= ?
+            ORDER BY updated_at DESC LIMIT ?
+        ''', list(rodadas) + [idade_maxima, idade_maxima, limite or -1])
+        return cur.fetchall()
+
+    def contar_rascunhos(self, rodadas: Sequence[int]) -> Dict[int, int]:
+        marcas = ','.join('?' * len(rodadas))
+        cur = self._leitura().cursor()
+        cur.execute(f'SELECT rodada_id, COUNT(*) FROM rascunhos WHERE rodada_id IN ({marcas}) GROUP BY rodada_id',
+                    list(rodadas))
+        return dict(cur.fetchall())
+
+    def obter_rascunho(self, rodada_id: int, user_id: int) -> Optional[int]:
+        cur = self._leitura().cursor()
+        cur.execute('SELECT palpites_bin FROM rascunhos WHERE rodada_id = ? AND user_id = ?', (rodada_id, user_id))
+        linha = cur.fetchone()
+        return linha[0] if linha else None
+
+    def obter_palpites_pagina(self, rodada_id: int, apos_id: Optional[int] = None,
+                              antes_id: Optional[int] = None, limite: int = 50):
+        # keyset por id (ordem de envio): apos_id avança, antes_id volta (vem em ordem decrescente)
+        cur = self._leitura().cursor()
+        colunas = 'id, rodada_id, user_id, user_name, user_phone, palpites_bin, created_at'
+        if antes_id is not None:
+            cur.execute(f'SELECT {colunas} FROM palpites WHERE rodada_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                        (rodada_id, antes_id, limite))
+        else:
+            cur.execute(f'SELECT {colunas} FROM palpites WHERE rodada_id = ? AND id > ? ORDER BY id LIMIT ?',
+                        (rodada_id, apos_id or 0, limite))
+        return cur.fetchall()
 
+    def iterar_palpites_rodada(self, rodada_id: int, bloco: int = 500):
+        # gerador de blocos (fetchmany) para exportações grandes; consumir na mesma thread
+        cur = self._leitura().cursor()
+        cur.execute('SELECT id, rodada_id, user_id, user_name, user_phone, palpites_bin, created_at FROM palpites WHERE rodada_id = ? ORDER BY id', (rodada_id,))
+        while True:
+            linhas = cur.fetchmany(bloco)
+            if not linhas:
+                return
+            yield linhas
 
+    def contar_palpites(self, rodada_id: int) -> int:
+        cur = self._leitura().cursor()
+        cur.execute('SELECT total_palpitadores FROM contagem_rodada WHERE rodada_id = ?', (rodada_id,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+    @escrita
+    def reconstruir_contagens(self, rodada_id: Optional[int] = None, apenas_faltando: bool = False):
+        # refaz os contadores a partir de palpites (bancos antigos ou correção)
+        cur = self.conn.cursor()
+        if rodada_id is not None:
+            rodadas = [rodada_id]
+        elif apenas_faltando:
+            cur.execute('''
+                SELECT DISTINCT p.rodada_id FROM palpites p
+                LEFT JOIN contagem_rodada c ON c.rodada_id = p.rodada_id
+                WHERE c.rodada_id IS NULL
+            ''')
+            rodadas = [r[0] for r in cur.fetchall()]
+        else:
+            cur.execute('SELECT DISTINCT rodada_id FROM palpites')
+            rodadas = [r[0] for r in cur.fetchall()]
+
+        with self.conn:
+            for rid in rodadas:
+                cur.execute('DELETE FROM contagem_votos WHERE rodada_id = ?', (rid,))
+                cur.execute('DELETE FROM contagem_rodada WHERE rodada_id = ?', (rid,))
+                cur.execute('SELECT palpites_bin FROM palpites WHERE rodada_id = ? AND palpites_bin IS NOT NULL', (rid,))
+                contagem = [[0, 0, 0] for _ in range(N_JOGOS)]
+                total = 0
+                for (bits,) in cur:
+                    total += 1
+                    for k in range(3):
+                        m = votos(bits, k + 1)
+                        while m:
+                            baixo = m & -m
+                            contagem[baixo.bit_length() // 2][k] += 1
+                            m ^= baixo
+                self.conn.executemany(
+                    'INSERT INTO contagem_votos (rodada_id, jogo, votos_1, votos_x, votos_2) VALUES (?, ?, ?, ?, ?)',
+                    [(rid, i, c[0], c[1], c[2]) for i, c in enumerate(contagem)]
+                )
+                self.conn.execute('INSERT INTO contagem_rodada (rodada_id, total_palpitadores) VALUES (?, ?)', (rid, total))
+
+    def obter_estatisticas_rodada(self, rodada_id: int):
+        cur = self._leitura().cursor()
+        cur.execute('SELECT total_palpitadores FROM contagem_rodada WHERE rodada_id = ?', (rodada_id,))
+        row = cur.fetchone()
+        if not row or row[0] <= 0:
+            return None
+        jogos = self.obter_jogos(rodada_id)
+        estatisticas = [{"1":0,"X":0,"2":0} for _ in range(len(jogos))]
+        cur.execute('SELECT jogo, votos_1, votos_x, votos_2 FROM contagem_votos WHERE rodada_id = ?', (rodada_id,))
+        for jogo, v1, vx, v2 in cur.fetchall():
+            if 0 <= jogo < len(estatisticas):
+                estatisticas[jogo] = {"1": v1, "X": vx, "2": v2}
+        return {"total_palpitadores": row[0], "estatisticas": estatisticas, "jogos": jogos}
@@ -0,0 +1,40 @@
+# database_async.py
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+
+class DatabaseAsync:
+    """
+    Fachada assíncrona do Database: cada chamada roda fora do event loop.
+    Métodos marcados com @escrita vão para uma única thread (dona da conexão
+    de escrita); os demais vão para um pool de leitura com conexão por thread.
+    """
+
+    def __init__(self, db: Database, leitores: int = 4):
+        self.db = db
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-escrita")
+        self._leitores = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix="db-leitura")
+
+    def __getattr__(self, nome):
+        metodo = getattr(self.db, nome)
+        pool = self._escritor if getattr(metodo, "escrita", False) else self._leitores
+
+        async def chamar(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, functools.partial(metodo, *args, **kwargs))
+
+        chamar.__name__ = nome
+        setattr(self, nome, chamar)
+        return chamar
+
+    async def executar(self, fn, *args, **kwargs):
+        # roda fn(db, ...) inteira numa thread de leitura (ex.: percorrer um cursor grande)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._leitores, functools.partial(fn, self.db, *args, **kwargs))
+
+    def fechar(self):
+        self._escritor.shutdown(wait=True)
+        self._leitores.shutdown(wait=True)
@@ -0,0 +1,115 @@
+# desdobramento.py
+# /desdobramento: volante com duplos e triplos. Cada jogo é uma máscara de 3 bits
+# (1 = "1", 2 = "X", 4 = "2") e o volante vale o produto das marcações por jogo.
+# Contagens e cobertura saem de polinômios (um por jogo, multiplicados), nunca da
+# lista de apostas: 3^14 ≈ 4,8 milhões de combinações custam 14 multiplicações.
+
+import tempfile
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from palpites_codec import BITS_POR_JOGO, CODIGOS, N_JOGOS, formatar
+
+OPCOES = ("1", "X", "2")
+BITS = {"1": 1, "X": 2, "2": 4}
+TRIPLO = 7
+
+MAX_MEMORIA = 1024 * 1024
+LIMITE_ARQUIVO = 50_000  # acima disso só o resumo (a lista não serve para nada no chat)
+
+def ler_mascaras(args: Sequence[str]) -> Optional[List[int]]:
+    """Uma marcação por jogo: "1", "X2", "1X2" (ou "T"). None se não são 14 marcações válidas."""
+    marcacoes = " ".join(args).replace(",", " ").upper().split()
+    if len(marcacoes) != N_JOGOS:
+        return None
+    mascaras = []
+    for marcacao in marcacoes:
+        if marcacao == "T":
+            marcacao = "1X2"
+        mascara = 0
+        for c in marcacao:
+            if c not in BITS:
+                return None
+            mascara |= BITS[c]
+        mascaras.append(mascara)
+    return mascaras
+
+def marcados(mascara: int) -> List[str]:
+    return [o for o in OPCOES if mascara & BITS[o]]
+
+def combinacoes(mascaras: Sequence[int]) -> int:
+    total = 1
+    for m in mascaras:
+        total *= m.bit_count()
+    return total
+
+def duplos_triplos(mascaras: Sequence[int]) -> Tuple[int, int]:
+    duplos = sum(1 for m in mascaras if m.bit_count() == 2)
+    triplos = sum(1 for m in mascaras if m == TRIPLO)
+    return duplos, triplos
+
+def _multiplicar(a: List[float], b: List[float]) -> List[float]:
+    produto = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            produto[i + j] += x * y
+    return produto
+
+def _frequencias(votos: Dict[str, int]) -> Dict[str, float]:
+    total = sum(votos[o] for o in OPCOES)
+    if total == 0:
+        return {o: 1 / 3 for o in OPCOES}
+    return {o: votos[o] / total for o in OPCOES}
+
+def cobertura(mascaras: Sequence[int], estatisticas: Sequence[Dict[str, int]]):
+    """
+    Tomando os palpites do grupo como probabilidade de cada resultado (jogos independentes),
+    devolve (melhor, esperadas), indexadas pelo número de acertos:
+    melhor[k] = chance de a melhor aposta do volante fazer k acertos;
+    esperadas[k] = número esperado de apostas do volante com k acertos.
+    """
+    melhor, esperadas = [1.0], [1.0]
+    for mascara, votos in zip(mascaras, estatisticas):
+        freq = _frequencias(votos)
+        coberto = sum(freq[o] for o in marcados(mascara))
+        # o jogo acerta se o resultado está entre as marcações; das n marcações, só uma acerta
+        melhor = _multiplicar(melhor, [1 - coberto, coberto])
+        esperadas = _multiplicar(esperadas, [mascara.bit_count() - coberto, coberto])
+    return melhor, esperadas
+
+def _combinar(opcoes: List[List[int]]) -> List[int]:
+    # todas as combinações de meio volante: no máximo 3^7 = 2187 itens
+    parciais = [0]
+    for op in opcoes:
+        parciais = [p | o for p in parciais for o in op]
+    return parciais
+
+def expandir(mascaras: Sequence[int]) -> Iterator[int]:
+    """Apostas simples do volante, empacotadas como no palpites_codec, geradas sob demanda."""
+    opcoes = [[CODIGOS[o] << (BITS_POR_JOGO * i) for o in marcados(m)] for i, m in enumerate(mascaras)]
+    meio = len(opcoes) // 2
+    inicio = _combinar(opcoes[:meio])
+    fim = _combinar(opcoes[meio:])
+    for a in inicio:
+        for b in fim:
+            yield a | b
+
+def escrever_desdobramento(mascaras: Sequence[int]):
+    """Uma aposta por linha ("1 X 2 ..."), na mesma ordem do expandir. Devolve o arquivo no início."""
+    arquivo = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA, mode="w+b")
+    linhas = []
+    for bits in expandir(mascaras):
+        linhas.append(formatar(bits))
+        if len(linhas) == 4096:
+            arquivo.write(("\n".join(linhas) + "\n").encode("utf-8"))
+            linhas.clear()
+    if linhas:
+        arquivo.write(("\n".join(linhas) + "\n").encode("utf-8"))
+    arquivo.seek(0)
+    return arquivo
+
+def milhar(n: int) -> str:
+    return f"{n:,}".replace(",", ".")
+
+def reais(valor: float) -> str:
+    # 1234.5 -> "R$ 1.234,50"
+    return "R$ " + f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
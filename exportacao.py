@@ -0,0 +1,61 @@
+# exportacao.py
+# /exportar: percorre o cursor dos palpites em blocos e grava CSV ou JSON lines
+# num SpooledTemporaryFile (memória até MAX_MEMORIA, depois disco).
+
+import csv
+import io
+import json
+import tempfile
+
+from palpites_codec import decodificar, N_JOGOS
+
+MAX_MEMORIA = 1024 * 1024
+FORMATOS = ("csv", "json")
+
+def escrever_exportacao(db, rodada_id: int, formato: str = "csv", com_jogos: bool = False):
+    """Roda numa thread de leitura (DatabaseAsync.executar). Devolve o arquivo posicionado no início."""
+    arquivo = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA, mode="w+b")
+    jogos = db.obter_jogos(rodada_id) if com_jogos else []
+    buffer = io.StringIO()
+
+    def despejar():
+        arquivo.write(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+
+    if formato == "csv":
+        escritor = csv.writer(buffer)
+        if jogos:
+            colunas_jogos = [f"{i+1}. {j[2]} x {j[3]}" for i, j in enumerate(jogos)]
+        else:
+            colunas_jogos = [f"jogo_{i+1}" for i in range(N_JOGOS)]
+        escritor.writerow(["rodada_id", "user_id", "nome", "username", "enviado_em"] + colunas_jogos)
+        for bloco in db.iterar_palpites_rodada(rodada_id):
+            for p in bloco:
+                escritor.writerow([p[1], p[2], p[3], p[4] or "", p[6]] + [s or "" for s in decodificar(p[5] or 0)])
+            despejar()
+    else:
+        if jogos:
+            buffer.write(json.dumps({
+                "rodada_id": rodada_id,
+                "jogos": [{"jogo": i+1, "time1": j[2], "time2": j[3]} for i, j in enumerate(jogos)],
+            }, ensure_ascii=False) + "\n")
+        for bloco in db.iterar_palpites_rodada(rodada_id):
+            for p in bloco:
+                buffer.write(json.dumps({
+                    "rodada_id": p[1], "user_id": p[2], "nome": p[3], "username": p[4] or "",
+                    "enviado_em": p[6], "palpites": decodificar(p[5] or 0),
+                }, ensure_ascii=False) + "\n")
+            despejar()
+
+    despejar()
+    arquivo.seek(0)
+    return arquivo
+
+async def enviar_arquivo(message, arquivo, filename: str, caption: str):
+    """Responde `message` com o arquivo (de escrever_exportacao/escrever_desdobramento) e o fecha."""
+    try:
+        # bytes: o upload do PTB lê o arquivo inteiro de qualquer forma e o spool em memória não tem .name
+        await message.reply_document(document=arquivo.read(), filename=filename, caption=caption)
+    finally:
+        arquivo.close()
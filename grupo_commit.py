@@ -0,0 +1,55 @@
+# grupo_commit.py
+
+import asyncio
+import logging
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class GrupoCommit:
+    """
+    Junta os envios de palpites que chegam dentro de `janela` segundos e grava
+    todos numa transação só (salvar_palpites_lote). Cada chamador recebe o seu
+    próprio resultado: True = gravado, False = já tinha enviado, None = rodada já apurada.
+    """
+
+    def __init__(self, db, janela: float = 0.005, max_lote: int = 500):
+        self.db = db
+        self.janela = janela
+        self.max_lote = max_lote
+        self._fila = []
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def salvar(self, rodada_id: int, user_id: int, user_name: str, user_phone: str,
+                     palpites: Sequence[Optional[str]]) -> Optional[bool]:
+        futuro = asyncio.get_running_loop().create_future()
+        self._fila.append(((rodada_id, user_id, user_name, user_phone, list(palpites)), futuro))
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._escrever())
+        return await futuro
+
+    async def _escrever(self):
+        while self._fila:
+            if len(self._fila) < self.max_lote:
+                # dá tempo para os envios da mesma rajada entrarem no lote
+                await asyncio.sleep(self.janela)
+
+            lote = self._fila[:self.max_lote]
+            self._fila = self._fila[self.max_lote:]
+
+            try:
+                resultados: List[Optional[bool]] = await self.db.salvar_palpites_lote([item for item, _ in lote])
+            except Exception as e:
+                logger.error(f"Erro ao gravar lote de {len(lote)} palpites: {e}")
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            for (_, futuro), ok in zip(lote, resultados):
+                if not futuro.done():
+                    futuro.set_result(ok)
+
+    async def parar(self):
+        if self._tarefa is not None and not self._tarefa.done():
+            await self._tarefa
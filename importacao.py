@@ -0,0 +1,126 @@
+# importacao.py
+# Leitura de rodadas em lote (/importar com um documento CSV ou JSON) e o parser
+# de "Time1 x Time2" usado também na criação de rodada pelo chat.
+
+import csv
+import io
+import json
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from palpites_codec import N_JOGOS
+
+# " x " (ou " X ", " × ", " vs ") com espaços dos dois lados: nomes com x no meio ficam inteiros
+_SEPARADOR = re.compile(r"\s+(?:[xX×]|vs\.?)\s+")
+
+def ler_jogo(texto: str) -> Optional[Tuple[str, str]]:
+    partes = _SEPARADOR.split(texto.strip())
+    if len(partes) != 2 or not partes[0].strip() or not partes[1].strip():
+        return None
+    return partes[0].strip(), partes[1].strip()
+
+def ler_jogos(texto: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """Jogos separados por vírgula. Devolve (jogos, partes que não são "Time1 x Time2")."""
+    jogos, invalidos = [], []
+    for parte in texto.split(","):
+        if not parte.strip():
+            continue
+        jogo = ler_jogo(parte)
+        if jogo is None:
+            invalidos.append(parte.strip())
+        else:
+            jogos.append(jogo)
+    return jogos, invalidos
+
+def ler_fechamento(texto) -> Optional[str]:
+    # "2026-10-20 18:00" / ISO 8601; guardado no formato do SQLite, horário do servidor
+    if texto is None or not str(texto).strip():
+        return None
+    data = datetime.fromisoformat(str(texto).strip().replace("T", " "))
+    if data.tzinfo is not None:
+        data = data.astimezone().replace(tzinfo=None)
+    return data.strftime("%Y-%m-%d %H:%M:%S")
+
+def _validar(nome, jogos_brutos, fechamento, onde, erros):
+    nome = (nome or "").strip()
+    if not nome:
+        erros.append(f"{onde}: rodada sem nome")
+        return None
+
+    jogos = []
+    for j in jogos_brutos:
+        jogo = ler_jogo(j) if isinstance(j, str) else (
+            (str(j[0]).strip(), str(j[1]).strip()) if isinstance(j, (list, tuple)) and len(j) == 2 else None
+        )
+        if jogo is None or not all(jogo):
+            erros.append(f"{onde} ({nome}): jogo inválido {j!r}, use Time1 x Time2")
+            return None
+        jogos.append(jogo)
+    if len(jogos) != N_JOGOS:
+        erros.append(f"{onde} ({nome}): {len(jogos)} jogos, precisa de {N_JOGOS}")
+        return None
+
+    try:
+        fecha_em = ler_fechamento(fechamento)
+    except ValueError:
+        erros.append(f"{onde} ({nome}): fecha_em inválido {fechamento!r}, use AAAA-MM-DD HH:MM")
+        return None
+    return nome, jogos, fecha_em
+
+def ler_csv(texto: str, erros: List[str]):
+    # uma linha por jogo: rodada,time1,time2[,fecha_em]; linhas seguidas da mesma rodada se juntam
+    leitor = csv.DictReader(io.StringIO(texto))
+    colunas = {c.strip().lower() for c in (leitor.fieldnames or [])}
+    if not {"rodada", "time1", "time2"} <= colunas:
+        erros.append("CSV precisa das colunas rodada,time1,time2 (fecha_em opcional)")
+        return []
+
+    grupos = []  # [(nome, [(t1, t2)], fecha_em, linha)]
+    for n, linha in enumerate(leitor, start=2):
+        linha = {(k or "").strip().lower(): (v or "").strip() for k, v in linha.items()}
+        nome = linha.get("rodada", "")
+        if not grupos or grupos[-1][0] != nome:
+            grupos.append((nome, [], linha.get("fecha_em", ""), n))
+        grupos[-1][1].append((linha.get("time1", ""), linha.get("time2", "")))
+
+    return [_validar(nome, jogos, fecha, f"linha {n}", erros) for nome, jogos, fecha, n in grupos]
+
+def ler_json(texto: str, erros: List[str]):
+    # [{"nome": ..., "jogos": ["A x B", ["C", "D"], ...], "fecha_em": ...}] ou {"rodadas": [...]}
+    try:
+        dados = json.loads(texto)
+    except ValueError as e:
+        erros.append(f"JSON inválido: {e}")
+        return []
+    if isinstance(dados, dict):
+        dados = dados.get("rodadas", [])
+    if not isinstance(dados, list):
+        erros.append("JSON precisa ser uma lista de rodadas")
+        return []
+
+    rodadas = []
+    for n, item in enumerate(dados, start=1):
+        if not isinstance(item, dict) or not isinstance(item.get("jogos"), list):
+            erros.append(f"rodada {n}: precisa de nome e lista de jogos")
+            continue
+        rodadas.append(_validar(item.get("nome"), item["jogos"], item.get("fecha_em"), f"rodada {n}", erros))
+    return rodadas
+
+def ler_importacao(nome_arquivo: str, conteudo: bytes):
+    """Valida o arquivo inteiro numa passada. Devolve (rodadas, erros); com erro não se importa nada."""
+    erros: List[str] = []
+    try:
+        texto = conteudo.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return [], ["arquivo precisa estar em UTF-8"]
+
+    if nome_arquivo.lower().endswith(".json"):
+        rodadas = ler_json(texto, erros)
+    else:
+        rodadas = ler_csv(texto, erros)
+
+    rodadas = [r for r in rodadas if r is not None]
+    if not rodadas and not erros:
+        erros.append("nenhuma rodada no arquivo")
+    return rodadas, erros
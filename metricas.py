@@ -0,0 +1,233 @@
+# metricas.py
+# Métricas em memória do bot: latência dos handlers e do banco, chamadas à API
+# do Telegram e falhas por tipo. Lidas pelo /metrics (admin) e, opcionalmente,
+# por um endpoint local no formato texto do Prometheus.
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict
+
+from telegram.request import BaseRequest
+
+logger = logging.getLogger(__name__)
+
+# limites dos buckets em segundos
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histograma:
+    __slots__ = ("contagens", "soma", "total", "maximo")
+
+    def __init__(self):
+        self.contagens = [0] * (len(BUCKETS) + 1)
+        self.soma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def observar(self, valor: float):
+        self.contagens[bisect_left(BUCKETS, valor)] += 1
+        self.soma += valor
+        self.total += 1
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def percentil(self, p: float) -> float:
+        # limite superior do bucket que contém o percentil (aproximado)
+        if not self.total:
+            return 0.0
+        alvo = p * self.total
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            acumulado += c
+            if acumulado >= alvo:
+                return min(BUCKETS[i], self.maximo) if i < len(BUCKETS) else self.maximo
+        return self.maximo
+
+class Metricas:
+    def __init__(self):
+        self.handlers: Dict[str, Histograma] = {}
+        self.banco: Dict[str, Histograma] = {}
+        self.api: Dict[str, Histograma] = {}
+        self.chamadas_api = Counter()
+        self.falhas = Counter()
+        self.medidores: Dict[str, Callable[[], float]] = {}
+        self.inicio = time.time()
+
+    @staticmethod
+    def _observar(tabela: Dict[str, Histograma], nome: str, valor: float):
+        h = tabela.get(nome)
+        if h is None:
+            h = tabela[nome] = Histograma()
+        h.observar(valor)
+
+    def falha(self, origem: str, erro: BaseException):
+        self.falhas[(origem, type(erro).__name__)] += 1
+
+    def medidor(self, nome: str, fn: Callable[[], float]):
+        self.medidores[nome] = fn
+
+    # ---- handlers ----
+    def medir_handler(self, callback, nome: str = None):
+        nome = nome or callback.__name__
+
+        @functools.wraps(callback)
+        async def medido(update, context):
+            inicio = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except Exception as e:
+                self.falha(f"handler:{nome}", e)
+                raise
+            finally:
+                self._observar(self.handlers, nome, time.perf_counter() - inicio)
+
+        return medido
+
+    def instrumentar_aplicacao(self, app):
+        for grupo in app.handlers.values():
+            for handler in grupo:
+                handler.callback = self.medir_handler(handler.callback)
+
+    # ---- banco ----
+    def instrumentar_banco(self, db):
+        # embrulha os métodos públicos da instância (mantém a marca @escrita)
+        for nome, metodo in inspect.getmembers(db, inspect.ismethod):
+            if nome.startswith("_"):
+                continue
+            setattr(db, nome, self._medir_metodo(nome, metodo))
+        return db
+
+    def _medir_metodo(self, nome, metodo):
+        @functools.wraps(metodo)
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return metodo(*args, **kwargs)
+            except Exception as e:
+                self.falha(f"db:{nome}", e)
+                raise
+            finally:
+                self._observar(self.banco, nome, time.perf_counter() - inicio)
+
+        return medido
+
+    # ---- API do Telegram ----
+    def requisicao(self, interna: BaseRequest) -> BaseRequest:
+        return RequisicaoMedida(self, interna)
+
+    # ---- saída ----
+    def resumo(self, topo: int = 8) -> str:
+        def linhas(tabela, ordenar_por_soma=False):
+            itens = sorted(tabela.items(), key=lambda kv: kv[1].soma if ordenar_por_soma else kv[1].total, reverse=True)
+            saida = []
+            for nome, h in itens[:topo]:
+                saida.append(
+                    f"  {nome}: {h.total}x, média {h.soma / h.total * 1000:.1f}ms, "
+                    f"p95≤{h.percentil(0.95) * 1000:.0f}ms, máx {h.maximo * 1000:.0f}ms"
+                )
+            return saida or ["  (nada ainda)"]
+
+        txt = [f"📈 MÉTRICAS (há {int(time.time() - self.inicio)}s)", "", "Handlers:"]
+        txt += linhas(self.handlers)
+        txt += ["", "Banco (por tempo total):"]
+        txt += linhas(self.banco, ordenar_por_soma=True)
+        txt += ["", "API do Telegram:"]
+        txt += [f"  {m}: {n}" for m, n in self.chamadas_api.most_common(topo)] or ["  (nada ainda)"]
+        txt += ["", "Falhas:"]
+        txt += [f"  {o} {t}: {n}" for (o, t), n in self.falhas.most_common(topo)] or ["  nenhuma"]
+        if self.medidores:
+            txt += [""]
+            txt += [f"{nome}: {fn()}" for nome, fn in self.medidores.items()]
+        return "\n".join(txt)
+
+    def prometheus(self) -> str:
+        saida = []
+
+        def histograma(metrica, rotulo, tabela):
+            saida.append(f"# TYPE {metrica} histogram")
+            for nome, h in tabela.items():
+                acumulado = 0
+                for limite, c in zip(BUCKETS + ("+Inf",), h.contagens):
+                    acumulado += c
+                    saida.append(f'{metrica}_bucket{{{rotulo}="{nome}",le="{limite}"}} {acumulado}')
+                saida.append(f'{metrica}_sum{{{rotulo}="{nome}"}} {h.soma}')
+                saida.append(f'{metrica}_count{{{rotulo}="{nome}"}} {h.total}')
+
+        histograma("loteca_handler_segundos", "handler", self.handlers)
+        histograma("loteca_db_segundos", "metodo", self.banco)
+        histograma("loteca_api_segundos", "metodo", self.api)
+
+        saida.append("# TYPE loteca_api_chamadas_total counter")
+        for metodo, n in self.chamadas_api.items():
+            saida.append(f'loteca_api_chamadas_total{{metodo="{metodo}"}} {n}')
+        saida.append("# TYPE loteca_falhas_total counter")
+        for (origem, tipo), n in self.falhas.items():
+            saida.append(f'loteca_falhas_total{{origem="{origem}",tipo="{tipo}"}} {n}')
+        for nome, fn in self.medidores.items():
+            saida.append(f"# TYPE loteca_{nome} gauge")
+            saida.append(f"loteca_{nome} {fn()}")
+        return "\n".join(saida) + "\n"
+
+    # ---- endpoint HTTP local ----
+    async def servir(self, porta: int, host: str = "127.0.0.1"):
+        async def atender(reader, writer):
+            try:
+                linha = await reader.readline()
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                if linha.split()[1:2] == [b"/metrics"]:
+                    corpo = self.prometheus().encode()
+                    status = "200 OK"
+                else:
+                    corpo, status = b"not found\n", "404 Not Found"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                    f"Content-Length: {len(corpo)}\r\nConnection: close\r\n\r\n".encode() + corpo
+                )
+                await writer.drain()
+            except Exception as e:
+                logger.warning(f"Erro no endpoint de métricas: {e}")
+            finally:
+                writer.close()
+
+        servidor = await asyncio.start_server(atender, host, porta)
+        logger.info(f"Métricas Prometheus em http://{host}:{porta}/metrics")
+        return servidor
+
+class RequisicaoMedida(BaseRequest):
+    """Camada HTTP do Bot que conta e cronometra cada método da API."""
+
+    def __init__(self, metricas: Metricas, interna: BaseRequest):
+        self.metricas = metricas
+        self.interna = interna
+
+    @property
+    def read_timeout(self):
+        return self.interna.read_timeout
+
+    async def initialize(self):
+        await self.interna.initialize()
+
+    async def shutdown(self):
+        await self.interna.shutdown()
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        metodo = url.rsplit("/", 1)[-1]
+        self.metricas.chamadas_api[metodo] += 1
+        inicio = time.perf_counter()
+        try:
+            status, corpo = await self.interna.do_request(url, method, request_data, **kwargs)
+        except Exception as e:
+            self.metricas.falha(f"api:{metodo}", e)
+            raise
+        finally:
+            self.metricas._observar(self.metricas.api, metodo, time.perf_counter() - inicio)
+        if status >= 400:
+            self.metricas.falhas[(f"api:{metodo}", f"HTTP {status}")] += 1
+        return status, corpo
+
+metricas = Metricas()
@@ -0,0 +1,78 @@
+# paginacao.py
+# /ver_palpites em páginas: busca os palpites em blocos (keyset por id) e monta
+# cada página até o limite de tamanho do Telegram, sempre cortando entre entradas.
+
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+
+import callback_codec as cb
+from palpites_codec import formatar
+
+LIMITE_PAGINA = 3800  # folga sob os 4096 caracteres de uma mensagem
+BLOCO = 50
+
+def formatar_entrada(p) -> str:
+    username = f"@{escape_markdown(p[4])}" if p[4] else "(sem username)"
+    return (
+        f"👤 {escape_markdown(p[3])} ({username})\n"
+        f"📋 {formatar(p[5])}\n"
+        f"⏰ {p[6]}\n"
+        + "─" * 30 + "\n"
+    )
+
+async def montar_pagina(db, rodada, total: int, apos_id: Optional[int] = None, antes_id: Optional[int] = None):
+    """
+    Página seguinte a `apos_id` (ou anterior a `antes_id`). Devolve (texto, teclado),
+    ou (None, None) se não há nada nessa direção.
+    """
+    rodada_id = rodada[0]
+    cabecalho = f"📋 *Palpites — {escape_markdown(rodada[1])}*\n\n👥 Total: {total} palpitadores\n\n"
+    voltando = antes_id is not None
+
+    entradas = []
+    tamanho = len(cabecalho)
+    primeiro = ultimo = None
+    sobrou = False
+    cursor = antes_id if voltando else apos_id
+
+    while not sobrou:
+        if voltando:
+            linhas = await db.obter_palpites_pagina(rodada_id, antes_id=cursor, limite=BLOCO)
+        else:
+            linhas = await db.obter_palpites_pagina(rodada_id, apos_id=cursor, limite=BLOCO)
+        if not linhas:
+            break
+        for p in linhas:
+            entrada = formatar_entrada(p)
+            if entradas and tamanho + len(entrada) > LIMITE_PAGINA:
+                sobrou = True
+                break
+            entradas.append(entrada)
+            tamanho += len(entrada)
+            if primeiro is None:
+                primeiro = p[0]
+            ultimo = p[0]
+        cursor = linhas[-1][0]
+        if len(linhas) < BLOCO:
+            break
+
+    if not entradas:
+        return None, None
+
+    if voltando:
+        # veio em ordem decrescente
+        entradas.reverse()
+        primeiro, ultimo = ultimo, primeiro
+        tem_anterior, tem_proxima = sobrou, True
+    else:
+        tem_anterior, tem_proxima = apos_id is not None, sobrou
+
+    botoes = []
+    if tem_anterior:
+        botoes.append(InlineKeyboardButton("◀", callback_data=cb.codificar(rodada_id, cb.PAGINA_ANTERIOR, primeiro)))
+    if tem_proxima:
+        botoes.append(InlineKeyboardButton("▶", callback_data=cb.codificar(rodada_id, cb.PAGINA_PROXIMA, ultimo)))
+
+    return cabecalho + "".join(entradas), InlineKeyboardMarkup([botoes]) if botoes else None
@@ -0,0 +1,66 @@
+# palpites_codec.py
+# Palpites empacotados em 2 bits por jogo: jogo i ocupa os bits 2i e 2i+1.
+# 0 = vazio, 1 = "1", 2 = "X", 3 = "2". Os 14 jogos cabem em 28 bits.
+
+from typing import List, Optional, Sequence
+
+N_JOGOS = 14
+BITS_POR_JOGO = 2
+
+CODIGOS = {"1": 1, "X": 2, "2": 3}
+SIMBOLOS = (None, "1", "X", "2")
+
+# bit baixo de cada par (0b0101...) e todos os bits usados
+MASCARA_BAIXA = sum(1 << (BITS_POR_JOGO * i) for i in range(N_JOGOS))
+MASCARA_TOTAL = (1 << (BITS_POR_JOGO * N_JOGOS)) - 1
+
+def codificar(palpites: Sequence[Optional[str]]) -> int:
+    bits = 0
+    for i, p in enumerate(palpites):
+        bits |= CODIGOS.get(p, 0) << (BITS_POR_JOGO * i)
+    return bits
+
+def decodificar(bits: int, n: int = N_JOGOS) -> List[Optional[str]]:
+    return [SIMBOLOS[(bits >> (BITS_POR_JOGO * i)) & 3] for i in range(n)]
+
+def marcar(bits: int, idx: int, palpite: Optional[str]) -> int:
+    desloc = BITS_POR_JOGO * idx
+    return (bits & ~(3 << desloc)) | (CODIGOS.get(palpite, 0) << desloc)
+
+def formatar(bits: Optional[int]) -> str:
+    return " ".join(p or "-" for p in decodificar(bits or 0))
+
+def ocupados(bits: int) -> int:
+    # 1 no bit baixo de cada jogo preenchido
+    return (bits | (bits >> 1)) & MASCARA_BAIXA
+
+def preenchidos(bits: int) -> int:
+    return ocupados(bits).bit_count()
+
+def completo(bits: int) -> bool:
+    return ocupados(bits) == MASCARA_BAIXA
+
+def faltando(bits: int) -> List[int]:
+    # índices (a partir de 0) dos jogos vazios, tirando um bit por vez da máscara
+    vazios = ~ocupados(bits) & MASCARA_BAIXA
+    indices = []
+    while vazios:
+        baixo = vazios & -vazios
+        indices.append((baixo.bit_length() - 1) // BITS_POR_JOGO)
+        vazios ^= baixo
+    return indices
+
+def diferencas(a: int, b: int) -> int:
+    # 1 no bit baixo de cada jogo em que a e b discordam
+    return ocupados(a ^ b)
+
+def acertos(palpite: int, resultado: int) -> int:
+    return N_JOGOS - diferencas(palpite, resultado).bit_count()
+
+def repetir(codigo: int) -> int:
+    # mesmo código em todos os jogos (ex.: repetir(1) = tudo "1")
+    return MASCARA_BAIXA * codigo
+
+def votos(bits: int, codigo: int) -> int:
+    # 1 no bit baixo de cada jogo marcado com `codigo`
+    return ~ocupados(bits ^ repetir(codigo)) & ocupados(bits)
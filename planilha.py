@@ -0,0 +1,155 @@
+# planilha.py
+
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import callback_codec as cb
+from palpites_codec import codificar
+
+# ------------------ PLANILHA PRÉ-CALCULADA POR RODADA ------------------
+# Remontar tudo a cada clique custava caro (a versão original ficou em bench_loteca.py,
+# como referência). PlanilhaRodada monta uma vez, na criação da rodada, as partes
+# fixas (nomes encurtados, botões, linhas da tabela final). As planilhas já
+# renderizadas ficam num LRU só, de todas as rodadas, por (rodada_id, palpites empacotados).
+
+TAMANHO_CACHE = 4096
+
+class CacheRenderizacao:
+    """LRU limitado de planilhas prontas; a chave leva a rodada, então um serve para todas."""
+
+    def __init__(self, tamanho: int = TAMANHO_CACHE):
+        self.tamanho = tamanho
+        self._itens = OrderedDict()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def get(self, chave):
+        pronto = self._itens.get(chave)
+        if pronto is not None:
+            self._itens.move_to_end(chave)
+        return pronto
+
+    def guardar(self, chave, pronto):
+        self._itens[chave] = pronto
+        if len(self._itens) > self.tamanho:
+            self._itens.popitem(last=False)
+
+renderizadas = CacheRenderizacao()
+
+def _times(row):
+    if len(row) >= 4:
+        return row[2], row[3]
+    return row[0], row[1]
+
+class PlanilhaRodada:
+    def __init__(self, rodada_id: int, nome_rodada: str, jogos: Sequence, cache: Optional[CacheRenderizacao] = None):
+        self.rodada_id = rodada_id
+        self.nome_rodada = nome_rodada
+        self.jogos = jogos
+        self._cache = renderizadas if cache is None else cache
+
+        self.titulo = f"📊 *{nome_rodada.upper()}*"
+        self.times = [_times(jogos[i]) for i in range(14)]
+
+        # Botões são imutáveis: cada linha do teclado já existe nas 4 variantes
+        self._linhas_teclado = []
+        self._marcado = []
+        self._vazio = []
+        self._linhas_finais = []
+        for i, (t1, t2) in enumerate(self.times):
+            short_t1 = t1[:12]
+            short_t2 = t2[:12]
+            d1 = cb.codificar(rodada_id, cb.TIME1, i)
+            dx = cb.codificar(rodada_id, cb.EMPATE, i)
+            d2 = cb.codificar(rodada_id, cb.TIME2, i)
+            num = InlineKeyboardButton(str(i+1), callback_data=cb.codificar(rodada_id, cb.NOOP, i))
+            b1 = InlineKeyboardButton(short_t1, callback_data=d1)
+            bx = InlineKeyboardButton("X", callback_data=dx)
+            b2 = InlineKeyboardButton(short_t2, callback_data=d2)
+            self._linhas_teclado.append({
+                None: (num, b1, bx, b2),
+                "1": (num, InlineKeyboardButton(f"✅{short_t1}", callback_data=d1), bx, b2),
+                "X": (num, b1, InlineKeyboardButton("✅X", callback_data=dx), b2),
+                "2": (num, b1, bx, InlineKeyboardButton(f"{short_t2}✅", callback_data=d2)),
+            })
+
+            self._marcado.append(f"{i+1}:✅")
+            self._vazio.append(f"{i+1}:⚪")
+
+            t1_short = t1[:10] if len(t1) > 10 else t1.ljust(10)
+            t2_short = t2[:10] if len(t2) > 10 else t2.ljust(10)
+            n = i + 1
+            self._linhas_finais.append({
+                pal: f"| {n:2d} | {'✅' if pal == '1' else '□'} | {t1_short} | "
+                     f"{'✅' if pal == 'X' else '□'} | {t2_short} | {'✅' if pal == '2' else '□'} |"
+                for pal in (None, "1", "X", "2")
+            })
+
+        self._meus_palpites = InlineKeyboardButton("📊 VER MEUS PALPITES", callback_data=cb.codificar(rodada_id, cb.MEUS_PALPITES))
+        self._rodape = (
+            (InlineKeyboardButton("🚀 ENVIAR PALPITES", callback_data=cb.codificar(rodada_id, cb.ENVIAR)),),
+            (self._meus_palpites,),
+        )
+        self._texto_vazio = "\n".join([self.titulo, "", "Clique nos botões abaixo para fazer seus palpites!", ""])
+
+    def interativa(self, user_palpite: Optional[Sequence] = None):
+        # sem palpite (planilha recém-postada) e tudo vazio mostram textos diferentes
+        bits = codificar(user_palpite) if user_palpite is not None else None
+        chave = (self.rodada_id, bits)
+        pronto = self._cache.get(chave)
+        if pronto is None:
+            pronto = self._montar_interativa(tuple(user_palpite) if user_palpite is not None else None)
+            self._cache.guardar(chave, pronto)
+        return pronto
+
+    def _montar_interativa(self, palpite):
+        if palpite:
+            display = " ".join(
+                self._vazio[i] if p is None else self._marcado[i]
+                for i, p in enumerate(palpite)
+            )
+            faltando = palpite.count(None)
+            aviso = f"⚠️ *Faltam {faltando} jogos*" if faltando > 0 else "✅ *Todos os jogos preenchidos!*"
+            texto = "\n".join([
+                self.titulo, "",
+                "📝 *SEUS PALPITES ATUAIS:*", display, "",
+                aviso, "",
+                "Clique nos botões abaixo para fazer seus palpites!", "",
+            ])
+        else:
+            texto = self._texto_vazio
+            palpite = (None,) * 14
+
+        kb = [self._linhas_teclado[i].get(palpite[i], self._linhas_teclado[i][None]) for i in range(14)]
+        kb.extend(self._rodape)
+        return texto, InlineKeyboardMarkup(kb)
+
+    def resumo(self, total: int, link: str):
+        # modo privado: o grupo só mostra o andamento e o atalho para a planilha pessoal
+        texto = "\n".join([
+            self.titulo, "",
+            "📝 Cada participante preenche a própria planilha no privado.",
+            f"👥 Palpites enviados: *{total}*", "",
+            "Clique no botão abaixo para preencher!",
+        ])
+        kb = [
+            [InlineKeyboardButton("📝 PREENCHER PALPITES", url=link)],
+            [self._meus_palpites],
+        ]
+        return texto, InlineKeyboardMarkup(kb)
+
+    def final(self, display: Sequence, user_name: str):
+        linhas = [
+            self.titulo,
+            f"✅ *PALPITES DE {user_name.upper()}*",
+            "",
+            "| JG | 1 | MANDANTE | X | VISITANTE | 2 |",
+            "|----|---|----------|---|-----------|---|",
+        ]
+        linhas.extend(self._linhas_finais[i].get(display[i], self._linhas_finais[i][None]) for i in range(14))
+        linhas.append("")
+        linhas.append("🎉 *Palpites enviados com sucesso!*")
+        return "\n".join(linhas), None
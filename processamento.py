@@ -0,0 +1,61 @@
+# processamento.py
+
+import asyncio
+import sys
+from typing import Dict, Hashable, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class ProcessadorPorUsuario(BaseUpdateProcessor):
+    """
+    Processa updates em paralelo, mas em fila por usuário: cliques do mesmo
+    usuário entram no rascunho na ordem em que chegaram e o envio dele nunca
+    roda junto com outro clique seu. Usuários diferentes não esperam um pelo outro.
+    """
+
+    def __init__(self, max_concurrent_updates: int = 256):
+        # o semáforo do PTB é pego antes da trava do usuário: updates só esperando a vez
+        # do mesmo usuário ocupariam vagas. Ele fica sem limite; o limite real (_vagas)
+        # é pego já com a trava do usuário na mão.
+        super().__init__(sys.maxsize)
+        self.limite = max_concurrent_updates
+        self._vagas = asyncio.Semaphore(max_concurrent_updates)
+        # chave -> [trava, quantos updates usando]; some quando ninguém mais usa
+        self._travas: Dict[Hashable, List] = {}
+
+    @staticmethod
+    def chave(update: object) -> Optional[Hashable]:
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return ("chat", update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        chave = self.chave(update)
+        if chave is None:
+            async with self._vagas:
+                await coroutine
+            return
+
+        entrada = self._travas.get(chave)
+        if entrada is None:
+            entrada = self._travas[chave] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            # asyncio.Lock é FIFO: a ordem de chegada é a ordem de execução
+            async with entrada[0]:
+                async with self._vagas:
+                    await coroutine
+        finally:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                del self._travas[chave]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,178 @@
+# rascunhos.py
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import palpites_codec
+
+logger = logging.getLogger(__name__)
+
+class Rascunho:
+    """Palpites de um usuário em 2 bits por jogo (palpites_codec) e o último clique."""
+
+    __slots__ = ("bits", "tocado")
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+        self.tocado = time.monotonic()
+
+    def palpites(self) -> List[Optional[str]]:
+        return palpites_codec.decodificar(self.bits)
+
+    def completo(self) -> bool:
+        return palpites_codec.completo(self.bits)
+
+    def faltando(self) -> List[int]:
+        return palpites_codec.faltando(self.bits)
+
+class RascunhoStore:
+    """
+    Rascunhos dos usuários (palpites ainda não enviados). A cópia quente fica
+    em memória; os rascunhos alterados vão para o SQLite em lote a cada
+    `intervalo` segundos e no desligamento, e voltam ao iniciar o bot.
+    As chaves são (rodada_id, user_id): várias rodadas (uma por chat) ao mesmo tempo.
+
+    Rascunho parado há mais de `ttl` segundos (ou o mais antigo, acima de `maximo`)
+    sai da memória; continua no banco e volta no próximo acesso do usuário.
+    """
+
+    EXPIRAR_A_CADA = 60.0
+
+    def __init__(self, db, intervalo: float = 2.0, ttl: float = 3600, maximo: int = 0):
+        self.db = db
+        self.intervalo = intervalo
+        self.ttl = ttl
+        self.maximo = maximo
+        self._rascunhos: Dict[Tuple[int, int], Rascunho] = {}
+        self._sujos = set()
+        self._removidos = set()
+        # rodadas com rascunhos só no banco: nas outras, ausente na memória = não existe
+        self._com_expirados = set()
+        self._proxima_expiracao = 0.0
+        self._tarefa: Optional[asyncio.Task] = None
+
+    # ---- acesso ----
+    def __contains__(self, chave):
+        return chave in self._rascunhos
+
+    def __len__(self):
+        return len(self._rascunhos)
+
+    def get(self, chave) -> Optional[Rascunho]:
+        return self._rascunhos.get(chave)
+
+    async def recuperar(self, chave) -> Optional[Rascunho]:
+        rascunho = self._rascunhos.get(chave)
+        if rascunho is not None or chave[0] not in self._com_expirados:
+            return rascunho
+        bits = await self.db.obter_rascunho(*chave)
+        if bits is None or chave in self._rascunhos or chave in self._removidos:
+            return self._rascunhos.get(chave)
+        rascunho = self._rascunhos[chave] = Rascunho(bits)
+        return rascunho
+
+    async def marcar(self, chave, idx: int, valor: str):
+        rascunho = await self.recuperar(chave)
+        if rascunho is None:
+            rascunho = self._rascunhos[chave] = Rascunho()
+        rascunho.bits = palpites_codec.marcar(rascunho.bits, idx, valor)
+        rascunho.tocado = time.monotonic()
+        self._sujos.add(chave)
+        self._removidos.discard(chave)
+
+    def remover(self, chave):
+        # expirado também: a cópia do banco precisa sair
+        if self._rascunhos.pop(chave, None) is not None or chave[0] in self._com_expirados:
+            self._sujos.discard(chave)
+            self._removidos.add(chave)
+
+    def encerrar_rodada(self, rodada_id: int):
+        # rascunhos de rodada encerrada saem da memória (no banco saem junto com o encerramento)
+        for chave in [c for c in self._rascunhos if c[0] == rodada_id]:
+            del self._rascunhos[chave]
+        self._sujos = {c for c in self._sujos if c[0] != rodada_id}
+        self._removidos = {c for c in self._removidos if c[0] != rodada_id}
+        self._com_expirados.discard(rodada_id)
+
+    def expirar(self, agora: Optional[float] = None) -> int:
+        # só sai o que já está no banco (não sujo); o flush roda antes
+        agora = time.monotonic() if agora is None else agora
+        limite = agora - self.ttl
+        limpos = [(r.tocado, c) for c, r in self._rascunhos.items() if c not in self._sujos]
+        saem = [c for t, c in limpos if t < limite]
+        excesso = len(self._rascunhos) - len(saem) - self.maximo if self.maximo else 0
+        if excesso > 0:
+            saem.extend(c for _, c in heapq.nsmallest(excesso, ((t, c) for t, c in limpos if t >= limite)))
+        for chave in saem:
+            del self._rascunhos[chave]
+            self._com_expirados.add(chave[0])
+        return len(saem)
+
+    # ---- persistência ----
+    async def carregar(self, rodadas: List[int]):
+        # ao iniciar vale o mesmo limite da memória: só os mais recentes (até `maximo`, dentro do `ttl`)
+        if not rodadas:
+            return
+        lidos = await self.db.obter_rascunhos(rodadas, self.maximo, self.ttl)
+        agora = time.monotonic()
+        por_rodada = Counter()
+        for rodada_id, user_id, bits, idade in lidos:
+            rascunho = self._rascunhos[(rodada_id, user_id)] = Rascunho(bits)
+            rascunho.tocado = agora - idade
+            por_rodada[rodada_id] += 1
+        for rodada_id, total in (await self.db.contar_rascunhos(rodadas)).items():
+            if total > por_rodada[rodada_id]:
+                # o resto ficou no banco e volta no próximo acesso do usuário
+                self._com_expirados.add(rodada_id)
+        logger.info(f"{len(lidos)} rascunhos carregados das rodadas {rodadas}")
+
+    async def descarregar(self):
+        if not self._sujos and not self._removidos:
+            return
+        sujos, removidos = self._sujos, self._removidos
+        self._sujos, self._removidos = set(), set()
+
+        por_rodada = defaultdict(lambda: ([], []))
+        for chave in sujos:
+            if chave in self._rascunhos:
+                por_rodada[chave[0]][0].append((chave[1], self._rascunhos[chave].bits))
+        for rodada_id, user_id in removidos:
+            por_rodada[rodada_id][1].append(user_id)
+
+        for rodada_id, (itens, removidos_rodada) in por_rodada.items():
+            try:
+                await self.db.salvar_rascunhos(rodada_id, itens, removidos_rodada)
+            except Exception as e:
+                logger.error(f"Erro ao salvar rascunhos da rodada {rodada_id}: {e}")
+                # volta para a fila do próximo flush, sem apagar alterações mais novas
+                self._sujos |= {(rodada_id, u) for u, _ in itens if (rodada_id, u) not in self._removidos}
+                self._removidos |= {(rodada_id, u) for u in removidos_rodada if (rodada_id, u) not in self._sujos}
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            await self.descarregar()
+            agora = time.monotonic()
+            if agora >= self._proxima_expiracao or (self.maximo and len(self._rascunhos) > self.maximo):
+                self._proxima_expiracao = agora + self.EXPIRAR_A_CADA
+                n = self.expirar(agora)
+                if n:
+                    logger.info(f"{n} rascunhos parados saíram da memória ({len(self._rascunhos)} ficam)")
+
+    def iniciar(self):
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await self.descarregar()
@@ -0,0 +1,83 @@
+# registro.py
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+_DESCONHECIDA = 0  # ids de rodada começam em 1: marca mensagens que não são planilha
+
+class RegistroChats:
+    """
+    Rodada ativa de cada chat e a rodada de cada mensagem de planilha.
+    As consultas são dicts em memória; o que falta é lido do banco na
+    primeira vez (o banco é a fonte de verdade entre reinícios).
+
+    As mensagens ficam num LRU de até `max_mensagens`: qualquer um pode clicar em
+    mensagens velhas ou de outros chats, e cada uma viraria uma entrada para sempre.
+    """
+
+    def __init__(self, db, max_mensagens: int = 10_000):
+        self.db = db
+        self.max_mensagens = max_mensagens
+        self._mensagens: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._ativas: Dict[int, Optional[int]] = {}
+        self._abertas: Dict[int, bool] = {}
+        self._fechamentos: Dict[int, Optional[datetime]] = {}
+        self._principais: Dict[int, Optional[Tuple[int, int]]] = {}
+
+    async def rodada_da_mensagem(self, chat_id: int, message_id: int) -> Optional[int]:
+        chave = (chat_id, message_id)
+        rodada_id = self._mensagens.get(chave)
+        if rodada_id is None:
+            rodada_id = await self.db.obter_rodada_da_mensagem(chat_id, message_id) or _DESCONHECIDA
+            self._guardar(chave, rodada_id)
+        else:
+            self._mensagens.move_to_end(chave)
+        return rodada_id or None
+
+    def _guardar(self, chave: Tuple[int, int], rodada_id: int):
+        self._mensagens[chave] = rodada_id
+        self._mensagens.move_to_end(chave)
+        if len(self._mensagens) > self.max_mensagens:
+            self._mensagens.popitem(last=False)
+
+    async def rodada_ativa(self, chat_id: int) -> Optional[int]:
+        if chat_id not in self._ativas:
+            rodada = await self.db.obter_rodada_ativa(chat_id)
+            self._ativas[chat_id] = rodada[0] if rodada else None
+        return self._ativas[chat_id]
+
+    async def rodada_aberta(self, rodada_id: int) -> bool:
+        aberta = self._abertas.get(rodada_id)
+        if aberta is None:
+            rodada = await self.db.obter_rodada(rodada_id)
+            aberta = self._abertas[rodada_id] = bool(rodada and rodada[2])
+            self._fechamentos[rodada_id] = datetime.fromisoformat(rodada[4]) if rodada and rodada[4] else None
+        fecha_em = self._fechamentos.get(rodada_id)
+        return aberta and (fecha_em is None or datetime.now() < fecha_em)
+
+    async def planilha_principal(self, rodada_id: int) -> Optional[Tuple[int, int]]:
+        if rodada_id not in self._principais:
+            self._principais[rodada_id] = await self.db.obter_planilha_principal(rodada_id)
+        return self._principais[rodada_id]
+
+    def nova_rodada(self, chat_id: int, rodada_id: int, fecha_em: Optional[str] = None):
+        anterior = self._ativas.get(chat_id)
+        if anterior is not None and anterior != rodada_id:
+            self.encerrar(anterior)
+        self._abertas[rodada_id] = True
+        self._fechamentos[rodada_id] = datetime.fromisoformat(fecha_em) if fecha_em else None
+        self._ativas[chat_id] = rodada_id
+
+    def encerrar(self, rodada_id: int):
+        self._abertas[rodada_id] = False
+        self._principais.pop(rodada_id, None)
+        # uma rodada antiga sem chat (de antes do registro) pode estar em cache em outros chats
+        for chat in [c for c, r in self._ativas.items() if r == rodada_id]:
+            del self._ativas[chat]
+
+    async def registrar(self, chat_id: int, message_id: int, rodada_id: int, principal: bool = False):
+        await self.db.registrar_planilha(chat_id, message_id, rodada_id)
+        self._guardar((chat_id, message_id), rodada_id)
+        if principal:
+            self._principais[rodada_id] = (chat_id, message_id)
@@ -0,0 +1,285 @@
+# saida.py
+# Camada de saída do Bot: toda chamada à API passa por uma fila com prioridade
+# (respostas de callback > DMs > edições/mensagens em grupo > avisos em massa),
+# limites por chat e global, nova tentativa com backoff (respeitando o retry_after
+# do 429) e descarte de pedidos repetidos ou já ultrapassados.
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from telegram.error import NetworkError
+from telegram.request import BaseRequest
+
+from agendador import BaldeTokens
+
+logger = logging.getLogger(__name__)
+
+# prioridades (menor sai primeiro)
+RESPOSTA = 0
+PRIVADO = 1
+GRUPO = 2
+TRANSMISSAO = 3
+
+# quem envia em massa (FilaTransmissao) marca a própria tarefa: o pedido HTTP não diz
+PRIORIDADE: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("prioridade_saida", default=None)
+
+# sem efeito colateral se repetidos: podem ser refeitos após erro de rede
+IDEMPOTENTES = {"answerCallbackQuery", "editMessageText", "editMessageReplyMarkup", "deleteMessage"}
+# pedidos novos substituem os pendentes com a mesma chave (só o último importa)
+_EDICOES = {"editMessageText", "editMessageReplyMarkup"}
+# longos/de controle: vão direto, sem fila
+_DIRETOS = {"getUpdates", "getMe", "setWebhook", "deleteWebhook", "getWebhookInfo", "close", "logOut"}
+
+class _Pedido:
+    __slots__ = ("url", "method", "request_data", "kwargs", "metodo", "chat", "prioridade",
+                 "chave", "futuros", "tentativas", "seq")
+
+    def __init__(self, url, method, request_data, kwargs, metodo, chat, prioridade, chave):
+        self.url = url
+        self.method = method
+        self.request_data = request_data
+        self.kwargs = kwargs
+        self.metodo = metodo
+        self.chat = chat
+        self.prioridade = prioridade
+        self.chave = chave
+        self.futuros: List[asyncio.Future] = [asyncio.get_running_loop().create_future()]
+        self.tentativas = 0
+        self.seq = 0
+
+    def resolver(self, resultado=None, erro: Optional[BaseException] = None):
+        for f in self.futuros:
+            if f.done():
+                continue
+            if erro is not None:
+                f.set_exception(erro)
+            else:
+                f.set_result(resultado)
+
+class RequisicaoPriorizada(BaseRequest):
+    """
+    BaseRequest que enfileira as chamadas da API em vez de enviá-las na hora.
+    Quem chama continua recebendo (status, corpo) como se fosse direto.
+    """
+
+    MAX_TENTATIVAS = 5
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 30.0
+    LIMPAR_A_CADA = 60.0
+
+    def __init__(self, interna: BaseRequest, por_segundo: float = 30, edicoes_por_minuto: float = 20,
+                 edicoes_por_minuto_privado: float = 60, rajada: float = 3, em_voo: int = 64):
+        self.interna = interna
+        self.global_ = BaldeTokens(por_segundo, capacidade=por_segundo)
+        self.taxa_grupo = edicoes_por_minuto / 60.0
+        self.taxa_privado = edicoes_por_minuto_privado / 60.0
+        self.rajada = rajada
+        self.em_voo = em_voo
+        self._baldes: Dict[object, BaldeTokens] = {}
+        self._pendentes: Dict[tuple, _Pedido] = {}
+        self._prontos = []    # (prioridade, seq, pedido)
+        self._esperando = []  # (instante, seq, pedido)
+        self._seq = itertools.count()
+        self._novo: Optional[asyncio.Event] = None
+        self._vagas: Optional[asyncio.Semaphore] = None
+        self._tarefa: Optional[asyncio.Task] = None
+        self._executando = set()
+        self._proxima_limpeza = 0.0
+
+    # ---- BaseRequest ----
+    @property
+    def read_timeout(self):
+        return self.interna.read_timeout
+
+    async def initialize(self):
+        await self.interna.initialize()
+        if self._tarefa is None or self._tarefa.done():
+            self._novo = asyncio.Event()
+            self._vagas = asyncio.Semaphore(self.em_voo)
+            self._tarefa = asyncio.create_task(self._despachar())
+
+    async def shutdown(self):
+        if self._tarefa is not None:
+            # deixa a fila esvaziar antes de fechar a conexão
+            limite = time.monotonic() + 10
+            while (self._prontos or self._esperando or self._executando) and time.monotonic() < limite:
+                await asyncio.sleep(0.05)
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await self.interna.shutdown()
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        metodo = url.rsplit("/", 1)[-1]
+        if metodo in _DIRETOS or self._tarefa is None:
+            return await self.interna.do_request(url, method, request_data, **kwargs)
+
+        params = request_data.parameters if request_data is not None else {}
+        chat = params.get("chat_id")
+        prioridade = self._prioridade(metodo, chat)
+        chave = self._chave(metodo, chat, params)
+
+        existente = self._pendentes.get(chave) if chave is not None else None
+        if existente is not None:
+            if metodo == "answerCallbackQuery":
+                # mesma query respondida duas vezes: a segunda não vai para a API
+                return await asyncio.shield(existente.futuros[0])
+            # edição mais nova da mesma mensagem: a pendente (velha) sai com ela
+            existente.request_data, existente.kwargs = request_data, kwargs
+            futuro = asyncio.get_running_loop().create_future()
+            existente.futuros.append(futuro)
+            return await futuro
+
+        pedido = _Pedido(url, method, request_data, kwargs, metodo, chat, prioridade, chave)
+        if chave is not None:
+            self._pendentes[chave] = pedido
+        self._colocar(pedido)
+        return await pedido.futuros[0]
+
+    # ---- classificação ----
+    @staticmethod
+    def _prioridade(metodo, chat) -> int:
+        if metodo == "answerCallbackQuery":
+            return RESPOSTA
+        marcada = PRIORIDADE.get()
+        if marcada is not None:
+            return marcada
+        if isinstance(chat, int) and chat > 0:
+            return PRIVADO
+        return GRUPO
+
+    @staticmethod
+    def _chave(metodo, chat, params):
+        if metodo == "answerCallbackQuery":
+            return ("resposta", params.get("callback_query_id"))
+        if metodo in _EDICOES and params.get("message_id") is not None:
+            return ("edicao", chat, params.get("message_id"))
+        return None
+
+    def _balde(self, chat) -> BaldeTokens:
+        balde = self._baldes.get(chat)
+        if balde is None:
+            taxa = self.taxa_privado if isinstance(chat, int) and chat > 0 else self.taxa_grupo
+            balde = self._baldes[chat] = BaldeTokens(taxa, self.rajada)
+        return balde
+
+    def _limpar_baldes(self, agora: float):
+        # balde cheio e sem RetryAfter é igual a um novo: sai (um por chat/usuário cresceria sem fim)
+        for chat, balde in list(self._baldes.items()):
+            if balde.espera() == 0 and balde.tokens >= balde.capacidade and balde.bloqueado_ate <= agora:
+                del self._baldes[chat]
+
+    # ---- fila ----
+    def _colocar(self, pedido: _Pedido, atraso: float = 0.0):
+        pedido.seq = next(self._seq)
+        if atraso > 0:
+            heapq.heappush(self._esperando, (time.monotonic() + atraso, pedido.seq, pedido))
+        else:
+            heapq.heappush(self._prontos, (pedido.prioridade, pedido.seq, pedido))
+        self._novo.set()
+
+    async def _despachar(self):
+        while True:
+            agora = time.monotonic()
+            if agora >= self._proxima_limpeza:
+                self._proxima_limpeza = agora + self.LIMPAR_A_CADA
+                self._limpar_baldes(agora)
+            while self._esperando and self._esperando[0][0] <= agora:
+                _, _, pedido = heapq.heappop(self._esperando)
+                heapq.heappush(self._prontos, (pedido.prioridade, pedido.seq, pedido))
+
+            if not self._prontos:
+                self._novo.clear()
+                espera = self._esperando[0][0] - agora if self._esperando else None
+                if self._baldes:
+                    # parado também limpa: acorda na hora da próxima limpeza
+                    limpeza = self._proxima_limpeza - agora
+                    espera = limpeza if espera is None else min(espera, limpeza)
+                try:
+                    await asyncio.wait_for(self._novo.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, pedido = heapq.heappop(self._prontos)
+
+            # respostas de callback não contam nos limites de mensagens (por chat e global)
+            if pedido.chat is not None:
+                balde = self._balde(pedido.chat)
+                espera = max(balde.espera(), self.global_.espera())
+                if espera > 0:
+                    heapq.heappush(self._esperando, (agora + espera, pedido.seq, pedido))
+                    continue
+                balde.tokens -= 1
+                self.global_.tokens -= 1
+
+            await self._vagas.acquire()
+            # a partir daqui o pedido não aceita mais substituição: uma edição nova vira outro pedido
+            if pedido.chave is not None and self._pendentes.get(pedido.chave) is pedido:
+                del self._pendentes[pedido.chave]
+            tarefa = asyncio.create_task(self._executar(pedido))
+            self._executando.add(tarefa)
+            tarefa.add_done_callback(self._executando.discard)
+
+    def _repetir(self, pedido: _Pedido, atraso: float):
+        pedido.tentativas += 1
+        if pedido.chave is not None:
+            mais_novo = self._pendentes.get(pedido.chave)
+            if mais_novo is not None:
+                # já existe uma versão mais nova na fila: esta não precisa mais sair
+                mais_novo.futuros.extend(pedido.futuros)
+                return
+            self._pendentes[pedido.chave] = pedido
+        self._colocar(pedido, atraso)
+
+    async def _executar(self, pedido: _Pedido):
+        try:
+            status, corpo = await self.interna.do_request(
+                pedido.url, pedido.method, pedido.request_data, **pedido.kwargs
+            )
+        except NetworkError as e:
+            # TimedOut inclusive; sendMessage não é refeito às cegas (poderia duplicar a mensagem)
+            if pedido.metodo in IDEMPOTENTES and pedido.tentativas + 1 < self.MAX_TENTATIVAS:
+                atraso = min(self.BACKOFF_BASE * 2 ** pedido.tentativas, self.BACKOFF_MAX)
+                logger.warning(f"{pedido.metodo} falhou ({e}), nova tentativa em {atraso:.1f}s")
+                self._repetir(pedido, atraso)
+            else:
+                pedido.resolver(erro=e)
+            return
+        except Exception as e:
+            pedido.resolver(erro=e)
+            return
+        finally:
+            self._vagas.release()
+
+        # 429: o Telegram não executou, qualquer método pode repetir. 5xx: pode ter executado,
+        # então só os idempotentes; sendMessage & cia. devolvem o erro para quem chamou
+        repetir = status == 429 or (status >= 500 and pedido.metodo in IDEMPOTENTES)
+        if repetir and pedido.tentativas + 1 < self.MAX_TENTATIVAS:
+            atraso = self._retry_after(corpo) if status == 429 else None
+            if atraso is not None:
+                # o 429 vale para o chat (ou para o bot todo, se não há chat)
+                (self._balde(pedido.chat) if pedido.chat is not None else self.global_).adiar(atraso)
+                logger.warning(f"{pedido.metodo}: limite do Telegram, aguardando {atraso}s")
+            else:
+                atraso = min(self.BACKOFF_BASE * 2 ** pedido.tentativas, self.BACKOFF_MAX)
+            self._repetir(pedido, atraso)
+            return
+
+        pedido.resolver((status, corpo))
+
+    @staticmethod
+    def _retry_after(corpo) -> Optional[float]:
+        try:
+            return float(json.loads(corpo)["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return None
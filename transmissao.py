@@ -0,0 +1,121 @@
+# transmissao.py
+
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from agendador import BaldeTokens
+from saida import PRIORIDADE, TRANSMISSAO
+
+logger = logging.getLogger(__name__)
+
+class FilaTransmissao:
+    """
+    Avisos por DM (rodada aberta, rodada fechando) para quem já palpitou.
+    A fila fica no banco (transmissao_envios), então um reinício continua de onde
+    parou; o envio respeita um balde de tokens global e roda fora dos handlers.
+    O 429 (RetryAfter) não chega aqui: a camada de saída (saida.RequisicaoPriorizada)
+    adia o chat e repete o pedido sozinha.
+    """
+
+    LOTE = 200
+    MAX_TENTATIVAS = 5
+
+    def __init__(self, db, mensagens_por_segundo: float = 25, paralelos: int = 8):
+        self.db = db
+        self.balde = BaldeTokens(mensagens_por_segundo, capacidade=mensagens_por_segundo)
+        self.paralelos = paralelos
+        self.bot = None
+        self._acordar = asyncio.Event()
+        self._parando = False
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def enfileirar(self, chave: str, texto: str, chat_id: Optional[int] = None,
+                         exceto_rodada: Optional[int] = None) -> int:
+        """Grava o aviso e os destinatários; a mesma `chave` nunca é enviada duas vezes."""
+        n = await self.db.enfileirar_transmissao(chave, texto, chat_id, exceto_rodada)
+        if n:
+            logger.info(f"Transmissão {chave}: {n} destinatários na fila")
+            self._acordar.set()
+        return n
+
+    async def _enviar(self, user_id: int, texto: str) -> str:
+        # "ok", "bloqueado" ou "desistir"
+        tentativas = 0
+        while True:
+            await self.balde.consumir()
+            try:
+                await self.bot.send_message(user_id, texto, parse_mode="Markdown")
+                return "ok"
+            except Forbidden:
+                return "bloqueado"
+            except BadRequest as e:
+                if "chat not found" in str(e).lower():
+                    return "bloqueado"
+                logger.error(f"Aviso para {user_id} recusado: {e}")
+                return "desistir"
+            except TelegramError as e:
+                tentativas += 1
+                if tentativas >= self.MAX_TENTATIVAS:
+                    logger.error(f"Desistindo do aviso para {user_id} após {tentativas} tentativas: {e}")
+                    return "desistir"
+                await asyncio.sleep(min(2 ** tentativas, 30))
+
+    async def _processar_lote(self, pendentes) -> None:
+        fila = deque(pendentes)
+        concluidos, bloqueados = [], []
+
+        async def trabalhador():
+            # cada trabalhador é uma tarefa: os envios dele saem depois de respostas, DMs e edições
+            PRIORIDADE.set(TRANSMISSAO)
+            while fila and not self._parando:
+                transmissao_id, user_id, texto = fila.popleft()
+                estado = await self._enviar(user_id, texto)
+                concluidos.append((transmissao_id, user_id))
+                if estado == "bloqueado":
+                    bloqueados.append(user_id)
+
+        try:
+            await asyncio.gather(*[trabalhador() for _ in range(self.paralelos)])
+        finally:
+            # mesmo cancelado (desligamento) tira da fila o que já foi entregue
+            if concluidos or bloqueados:
+                await self.db.concluir_envios(concluidos, bloqueados)
+            if bloqueados:
+                logger.info(f"{len(bloqueados)} usuários bloquearam o bot e saíram das transmissões")
+
+    async def _loop(self):
+        while not self._parando:
+            self._acordar.clear()
+            pendentes = await self.db.obter_envios_pendentes(self.LOTE)
+            if not pendentes:
+                await self._acordar.wait()
+                continue
+            try:
+                await self._processar_lote(pendentes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Erro na fila de transmissão: {e}")
+                await asyncio.sleep(5)
+
+    def iniciar(self, bot):
+        self.bot = bot
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def parar(self, espera: float = 5.0):
+        # os envios em voo terminam (cancelados, já teriam saído e voltariam no reinício);
+        # o que não saiu continua no banco para o próximo início
+        if self._tarefa is not None:
+            self._parando = True
+            self._acordar.set()
+            try:
+                await asyncio.wait_for(self._tarefa, espera)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                pass
+            self._tarefa = None
+            self._parando = False